@@ -0,0 +1,328 @@
+import argparse
+import os
+import sys
+import time
+from multiprocessing import Pool
+from os.path import abspath, dirname, join
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+import chess
+import chess.engine
+import numpy as np
+
+from chess_engine.search.alphabeta import MATE_SCORE, MATE_THRESHOLD, \
+    AlphaBetaSearcher
+from chess_engine.uci import convert_score_to_centipawns
+
+PROJECT_ROOT = dirname(dirname(dirname(abspath(__file__))))
+RANDOM_MOVER_PATH = join(dirname(abspath(__file__)), 'random_mover.py')
+
+# Centipawn value of a mate in 0, mates further away are worth a little less.
+MATE_CENTIPAWNS = 10000
+
+# Fixed suite of positions: openings, middlegames with tactics and endgames.
+BENCHMARK_FENS = [
+    chess.STARTING_FEN,
+    'r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3',
+    'rnbqkb1r/pp2pppp/3p1n2/8/3NP3/8/PPP2PPP/RNBQKB1R w KQkq - 1 5',
+    'r1bqk2r/pppp1ppp/2n2n2/2b1p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4',
+    'r1b1k2r/ppppqppp/2n2n2/2b1p3/2B1P3/2NP1N2/PPP2PPP/R1BQK2R w KQkq - 1 6',
+    'r2q1rk1/ppp2ppp/2np1n2/2b1p1B1/2B1P1b1/2NP1N2/PPP2PPP/R2Q1RK1 w - - 2 8',
+    '6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1',
+    '4k3/8/4p3/8/8/8/4Q3/4K3 w - - 0 1',
+    '8/8/4k3/8/2p5/8/B2K4/8 w - - 0 1',
+    '8/5pk1/6p1/8/8/6P1/5PK1/8 w - - 0 1',
+]
+
+# Openings the match games start from, each played once with either color.
+OPENINGS = ['e4 e5', 'd4 d5', 'c4 e5', 'e4 c5', 'd4 Nf6', 'Nf3 d5',
+            'e4 e6', 'e4 c6']
+
+
+class PositionAnalysis(NamedTuple):
+    best_move: Optional[chess.Move]
+    centipawns: float  # from white's point of view
+
+
+class ComparisonReport(NamedTuple):
+    n_positions: int
+    agreement: float  # fraction of positions with the same best move
+    correlation: float  # Pearson correlation of the centipawn scores
+    net_positions_per_sec: float
+    engine_positions_per_sec: float
+
+
+class MatchResult(NamedTuple):
+    wins: int
+    draws: int
+    losses: int
+
+    @property
+    def score(self) -> float:
+        n_games = self.wins + self.draws + self.losses
+        return (self.wins + self.draws / 2) / n_games if n_games else 0.0
+
+
+def get_random_mover_command(seed: Optional[int] = None) -> List[str]:
+    command = [sys.executable, RANDOM_MOVER_PATH]
+    return command if seed is None else command + [str(seed)]
+
+
+def get_engine_command(model_path=None, material=False) -> List[str]:
+    """
+    Returns the command that starts chess_engine.uci.
+    """
+    command = [sys.executable, '-m', 'chess_engine.uci']
+    if model_path is not None:
+        command += ['--model_path', model_path]
+    if material:
+        command.append('--material')
+    return command
+
+
+def open_engine(command: Sequence[str]) -> chess.engine.SimpleEngine:
+    # chess_engine has to be importable for the chess_engine.uci command.
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        path for path in (PROJECT_ROOT, env.get('PYTHONPATH')) if path)
+    return chess.engine.SimpleEngine.popen_uci(list(command), env=env)
+
+
+def analyse_with_searcher(fens: Sequence[str], searcher: AlphaBetaSearcher,
+                          depth: int = 2,
+                          time_limit: Optional[float] = None) \
+        -> Tuple[List[PositionAnalysis], float]:
+    """
+    Searches every position with searcher, e.g. an AlphaBetaSearcher over an
+    Evaluator wrapping Net.
+
+    :return: Tuple[analysis of every position, seconds taken]
+    """
+    analyses = []
+    start_time = time.perf_counter()
+    for fen in fens:
+        board = chess.Board(fen)
+        result = searcher.search(board, depth, time_limit)
+        if abs(result.score) > MATE_THRESHOLD:
+            centipawns = MATE_CENTIPAWNS - (MATE_SCORE - abs(result.score))
+            centipawns *= 1 if result.score > 0 else -1
+        else:
+            centipawns = convert_score_to_centipawns(result.score)
+        if board.turn == chess.BLACK:
+            centipawns = -centipawns
+        analyses.append(PositionAnalysis(result.best_move, centipawns))
+    return analyses, time.perf_counter() - start_time
+
+
+def analyse_with_engine(command: Sequence[str], fens: Sequence[str],
+                        limit: chess.engine.Limit) \
+        -> Tuple[List[PositionAnalysis], float]:
+    """
+    Analyses every position with a UCI engine, e.g. Stockfish.
+
+    :param command: Command that starts the engine.
+    :param fens: Positions to analyse.
+    :param limit: Search limit per position.
+    :return: Tuple[analysis of every position, seconds taken]
+    """
+    analyses = []
+    with open_engine(command) as engine:
+        start_time = time.perf_counter()
+        for fen in fens:
+            info = engine.analyse(chess.Board(fen), limit)
+            pv = info.get('pv') or [None]
+            score = info.get('score')
+            centipawns = 0 if score is None else \
+                score.white().score(mate_score=MATE_CENTIPAWNS)
+            analyses.append(PositionAnalysis(pv[0], centipawns))
+        seconds = time.perf_counter() - start_time
+    return analyses, seconds
+
+
+def _correlation(a: Sequence[float], b: Sequence[float]) -> float:
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    if len(a) < 2 or a.std() == 0 or b.std() == 0:
+        return float('nan')
+    return float(np.corrcoef(a, b)[0, 1])
+
+
+def compare_with_engine(command: Sequence[str], searcher: AlphaBetaSearcher,
+                        fens: Sequence[str] = BENCHMARK_FENS, depth: int = 2,
+                        engine_limit: Optional[chess.engine.Limit] = None) \
+        -> ComparisonReport:
+    """
+    Runs the same positions through searcher and a UCI engine and compares
+    their best moves and scores.
+
+    :param command: Command that starts the engine, e.g. ['stockfish'].
+    :param searcher: AlphaBetaSearcher, e.g. over an Evaluator wrapping Net.
+    :param fens: Positions to compare on.
+    :param depth: Search depth of searcher, in plies.
+    :param engine_limit: Search limit of the engine. Defaults to 0.1 seconds
+    per position.
+    :return: ComparisonReport
+    """
+    engine_limit = engine_limit or chess.engine.Limit(time=0.1)
+    net_analyses, net_seconds = analyse_with_searcher(fens, searcher, depth)
+    engine_analyses, engine_seconds = analyse_with_engine(command, fens,
+                                                          engine_limit)
+    agreement = np.mean([net.best_move == engine.best_move
+                         for net, engine in zip(net_analyses,
+                                                engine_analyses)])
+    return ComparisonReport(
+        len(fens),
+        float(agreement),
+        _correlation([analysis.centipawns for analysis in net_analyses],
+                     [analysis.centipawns for analysis in engine_analyses]),
+        len(fens) / net_seconds if net_seconds > 0 else 0.0,
+        len(fens) / engine_seconds if engine_seconds > 0 else 0.0)
+
+
+def play_game(white_command: Sequence[str], black_command: Sequence[str],
+              time_control: Tuple[float, float] = (10.0, 0.1),
+              opening: str = '', max_plies: int = 300) -> str:
+    """
+    Plays one game between two UCI engines with a fixed time control. A side
+    whose clock runs out loses. Games longer than max_plies are drawn.
+
+    :param white_command: Command that starts the engine playing white.
+    :param black_command: Command that starts the engine playing black.
+    :param time_control: Tuple[seconds per game, increment per move].
+    :param opening: SAN moves to start from, e.g. 'e4 e5'.
+    :param max_plies: Plies after which the game is adjudicated a draw.
+    :return: The result, '1-0', '0-1' or '1/2-1/2'.
+    """
+    base, increment = time_control
+    board = chess.Board()
+    for san in opening.split():
+        board.push_san(san)
+    clocks = {chess.WHITE: base, chess.BLACK: base}
+    engines = {}
+    try:
+        engines[chess.WHITE] = open_engine(white_command)
+        engines[chess.BLACK] = open_engine(black_command)
+        while not board.is_game_over(claim_draw=True):
+            if board.ply() >= max_plies:
+                return '1/2-1/2'
+            limit = chess.engine.Limit(white_clock=clocks[chess.WHITE],
+                                       black_clock=clocks[chess.BLACK],
+                                       white_inc=increment,
+                                       black_inc=increment)
+            start_time = time.perf_counter()
+            move = engines[board.turn].play(board, limit).move
+            clocks[board.turn] -= time.perf_counter() - start_time
+            if clocks[board.turn] < 0 or move is None:
+                return '0-1' if board.turn == chess.WHITE else '1-0'
+            clocks[board.turn] += increment
+            board.push(move)
+        return board.result(claim_draw=True)
+    finally:
+        for engine in engines.values():
+            engine.quit()
+
+
+def _play_match_game(args) -> float:
+    engine_a, engine_b, time_control, opening, a_is_white, max_plies = args
+    if a_is_white:
+        result = play_game(engine_a, engine_b, time_control, opening,
+                           max_plies)
+        return {'1-0': 1.0, '0-1': 0.0}.get(result, 0.5)
+    result = play_game(engine_b, engine_a, time_control, opening, max_plies)
+    return {'1-0': 0.0, '0-1': 1.0}.get(result, 0.5)
+
+
+def play_match(engine_a: Sequence[str], engine_b: Sequence[str],
+               n_games: int, time_control: Tuple[float, float] = (10.0, 0.1),
+               workers: int = 1, max_plies: int = 300) -> MatchResult:
+    """
+    Plays n_games between two UCI engines, each game in its own process.
+    Consecutive games start from the same opening, see OPENINGS, with the
+    colors swapped.
+
+    :param engine_a: Command that starts the first engine.
+    :param engine_b: Command that starts the second engine.
+    :param n_games: Number of games.
+    :param time_control: Tuple[seconds per game, increment per move].
+    :param workers: Number of games played at the same time.
+    :param max_plies: Plies after which a game is adjudicated a draw.
+    :return: MatchResult from engine_a's point of view.
+    """
+    games = [(engine_a, engine_b, time_control,
+              OPENINGS[i // 2 % len(OPENINGS)], i % 2 == 0, max_plies)
+             for i in range(n_games)]
+    if workers <= 1:
+        scores = [_play_match_game(game) for game in games]
+    else:
+        with Pool(workers) as pool:
+            scores = pool.map(_play_match_game, games)
+    return MatchResult(scores.count(1.0), scores.count(0.5),
+                       scores.count(0.0))
+
+
+if __name__ == '__main__':
+    from chess_engine.models.evaluator import Evaluator
+    from chess_engine.models.export import load_trained_model
+
+    parser = argparse.ArgumentParser(description='Compares chess_engine with '
+                                                 'a UCI engine such as '
+                                                 'Stockfish. Defaults to the '
+                                                 'bundled random mover.')
+    parser.add_argument('--engine',
+                        default=None,
+                        help='Command that starts the UCI engine, e.g. '
+                             '/usr/games/stockfish.')
+    parser.add_argument('--model_path',
+                        default=None,
+                        help='state_dict of a trained Net, or a directory '
+                             'written by chess_engine.models.export. '
+                             'Defaults to an untrained Net.')
+    parser.add_argument('--depth',
+                        default=2,
+                        type=int,
+                        help='Search depth of chess_engine on the position '
+                             'suite, in plies.')
+    parser.add_argument('--engine_time',
+                        default=0.1,
+                        type=float,
+                        help='Seconds the engine analyses each position for.')
+    parser.add_argument('--games',
+                        default=0,
+                        type=int,
+                        help='Number of match games to play after the '
+                             'position suite.')
+    parser.add_argument('--time_control',
+                        default='10+0.1',
+                        help='Match time control, seconds per game + '
+                             'increment per move.')
+    parser.add_argument('--workers',
+                        default=1,
+                        type=int,
+                        help='Number of match games played at the same time.')
+    args = parser.parse_args()
+
+    engine_command = args.engine.split() if args.engine else \
+        get_random_mover_command()
+    model, features = load_trained_model(args.model_path)
+    report = compare_with_engine(engine_command,
+                                 AlphaBetaSearcher(Evaluator(
+                                     model, features=features)),
+                                 depth=args.depth,
+                                 engine_limit=chess.engine.Limit(
+                                     time=args.engine_time))
+    print('positions: {}'.format(report.n_positions))
+    print('best move agreement: {:.1%}'.format(report.agreement))
+    print('score correlation: {:.3f}'.format(report.correlation))
+    print('chess_engine: {:.2f} positions/sec'.format(
+        report.net_positions_per_sec))
+    print('engine: {:.2f} positions/sec'.format(
+        report.engine_positions_per_sec))
+
+    if args.games:
+        base, increment = (float(value)
+                           for value in args.time_control.split('+'))
+        result = play_match(get_engine_command(args.model_path),
+                            engine_command, args.games, (base, increment),
+                            args.workers)
+        print('match: +{} ={} -{}, score {:.1%}'.format(
+            result.wins, result.draws, result.losses, result.score))
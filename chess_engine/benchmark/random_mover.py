@@ -0,0 +1,58 @@
+import random
+import sys
+
+import chess
+
+
+def run(lines, output, seed=None):
+    """
+    Tiny UCI engine that plays a random legal move, standing in for
+    Stockfish when the benchmark harness is run or tested offline. It only
+    needs python-chess, so it can be started as a plain script:
+    python random_mover.py [seed]
+
+    :param lines: UCI commands.
+    :param output: Writes one line of UCI output.
+    :param seed: Seed for the moves. Defaults to unseeded.
+    """
+    rng = random.Random(seed)
+    board = chess.Board()
+    for line in lines:
+        tokens = line.split()
+        if not tokens:
+            continue
+        command = tokens[0]
+        if command == 'uci':
+            output('id name random_mover')
+            output('id author chess_engine')
+            output('uciok')
+        elif command == 'isready':
+            output('readyok')
+        elif command == 'ucinewgame':
+            board = chess.Board()
+        elif command == 'position':
+            if tokens[1] == 'startpos':
+                board = chess.Board()
+            else:
+                end = tokens.index('moves') if 'moves' in tokens \
+                    else len(tokens)
+                board = chess.Board(' '.join(tokens[2:end]))
+            if 'moves' in tokens:
+                for uci in tokens[tokens.index('moves') + 1:]:
+                    board.push_uci(uci)
+        elif command == 'go':
+            moves = list(board.legal_moves)
+            move = rng.choice(moves).uci() if moves else '0000'
+            output('info depth 1 score cp 0 nodes 1 pv {}'.format(move))
+            output('bestmove {}'.format(move))
+        elif command == 'quit':
+            break
+
+
+def _print(line):
+    sys.stdout.write(line + '\n')
+    sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    run(sys.stdin, _print, int(sys.argv[1]) if len(sys.argv) > 1 else None)
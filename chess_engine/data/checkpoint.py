@@ -0,0 +1,53 @@
+import json
+import os
+from os.path import abspath, exists, join
+from random import Random
+
+CHECKPOINT_FILENAME = 'checkpoint.json'
+
+
+def load_checkpoint(target_dir) -> dict:
+    """
+    Loads the checkpoint of a dataset directory. The checkpoint maps the
+    absolute path of every source PGN file that was (partly) processed into
+    the directory to its progress, see save_checkpoint.
+
+    :param target_dir: Directory of the dataset.
+    :return: dict, empty if there is no checkpoint yet.
+    """
+    filename = join(target_dir, CHECKPOINT_FILENAME)
+    if not exists(filename):
+        return {}
+    with open(filename) as file:
+        return json.load(file)
+
+
+def save_checkpoint(target_dir, checkpoint: dict):
+    """
+    Saves a checkpoint next to the dataset. The file is replaced atomically,
+    so an interruption never leaves a half written checkpoint behind.
+
+    :param target_dir: Directory of the dataset.
+    :param checkpoint: dict mapping source file paths to their progress, e.g.
+    {'offset': byte offset of the next game, 'rng_state': get_rng_state(rng),
+    'n_samples': samples in the dataset, 'n_games': games processed,
+    'done': bool}
+    """
+    filename = join(target_dir, CHECKPOINT_FILENAME)
+    with open(filename + '.tmp', 'w') as file:
+        json.dump(checkpoint, file)
+    os.replace(filename + '.tmp', filename)
+
+
+def get_source_key(dataset_filename) -> str:
+    return abspath(dataset_filename)
+
+
+def get_rng_state(rng: Random) -> list:
+    version, internal_state, gauss_next = rng.getstate()
+    return [version, list(internal_state), gauss_next]
+
+
+def set_rng_state(rng: Random, state: list):
+    version, internal_state, gauss_next = state
+    rng.setstate((version, tuple(internal_state), gauss_next))
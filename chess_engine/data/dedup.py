@@ -0,0 +1,151 @@
+import math
+from typing import Tuple
+
+import chess
+import chess.polyglot
+import numpy as np
+
+from chess_engine.data.serializer import CASTLING_FLAGS, LAYERS, \
+    NO_EP_SQUARE, WHITE_TO_MOVE
+
+# The Polyglot Zobrist keys, 781 of them: 12 pieces x 64 squares, then the
+# castling rights, the en passant file and the side to move.
+POLYGLOT_KEYS = np.array(chess.polyglot.POLYGLOT_RANDOM_ARRAY, dtype=np.uint64)
+# Piece keys rearranged to follow LAYERS, shape (12, 64).
+PIECE_KEYS = np.stack([
+    POLYGLOT_KEYS[64 * (2 * (piece_type - 1) + (color == chess.WHITE)):][:64]
+    for color, piece_type in LAYERS])
+CASTLING_KEYS = [(flag, POLYGLOT_KEYS[768 + i])
+                 for i, (_, flag) in enumerate(CASTLING_FLAGS)]
+EP_FILE_KEYS = POLYGLOT_KEYS[772:780]
+TURN_KEY = POLYGLOT_KEYS[780]
+
+# Positions hashed at once, each takes 12 * 64 * 8 bytes while hashing.
+HASH_CHUNK_SIZE = 4096
+
+# Positions the Bloom filter of a streamed dataset is sized for when the
+# number of positions is not known up front. Takes 18 MB at a 0.1% error rate.
+DEFAULT_BLOOM_CAPACITY = 10000000
+
+
+def zobrist_hash_positions(positions: np.ndarray) -> np.ndarray:
+    """
+    Computes the 64-bit Zobrist hashes of POSITION_DTYPE records with the
+    Polyglot keys. The hashes match chess.polyglot.zobrist_hash, except that
+    the en passant file is hashed whenever the record has an en passant
+    square, not only when a capture is possible.
+
+    :param positions: np array of shape (N,) with dtype POSITION_DTYPE.
+    :return: np array of shape (N,) and dtype uint64.
+    """
+    hashes = np.zeros(len(positions), dtype=np.uint64)
+    for i in range(0, len(positions), HASH_CHUNK_SIZE):
+        bitboards = positions['bitboards'][i:i + HASH_CHUNK_SIZE]
+        squares = np.unpackbits(bitboards.astype('<u8').view(np.uint8)
+                                .reshape(bitboards.shape + (8,)),
+                                axis=-1, bitorder='little')
+        squares = squares.reshape(bitboards.shape + (64,)).astype(bool)
+        hashes[i:i + HASH_CHUNK_SIZE] = np.bitwise_xor.reduce(
+            np.where(squares, PIECE_KEYS, np.uint64(0)), axis=(1, 2))
+
+    state = positions['state']
+    for flag, key in CASTLING_KEYS:
+        hashes[state & flag != 0] ^= key
+    hashes[state & WHITE_TO_MOVE != 0] ^= TURN_KEY
+    ep_square = positions['ep_square']
+    has_ep = ep_square != NO_EP_SQUARE
+    hashes[has_ep] ^= EP_FILE_KEYS[ep_square[has_ep] % 8]
+    return hashes
+
+
+class BloomFilter:
+    """
+    Set of 64-bit hashes in a fixed amount of memory. Membership tests can
+    give false positives, at a rate of about error_rate once capacity hashes
+    have been added, but never false negatives. 10 million hashes at a 0.1%
+    error rate take 18 MB.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        """
+        :param capacity: Number of hashes the filter is sized for.
+        :param error_rate: False positive rate at capacity.
+        """
+        self.n_bits = max(8, int(-capacity * math.log(error_rate)
+                                 / math.log(2) ** 2))
+        self.n_hashes = max(1, round(self.n_bits / capacity * math.log(2)))
+        self.bits = np.zeros(-(-self.n_bits // 8), dtype=np.uint8)
+
+    def _bit_indices(self, hashes: np.ndarray) -> np.ndarray:
+        # Double hashing: the i-th bit is h1 + i * h2, see Kirsch and
+        # Mitzenmacher, "Less Hashing, Same Performance".
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        h1 = hashes & np.uint64(0xffffffff)
+        h2 = (hashes >> np.uint64(32)) | np.uint64(1)
+        i = np.arange(self.n_hashes, dtype=np.uint64)
+        return (h1[:, np.newaxis] + i * h2[:, np.newaxis]) \
+            % np.uint64(self.n_bits)
+
+    def contains(self, hashes: np.ndarray) -> np.ndarray:
+        """
+        :param hashes: uint64 np array of shape (N,).
+        :return: bool np array of shape (N,), True where the hash was
+        (probably) added before.
+        """
+        byte_indices, bit_offsets = self._split(self._bit_indices(hashes))
+        return ((self.bits[byte_indices] >> bit_offsets) & 1).all(axis=1)
+
+    def add(self, hashes: np.ndarray):
+        byte_indices, bit_offsets = self._split(
+            self._bit_indices(hashes).ravel())
+        np.bitwise_or.at(self.bits, byte_indices,
+                         np.left_shift(np.uint8(1), bit_offsets))
+
+    @staticmethod
+    def _split(indices: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        return indices >> np.uint64(3), \
+            (indices & np.uint64(7)).astype(np.uint8)
+
+
+def find_first_occurrences(hashes: np.ndarray, bloom_filter: BloomFilter,
+                           chunk_size: int = 65536) -> np.ndarray:
+    """
+    Marks the first occurrence of every hash, in order, and adds the hashes
+    to bloom_filter. Hashes bloom_filter already holds count as seen, so the
+    filter can be shared across calls. False positives of the filter drop a
+    few first occurrences too.
+
+    :param hashes: uint64 np array of shape (N,).
+    :param bloom_filter: BloomFilter of the hashes seen so far.
+    :param chunk_size: Number of hashes looked up at once.
+    :return: bool np array of shape (N,), True to keep the position.
+    """
+    keep = np.zeros(len(hashes), dtype=bool)
+    for start in range(0, len(hashes), chunk_size):
+        chunk = hashes[start:start + chunk_size]
+        _, first_indices = np.unique(chunk, return_index=True)
+        first_indices = first_indices[~bloom_filter.contains(
+            chunk[first_indices])]
+        bloom_filter.add(chunk[first_indices])
+        keep[start + first_indices] = True
+    return keep
+
+
+def aggregate_duplicates(hashes: np.ndarray, y: np.ndarray) \
+        -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Groups equal hashes and aggregates the game results of each group. The
+    aggregation is exact, but needs memory for all the hashes at once.
+
+    :param hashes: uint64 np array of shape (N,).
+    :param y: Game results, 1 for a white win and 0 for a black win.
+    :return: Tuple[first_indices: index of the first occurrence of each unique
+    position, in order, wins: white wins per position, counts: games per
+    position]
+    """
+    _, first_indices, inverse = np.unique(hashes, return_index=True,
+                                          return_inverse=True)
+    order = np.argsort(first_indices, kind='stable')
+    wins = np.bincount(inverse, weights=y, minlength=len(first_indices))
+    counts = np.bincount(inverse, minlength=len(first_indices))
+    return first_indices[order], wins[order].astype(np.int64), counts[order]
@@ -0,0 +1,141 @@
+import argparse
+import operator
+import re
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Union
+
+from chess_engine.data.parser import read_headers, split_headers_movetext
+
+OPERATORS = {'>=': operator.ge,
+             '<=': operator.le,
+             '!=': operator.ne,
+             '==': operator.eq,
+             '=': operator.eq,
+             '>': operator.gt,
+             '<': operator.lt}
+CONDITION_PATTERN = re.compile(r'^(\w+)\s*(>=|<=|!=|==|=|>|<)\s*(\S+)$')
+CONDITION_SEPARATOR_PATTERN = re.compile(r'\s*,\s*|\s+and\s+', re.IGNORECASE)
+INT_PATTERN = re.compile(r'^-?\d+$')
+LEADING_INT_PATTERN = re.compile(r'^\d+')
+
+
+def _parse_int(value: Optional[str]) -> Optional[int]:
+    if value is None:
+        return None
+    digits = LEADING_INT_PATTERN.match(value)
+    return int(digits.group()) if digits else None
+
+
+def _get_elo(headers: Dict[str, str]) -> Optional[int]:
+    elos = [_parse_int(headers.get(name)) for name in ('WhiteElo', 'BlackElo')]
+    if None in elos:
+        return None
+    return min(elos)
+
+
+def _get_year(headers: Dict[str, str]) -> Optional[int]:
+    return _parse_int(headers.get('Date'))
+
+
+# Fields computed from the headers, on top of the PGN headers themselves.
+DERIVED_FIELDS: Dict[str, Callable[[Dict[str, str]], Optional[int]]] = {
+    'Elo': _get_elo,  # rating of the weaker player
+    'Year': _get_year,
+}
+
+
+class HeaderCondition(NamedTuple):
+    field: str
+    operator: str
+    value: Union[int, str]
+
+    def matches(self, headers: Dict[str, str]) -> bool:
+        """
+        :return: Whether the headers satisfy the condition. A game without
+        the field, or with a value that is not a number when value is one,
+        does not.
+        """
+        if self.field in DERIVED_FIELDS:
+            actual = DERIVED_FIELDS[self.field](headers)
+        else:
+            actual = headers.get(self.field)
+            if isinstance(self.value, int):
+                actual = _parse_int(actual)
+        if actual is None:
+            return False
+        return OPERATORS[self.operator](actual, self.value)
+
+
+def parse_header_filter(expression: str) -> List[HeaderCondition]:
+    """
+    Parses a filter expression on the PGN headers of a game, e.g.
+    'Elo>=2600, Year>=2010' for games since 2010 between players rated 2600
+    or more.
+
+    Conditions are separated by commas or 'and' and must all hold. Each one
+    compares a header, e.g. WhiteElo, Date, ECO or Result, or one of
+    DERIVED_FIELDS (Elo, the rating of the weaker player, and Year, taken
+    from Date) with >=, <=, !=, ==, =, > or <. Values that are integers are
+    compared as numbers, anything else, e.g. ECO>=B90 or Date>=2010.06.01,
+    as strings.
+
+    :raises ValueError: If a condition can not be parsed.
+    :return: List of HeaderCondition.
+    """
+    conditions = []
+    for text in CONDITION_SEPARATOR_PATTERN.split(expression.strip()):
+        match = CONDITION_PATTERN.match(text)
+        if match is None:
+            raise ValueError('Invalid header filter condition {!r}, expected '
+                             'e.g. WhiteElo>=2600'.format(text))
+        field, operator_text, value = match.groups()
+        if INT_PATTERN.match(value):
+            value = int(value)
+        elif field in DERIVED_FIELDS:
+            raise ValueError('{} must be compared with an integer, got {!r}'
+                             .format(field, value))
+        conditions.append(HeaderCondition(field, operator_text, value))
+    return conditions
+
+
+def matches_header_filter(headers: Dict[str, str],
+                          conditions: List[HeaderCondition]) -> bool:
+    return all(condition.matches(headers) for condition in conditions)
+
+
+def read_pgn_headers(pgn: str) -> Dict[str, str]:
+    """
+    Reads only the header section of a PGN. The movetext is neither parsed
+    nor scanned, so this costs a small fraction of reading the game.
+
+    :param pgn: A single game in PGN format.
+    :return: dict of header name to value.
+    """
+    header_text, _ = split_headers_movetext(pgn)
+    return read_headers(header_text)
+
+
+if __name__ == '__main__':
+    from chess_engine.data.generate_dataset import split_games
+
+    parser = argparse.ArgumentParser(description='Counts the games of a clean '
+                                                 'PGN file that match a header '
+                                                 'filter, scanning only their '
+                                                 'headers.')
+    parser.add_argument('pgn_file',
+                        help='The clean_dataset.pgn file to scan.')
+    parser.add_argument('filter',
+                        help="Filter expression, e.g. 'Elo>=2600, "
+                             "Year>=2010, Result!=1/2-1/2'.")
+    args = parser.parse_args()
+
+    header_filter = parse_header_filter(args.filter)
+    start_time = time.perf_counter()
+    n_games = 0
+    n_matches = 0
+    for n_games, pgn in enumerate(split_games(args.pgn_file), start=1):
+        n_matches += matches_header_filter(read_pgn_headers(pgn),
+                                           header_filter)
+    seconds = time.perf_counter() - start_time
+    print('{} of {} games match, scanned in {:.2f}s ({:.0f} games/s).'.format(
+        n_matches, n_games, seconds, n_games / max(seconds, 1e-9)))
@@ -1,16 +1,39 @@
 import io
-from os.path import dirname
+import os
+import shutil
+from functools import partial
+from multiprocessing import Pool
+from os.path import dirname, join
 import argparse
 import re
-from random import randrange, seed
-from typing import Tuple
+import time
+from random import Random, randrange, sample, seed
+from typing import List, Optional, Tuple
 
 import chess.pgn
 import numpy as np
 
+from chess_engine.data.checkpoint import get_rng_state, get_source_key, \
+    load_checkpoint, save_checkpoint, set_rng_state
+from chess_engine.data.dedup import DEFAULT_BLOOM_CAPACITY, BloomFilter, \
+    aggregate_duplicates, find_first_occurrences, zobrist_hash_positions
 from chess_engine.data.exceptions import InvalidHalfMoveError
-from chess_engine.data.serializer import convert_fen_to_array, \
-    convert_game_result_to_int
+from chess_engine.data.index import filter_game_index, load_game_index, \
+    split_indexed_games
+from chess_engine.data.ingest import split_raw_games
+from chess_engine.data.packed import PackedStateResultWriter
+from chess_engine.data.filters import matches_header_filter, \
+    parse_header_filter
+from chess_engine.data.parser import MainlineGame, read_headers, \
+    read_mainline_san, split_headers_movetext
+from chess_engine.data.profiling import HEADERS, MERGE, PARSE, PROFILERS, \
+    REPLAY, SPLIT, WRITE, PipelineStats, run_profiler, write_stats_summary
+from chess_engine.data.serializer import POSITION_DTYPE, \
+    convert_board_to_position, convert_game_result_to_int
+from chess_engine.data.splitter import split_game_buffers
+from chess_engine.data.writer import NpyAppendWriter, StateResultWriter
+from chess_engine.features.registry import DEFAULT_FEATURES, FEATURES, \
+    encode_positions, uses_repetitions
 
 
 def get_last_halfmove_number(game: chess.pgn.Game) -> int:
@@ -32,10 +55,10 @@ def get_last_halfmove_number(game: chess.pgn.Game) -> int:
     return last_halfmove_number
 
 
-def sample_game_state_result(game: chess.pgn.Game, halfmove_num: int) \
-        -> Tuple[str, str]:
+def sample_game_board_result(game: chess.pgn.Game, halfmove_num: int) \
+        -> Tuple[chess.Board, str]:
     """
-    Given a chess.pgn.Game object and a halfmove number, returns the FEN string
+    Given a chess.pgn.Game object and a halfmove number, returns the board
     of the game after halfmove_num has been played, along with the result of
     the game. For the results:
 
@@ -46,7 +69,7 @@ def sample_game_state_result(game: chess.pgn.Game, halfmove_num: int) \
 
     :param game: A chess.pgn.Game object.
     :param halfmove_num: halfmove number for the desired state.
-    :return: Tuple[FEN: str, game result: int]
+    :return: Tuple[board: chess.Board, game result: str]
     """
 
     # Get last halfmove number
@@ -60,44 +83,228 @@ def sample_game_state_result(game: chess.pgn.Game, halfmove_num: int) \
     # Get game result
     result = game.headers['Result']
 
-    # Get fen
+    # Get board
     while halfmove_num > 0:
         game = game.next()
         halfmove_num -= 1
-    fen = game.board().fen()
+    board = game.board()
+
+    return board, result
 
-    return fen, result
 
+def sample_game_state_result(game: chess.pgn.Game, halfmove_num: int) \
+        -> Tuple[str, str]:
+    """
+    Same as sample_game_board_result, but returns the FEN string of the board.
+    The dataset pipeline works on boards directly, this is meant for debugging
+    and exporting states.
+
+    :param game: A chess.pgn.Game object.
+    :param halfmove_num: halfmove number for the desired state.
+    :return: Tuple[FEN: str, game result: str]
+    """
+    board, result = sample_game_board_result(game, halfmove_num)
+    return board.fen(), result
 
-def sample_random_game_state_result(game: chess.pgn.Game) -> Tuple[str, str]:
+
+def sample_random_game_board_result(game: chess.pgn.Game,
+                                    rng: Optional[Random] = None) \
+        -> Tuple[chess.Board, str]:
     last_halfmove_number = get_last_halfmove_number(game)
-    state_num = randrange(1, last_halfmove_number)
-    fen, result = sample_game_state_result(game, state_num)
-    return fen, result
+    if rng is None:
+        state_num = randrange(1, last_halfmove_number)
+    else:
+        state_num = rng.randrange(1, last_halfmove_number)
+    board, result = sample_game_board_result(game, state_num)
+    return board, result
+
+
+def sample_random_game_state_result(game: chess.pgn.Game,
+                                    rng: Optional[Random] = None) \
+        -> Tuple[str, str]:
+    board, result = sample_random_game_board_result(game, rng)
+    return board.fen(), result
+
+
+def _choose_halfmove_nums(n_halfmoves: int, positions_per_game: int,
+                          rng: Optional[Random]) -> set:
+    candidates = range(1, n_halfmoves)
+    if positions_per_game and positions_per_game < len(candidates):
+        sampler = sample if rng is None else rng.sample
+        return set(sampler(candidates, positions_per_game))
+    return set(candidates)
+
+
+def _make_positions(positions: list) -> np.ndarray:
+    return np.array(positions, dtype=POSITION_DTYPE)
 
 
-def extract_game(pgn_file):
+def sample_game_positions(game: chess.pgn.Game, positions_per_game: int = 1,
+                          rng: Optional[Random] = None,
+                          repetitions: bool = True) -> np.ndarray:
+    """
+    Replays the mainline of a game once and returns the positions of
+    positions_per_game randomly chosen states, in the order they were played.
+    Like sample_random_game_state_result, the starting position and the final
+    position are never chosen. The number of halfmoves is taken from the
+    mainline itself, so games that are too short simply return no positions.
+
+    :param game: A chess.pgn.Game object.
+    :param positions_per_game: Number of states to sample without replacement.
+    0 returns every state.
+    :param rng: random.Random used to pick the states. Defaults to the module
+    level random generator.
+    :param repetitions: Count the earlier occurrences of each position, see
+    convert_board_to_position.
+    :return: np array of shape (K,) with dtype POSITION_DTYPE.
+    """
+    moves = list(game.mainline_moves())
+    halfmove_nums = _choose_halfmove_nums(len(moves), positions_per_game, rng)
+
+    board = game.board()
+    positions = []
+    for halfmove_num, move in enumerate(moves[:-1], start=1):
+        board.push(move)
+        if halfmove_num in halfmove_nums:
+            positions.append(convert_board_to_position(board, repetitions))
+
+    return _make_positions(positions)
+
+
+def sample_mainline_game_positions(game: MainlineGame,
+                                   positions_per_game: int = 1,
+                                   rng: Optional[Random] = None,
+                                   board: Optional[chess.Board] = None,
+                                   stats=None,
+                                   repetitions: bool = True) -> np.ndarray:
+    """
+    Same as sample_game_positions for a game read with
+    chess_engine.data.parser.read_mainline_game. The SAN moves are applied
+    straight onto board, which can be reused across games.
+
+    Like chess.pgn.read_game, the mainline ends before the first illegal or
+    unreadable move, and the last legal move then counts as the final
+    position, which is never sampled.
+
+    :param game: A MainlineGame.
+    :param positions_per_game: Number of states to sample without replacement.
+    0 returns every state.
+    :param rng: random.Random used to pick the states. Defaults to the module
+    level random generator.
+    :param board: Board to replay the game on. Defaults to a new board.
+    :param stats: chess_engine.data.profiling.PipelineStats to count
+    truncated games in.
+    :param repetitions: Count the earlier occurrences of each position, see
+    convert_board_to_position.
+    :return: np array of shape (K,) with dtype POSITION_DTYPE.
+    """
+    halfmove_nums = _choose_halfmove_nums(len(game.moves), positions_per_game,
+                                          rng)
+
+    board = game.setup_board(board)
+    positions = []
+    for halfmove_num, san in enumerate(game.moves, start=1):
+        try:
+            board.push_san(san)
+        except ValueError:
+            # The previous move is now the last one of the game.
+            if positions and positions[-1][0] == halfmove_num - 1:
+                positions.pop()
+            if stats is not None:
+                stats.count('truncated_games')
+            break
+        if halfmove_num in halfmove_nums and halfmove_num < len(game.moves):
+            positions.append((halfmove_num,
+                              convert_board_to_position(board,
+                                                        repetitions)))
+
+    return _make_positions([position for _, position in positions])
+
+
+def split_games(pgn_file, start=0, end=None, with_offsets=False):
+    """
+    Generates the PGN text of each game in a file with multiple chess games.
+    Games are separated by counting blank lines, see extract_game. The file is
+    read in large blocks, see chess_engine.data.splitter.split_game_buffers.
+
+    :param pgn_file: File with multiple PGNs. Each PGN should be separated by a
+    single newline character. And the file should end with 2 newline characters.
+    :param start: Byte offset to start reading from. Must be the first byte of
+    a game, e.g. an offset returned by find_shard_offsets.
+    :param end: Byte offset to stop at. Games that start at or after this
+    offset are not returned. Defaults to the end of the file.
+    :param with_offsets: Yield (end offset, PGN string) tuples instead, where
+    the end offset is the byte offset right after the game.
+    :return: Returns an iterator of PGN strings.
+    """
+    for position, game in split_game_buffers(pgn_file, start, end):
+        if with_offsets:
+            yield position, str(game, 'utf-8')
+        else:
+            yield str(game, 'utf-8')
+
+
+def extract_game(pgn_file, start=0, end=None):
     """
     Generates chess.pgn.game objects from a file with multiple chess games in
     PGN format.
 
     :param pgn_file: File with multiple PGNs. Each PGN should be separated by a
     single newline character. And the file should end with 2 newline characters.
+    :param start: Byte offset to start reading from. Must be the first byte of
+    a game, e.g. an offset returned by find_shard_offsets.
+    :param end: Byte offset to stop at. Games that start at or after this
+    offset are not returned. Defaults to the end of the file.
     :return: Returns an iterator. Each call to next() will return a
     chess.pgn.game object.
     """
-    with open(pgn_file, 'r') as file:
-        current_pgn = ''
-        newline_count = 0
-        for line in file:
-            current_pgn += line
-            if line == '\n':
-                newline_count += 1
-            if newline_count == 2:  # end of PGN
-                pgn_io = io.StringIO(current_pgn)
-                yield chess.pgn.read_game(pgn_io)
-                current_pgn = ''
-                newline_count = 0
+    for pgn in split_games(pgn_file, start, end):
+        pgn_io = io.StringIO(pgn)
+        yield chess.pgn.read_game(pgn_io)
+
+
+def find_next_game_offset(file, offset: int) -> int:
+    """
+    Returns the byte offset of the first game that starts at or after offset.
+    A game starts on a header line ('[') directly after a blank line, which is
+    the same boundary extract_game finds by counting blank lines.
+
+    :param file: PGN file opened in binary mode.
+    :param offset: Byte offset to start searching from.
+    :return: Byte offset of the next game, or the file size if there is none.
+    """
+    if offset <= 0:
+        return 0
+    file.seek(offset - 1)
+    position = offset - 1 + len(file.readline())  # skip the partial line
+    previous_line_blank = False
+    for line in file:
+        if previous_line_blank and line.startswith(b'['):
+            return position
+        previous_line_blank = line in (b'\n', b'\r\n')
+        position += len(line)
+    return position
+
+
+def find_shard_offsets(pgn_file, n_shards: int) -> List[int]:
+    """
+    Splits a PGN file into n_shards byte ranges of roughly equal size. Every
+    range starts at a game boundary, so each shard can be parsed on its own
+    with extract_game(pgn_file, start, end).
+
+    :param pgn_file: File with multiple PGNs.
+    :param n_shards: Number of shards.
+    :return: List of n_shards + 1 increasing byte offsets. Shard i covers
+    offsets[i] up to offsets[i + 1].
+    """
+    size = os.path.getsize(pgn_file)
+    offsets = [0]
+    with open(pgn_file, 'rb') as file:
+        for i in range(1, n_shards):
+            approximate_offset = max(size * i // n_shards, offsets[-1])
+            offsets.append(find_next_game_offset(file, approximate_offset))
+    offsets.append(size)
+    return offsets
 
 
 def print_dataset_status(max_n):
@@ -105,33 +312,112 @@ def print_dataset_status(max_n):
         print(max_n, 'games left to extract.')
 
 
-def create_state_result_dataset(dataset_filename, max_n=None):
+def generate_shard_samples(dataset_filename, start=0, end=None, max_n=None,
+                           rng=None, index_filename=None,
+                           positions_per_game=1, fast_parser=False,
+                           raw=False, header_filter=None, stats=None,
+                           repetitions=True):
     """
-    Given a file with multiple PGNs, selects a random state in each PGN,
-    converts the state to a numpy array, and returns the array along with the
-    game outcome.
-    :param dataset_filename: File with multiple PGNs. Each PGN should be separated by
-    a single newline character. And the file should end with 2 newline
-    characters.
+    Samples states from the decisive games that start between the byte
+    offsets start and end. Only the headers of each game are read first, so
+    draws, unfinished games and games that do not match header_filter are
+    skipped before their moves are parsed.
+
+    The time spent splitting, parsing and replaying the games, and the
+    number of games, bytes, positions and skipped games, are added to stats.
+
+    :param dataset_filename: File with multiple PGNs.
+    :param start: Byte offset of the first game in the shard.
+    :param end: Byte offset where the shard ends. Defaults to end of file.
     :param max_n: Max number of games to extract.
-    :return: Tuple[np array, np array]
+    :param rng: random.Random used to pick the sampled states. Defaults to the
+    module level random generator.
+    :param index_filename: Game index of dataset_filename built by
+    chess_engine.data.index. When given, draws and unfinished games are
+    skipped using the index, without parsing them.
+    :param positions_per_game: Number of states to sample per game. 0 samples
+    every state.
+    :param fast_parser: Read only the headers and mainline SAN of each game
+    with read_mainline_game and replay them on a single reusable board,
+    instead of building a chess.pgn.Game tree.
+    :param raw: dataset_filename is a raw .pgn file, a directory of them or
+    the KingBase .zip archive, which is cleaned on the fly as it is read, see
+    chess_engine.data.ingest. start, end and index_filename are not supported.
+    :param header_filter: Filter expression on the headers, e.g.
+    'Elo>=2600, Year>=2010', see chess_engine.data.filters.
+    :param stats: chess_engine.data.profiling.PipelineStats to add to.
+    :param repetitions: Count the earlier occurrences of each sampled
+    position. Only the repetition feature needs them.
+    :return: Returns an iterator. Each call to next() returns the positions
+    of the states sampled from one game, see sample_game_positions, the game
+    result as an int and the byte offset where the following game starts,
+    None for raw files.
     """
+    if stats is None:
+        stats = PipelineStats()
+    conditions = parse_header_filter(header_filter) if header_filter else []
+    if raw:
+        if start or end is not None or index_filename is not None:
+            raise ValueError('Raw PGN files can only be read from start to '
+                             'end, without an index.')
+        pgns = ((None, pgn) for pgn in split_raw_games(dataset_filename))
+    elif index_filename is None:
+        pgns = split_games(dataset_filename, start, end, with_offsets=True)
+    else:
+        index = filter_game_index(load_game_index(index_filename))
+        in_shard = index['offset'] >= start
+        if end is not None:
+            in_shard &= index['offset'] < end
+        index = index[in_shard]
+        pgns = zip((index['offset'] + index['length']).tolist(),
+                   split_indexed_games(dataset_filename, index))
 
-    x_list = []
-    y_list = []
+    pgns = iter(pgns)
+    board = chess.Board()
+    while True:
+        with stats.time(SPLIT):
+            next_pgn = next(pgns, None)
+        if next_pgn is None:
+            break
+        next_offset, pgn = next_pgn
+        stats.count('games_read')
+        stats.count('bytes', len(pgn))
 
-    for game in extract_game(dataset_filename):
-        fen, game_result = sample_random_game_state_result(game)
+        with stats.time(HEADERS):
+            header_text, movetext = split_headers_movetext(pgn)
+            headers = read_headers(header_text)
+        game_result = headers.get('Result', '*')
 
-        # Filter out draws and incomplete games
+        # Filter out draws, incomplete games and the games the filter
+        # rejects without parsing their moves.
         if game_result in {'1/2-1/2', '*'}:
+            stats.count('draws_skipped' if game_result == '1/2-1/2'
+                        else 'unfinished_skipped')
             continue
+        if conditions and not matches_header_filter(headers, conditions):
+            stats.count('filtered_skipped')
+            continue
+
+        with stats.time(PARSE):
+            if fast_parser:
+                game = MainlineGame(headers, read_mainline_san(movetext))
+            else:
+                game = chess.pgn.read_game(io.StringIO(pgn))
 
-        array = convert_fen_to_array(fen)
+        with stats.time(REPLAY):
+            if fast_parser:
+                positions = sample_mainline_game_positions(
+                    game, positions_per_game, rng, board, stats, repetitions)
+            else:
+                if game.errors:
+                    stats.count('truncated_games')
+                positions = sample_game_positions(game, positions_per_game,
+                                                  rng, repetitions)
         game_result_int = convert_game_result_to_int(game_result)
+        stats.count('games_sampled')
+        stats.count('positions', len(positions))
 
-        x_list.append(array)
-        y_list.append(game_result_int)
+        yield positions, game_result_int, next_offset
 
         if max_n:
             max_n -= 1
@@ -139,12 +425,494 @@ def create_state_result_dataset(dataset_filename, max_n=None):
             if max_n == 0:
                 break
 
-    x = np.stack(x_list, axis=0)
-    y = np.stack(y_list, axis=0)
 
+def _stack_samples(samples, with_hashes=False, features=DEFAULT_FEATURES,
+                   stats=None):
+    positions_list = []
+    y_list = []
+    for positions, game_result_int, _ in samples:
+        positions_list.append(positions)
+        y_list.append(np.full(len(positions), game_result_int))
+
+    with (stats or PipelineStats()).time(WRITE):
+        return _concatenate_samples(positions_list, y_list, with_hashes,
+                                    features)
+
+
+def _concatenate_samples(positions_list, y_list, with_hashes, features):
+    game_sizes = np.array([len(positions) for positions in positions_list],
+                          dtype=int)
+    if not positions_list:
+        positions_list.append(np.empty((0,), POSITION_DTYPE))
+        y_list.append(np.empty((0,), int))
+
+    positions = np.concatenate(positions_list, axis=0)
+    x = encode_positions(positions, features)
+    y = np.concatenate(y_list, axis=0)
+    hashes = zobrist_hash_positions(positions) if with_hashes else None
+
+    return x, y, game_sizes, hashes
+
+
+def create_shard_state_result_dataset(dataset_filename, start=0, end=None,
+                                      features=DEFAULT_FEATURES, **kwargs):
+    """
+    Builds the state/result dataset for the games that start between the
+    byte offsets start and end. See generate_shard_samples for the keyword
+    arguments.
+
+    :param dataset_filename: File with multiple PGNs.
+    :param start: Byte offset of the first game in the shard.
+    :param end: Byte offset where the shard ends. Defaults to end of file.
+    :param features: Names of the registered features to encode the states
+    with, see chess_engine.features.registry.
+    :return: Tuple[np array, np array]
+    """
+    x, y, _, _ = _stack_samples(
+        generate_shard_samples(dataset_filename, start, end,
+                               repetitions=uses_repetitions(features),
+                               **kwargs),
+        features=features)
+    return x, y
+
+
+def _make_shard_rng(random_seed, shard_num) -> Optional[Random]:
+    if random_seed is None:
+        return None
+    return Random('{}:{}'.format(random_seed, shard_num))
+
+
+def _make_shards(dataset_filename, workers) -> List[Tuple[int, int, int]]:
+    offsets = find_shard_offsets(dataset_filename, workers)
+    return [(shard_num, start, end)
+            for shard_num, (start, end) in enumerate(zip(offsets[:-1],
+                                                         offsets[1:]))]
+
+
+def _create_shard_state_result_dataset(shard, random_seed=None,
+                                       with_hashes=False,
+                                       features=DEFAULT_FEATURES, **kwargs):
+    shard_num, start, end = shard
+    rng = _make_shard_rng(random_seed, shard_num)
+    stats = PipelineStats()
+    x, y, game_sizes, hashes = _stack_samples(
+        generate_shard_samples(start=start, end=end, rng=rng, stats=stats,
+                               repetitions=uses_repetitions(features),
+                               **kwargs),
+        with_hashes, features, stats)
+    return x, y, game_sizes, hashes, stats
+
+
+def _deduplicate(x, y, hashes, dedup, bloom_capacity, stats=None):
+    if dedup == 'drop':
+        bloom_filter = BloomFilter(bloom_capacity or max(len(hashes), 1))
+        keep = find_first_occurrences(hashes, bloom_filter)
+        x, y = x[keep], y[keep]
+    elif dedup == 'aggregate':
+        first_indices, wins, counts = aggregate_duplicates(hashes, y)
+        x, y = x[first_indices], wins / counts
+    else:
+        raise ValueError('dedup must be "drop" or "aggregate", got '
+                         '{}'.format(dedup))
+    if stats is not None:
+        stats.count('duplicates_skipped', len(hashes) - len(x))
     return x, y
 
 
+def create_state_result_dataset(dataset_filename, max_n=None, workers=1,
+                                random_seed=None, index_filename=None,
+                                positions_per_game=1, fast_parser=False,
+                                raw=False, dedup=None, bloom_capacity=None,
+                                features=DEFAULT_FEATURES, header_filter=None,
+                                stats=None):
+    """
+    Given a file with multiple PGNs, selects random states in each PGN,
+    converts the states to numpy arrays, and returns the arrays along with the
+    game outcome. Every game is replayed once, no matter how many states are
+    sampled from it.
+
+    With workers > 1 the file is split into byte-range shards aligned to game
+    boundaries, and every shard is parsed and encoded in its own process. The
+    shard results are concatenated in file order. Each shard gets its own
+    random generator derived from random_seed and the shard number, so the
+    output is reproducible for a given random_seed and number of workers.
+
+    :param dataset_filename: File with multiple PGNs. Each PGN should be separated by
+    a single newline character. And the file should end with 2 newline
+    characters.
+    :param max_n: Max number of games to extract.
+    :param workers: Number of processes to parse the file with.
+    :param random_seed: Seed for the sampled states. Defaults to unseeded.
+    :param index_filename: Optional game index of dataset_filename, used to
+    seek straight to the decisive games.
+    :param positions_per_game: Number of states to sample per game. 0 samples
+    every state.
+    :param fast_parser: Parse only the headers and mainline of each game, see
+    chess_engine.data.parser.read_mainline_game.
+    :param raw: Read the raw PGN files straight from dataset_filename, a .pgn
+    file, a directory of them or the KingBase .zip archive, instead of the
+    output of clean_dataset.sh. Only supported with workers=1.
+    :param dedup: Remove repeated positions, keyed by their Zobrist hash, see
+    chess_engine.data.dedup. 'drop' keeps the first occurrence of every
+    position, tracking the positions seen in a Bloom filter. 'aggregate'
+    keeps one row per position with the fraction of its games white won as
+    y. Defaults to keeping every position.
+    :param bloom_capacity: Number of positions the Bloom filter of
+    dedup='drop' is sized for. Defaults to the number of sampled positions.
+    :param features: Names of the registered features to encode the states
+    with, see chess_engine.features.registry. Every plane is computed here,
+    so training only has to read them.
+    :param header_filter: Only sample games whose headers match this filter
+    expression, e.g. 'Elo>=2600, Year>=2010'. The headers are checked before
+    the moves are parsed, see chess_engine.data.filters.
+    :param stats: chess_engine.data.profiling.PipelineStats to add the stage
+    timers and counters of every shard to.
+    :return: Tuple[np array, np array]
+    """
+    create_shard = partial(_create_shard_state_result_dataset,
+                           dataset_filename=dataset_filename,
+                           max_n=max_n,
+                           random_seed=random_seed,
+                           index_filename=index_filename,
+                           positions_per_game=positions_per_game,
+                           fast_parser=fast_parser,
+                           raw=raw,
+                           header_filter=header_filter,
+                           with_hashes=dedup is not None,
+                           features=features)
+    if raw and workers > 1:
+        raise ValueError('Raw PGN files can not be sharded, use workers=1.')
+    if workers <= 1:
+        x, y, _, hashes, shard_stats = create_shard((0, 0, None))
+        shard_stats_list = [shard_stats]
+    else:
+        with Pool(workers) as pool:
+            results = pool.map(create_shard, _make_shards(dataset_filename,
+                                                          workers))
+
+        x = np.concatenate([x for x, _, _, _, _ in results], axis=0)
+        y = np.concatenate([y for _, y, _, _, _ in results], axis=0)
+        if dedup is not None:
+            hashes = np.concatenate([hashes for _, _, _, hashes, _
+                                     in results])
+        shard_stats_list = [shard_stats for _, _, _, _, shard_stats
+                            in results]
+
+        # Each shard stops after max_n games, keep the first max_n overall.
+        if max_n:
+            game_sizes = np.concatenate([sizes for _, _, sizes, _, _
+                                         in results])
+            n_samples = int(game_sizes[:max_n].sum())
+            x, y = x[:n_samples], y[:n_samples]
+            if dedup is not None:
+                hashes = hashes[:n_samples]
+
+    if stats is not None:
+        for shard_stats in shard_stats_list:
+            stats.merge(shard_stats)
+    if dedup is not None:
+        x, y = _deduplicate(x, y, hashes, dedup, bloom_capacity, stats)
+    return x, y
+
+
+def _get_writer_class(packed):
+    return PackedStateResultWriter if packed else StateResultWriter
+
+
+def _write_shard_state_result_dataset(shard, target_dir, dataset_filename,
+                                      chunk_size=8192, max_n=None,
+                                      random_seed=None, packed=False,
+                                      checkpoint_every=None, resume=False,
+                                      append=False, record_game_sizes=False,
+                                      features=DEFAULT_FEATURES, stats=None,
+                                      dedup=None, bloom_capacity=None,
+                                      record_hashes=False, **kwargs) -> int:
+    if stats is None:
+        stats = PipelineStats()
+    bloom_filter = None
+    if dedup is not None:
+        bloom_filter = BloomFilter(bloom_capacity or DEFAULT_BLOOM_CAPACITY)
+    shard_num, start, end = shard
+    rng = _make_shard_rng(random_seed, shard_num) or Random()
+    source = get_source_key(dataset_filename)
+    checkpoint = load_checkpoint(target_dir) if resume or append else {}
+    progress = checkpoint.get(source)
+    if progress is None:
+        progress = {'offset': start, 'n_games': 0, 'done': False}
+    else:
+        set_rng_state(rng, progress['rng_state'])
+
+    mode = 'a' if source in checkpoint or append else 'w'
+    writer = _get_writer_class(packed)(target_dir, chunk_size, mode,
+                                       features)
+    game_sizes_writer = None
+    if record_game_sizes:
+        game_sizes_writer = NpyAppendWriter(join(target_dir, 'game_sizes.npy'),
+                                            np.int64, (), mode)
+    hashes_writer = None
+    if record_hashes:
+        hashes_writer = NpyAppendWriter(join(target_dir, 'hashes.npy'),
+                                        np.uint64, (), mode)
+    # Games are hashed and deduplicated chunk_size positions at a time.
+    pending_games = []
+    n_pending = 0
+
+    def write_pending():
+        nonlocal pending_games, n_pending
+        if not pending_games:
+            return
+        hashes = zobrist_hash_positions(np.concatenate(
+            [positions for positions, _ in pending_games]))
+        keep = np.ones(len(hashes), dtype=bool)
+        if bloom_filter is not None:
+            keep = find_first_occurrences(hashes, bloom_filter)
+            stats.count('duplicates_skipped', int(np.sum(~keep)))
+        if hashes_writer is not None:
+            hashes_writer.write(hashes[keep])
+        game_start = 0
+        for positions, game_result_int in pending_games:
+            game_end = game_start + len(positions)
+            write_game(positions[keep[game_start:game_end]], game_result_int)
+            game_start = game_end
+        pending_games, n_pending = [], 0
+
+    def write_game(positions, game_result_int):
+        writer.append(positions, game_result_int)
+        if game_sizes_writer is not None:
+            game_sizes_writer.write(np.array([len(positions)]))
+
+    with writer:
+        if 'n_samples' in progress and not progress['done']:
+            # Drop whatever was written after the last checkpoint.
+            writer.truncate(progress['n_samples'])
+            if game_sizes_writer is not None:
+                game_sizes_writer.truncate(progress['n_games'])
+
+        def save(done=False):
+            write_pending()
+            writer.flush()
+            progress.update(offset=offset, rng_state=get_rng_state(rng),
+                            n_samples=writer.n_samples, n_games=n_games,
+                            done=done)
+            checkpoint[source] = progress
+            save_checkpoint(target_dir, checkpoint)
+
+        offset, n_games = progress['offset'], progress['n_games']
+        games_left = max_n - n_games if max_n else None
+        if not progress['done'] and 'n_samples' not in progress \
+                and (checkpoint_every or resume or append):
+            # Record where the samples of this source start, so the ones
+            # written before an interruption are dropped even if it came
+            # before the first checkpoint.
+            save()
+        if not progress['done']:
+            if games_left != 0:
+                for positions, game_result_int, offset in \
+                        generate_shard_samples(dataset_filename, start=offset,
+                                               end=end, max_n=games_left,
+                                               rng=rng, stats=stats,
+                                               repetitions=uses_repetitions(
+                                                   features),
+                                               **kwargs):
+                    with stats.time(WRITE):
+                        if bloom_filter is None and hashes_writer is None:
+                            write_game(positions, game_result_int)
+                        else:
+                            pending_games.append((positions,
+                                                  game_result_int))
+                            n_pending += len(positions)
+                            if n_pending >= chunk_size:
+                                write_pending()
+                    n_games += 1
+                    if checkpoint_every and n_games % checkpoint_every == 0:
+                        save()
+            if checkpoint_every or resume or append:
+                save(done=True)
+        with stats.time(WRITE):
+            write_pending()
+            writer.flush()
+        n_samples = writer.n_samples
+
+    for extra_writer in (game_sizes_writer, hashes_writer):
+        if extra_writer is not None:
+            extra_writer.close()
+    return n_samples
+
+
+def _run_with_stats(function, *args) -> PipelineStats:
+    stats = PipelineStats()
+    function(*args, stats=stats)
+    return stats
+
+
+def write_state_result_dataset(dataset_filename, target_dir, max_n=None,
+                               workers=1, random_seed=None, chunk_size=8192,
+                               packed=False, checkpoint_every=None,
+                               resume=False, append=False,
+                               features=DEFAULT_FEATURES, stats=None,
+                               dedup=None, bloom_capacity=None, **kwargs):
+    """
+    Streaming version of create_state_result_dataset. Samples are written to
+    x.npy and y.npy in target_dir in chunks of chunk_size as the games are
+    processed, so memory use stays flat no matter how large the dataset is,
+    and the files written so far can be loaded if the run is interrupted.
+    With packed=True a single bit-packed samples.npy is written instead, see
+    chess_engine.data.packed.
+
+    With workers > 1 every shard is streamed to its own files in
+    target_dir/shards/, which are then concatenated in file order, chunk by
+    chunk, and removed.
+
+    With checkpoint_every, the byte offset of the next game, the state of the
+    random generator and the number of samples written are saved to
+    target_dir/checkpoint.json every checkpoint_every games, see
+    chess_engine.data.checkpoint. A run started again with resume=True and the
+    same arguments drops the samples written after the last checkpoint and
+    carries on from there, producing the same files as an uninterrupted run.
+    With append=True the samples of dataset_filename are appended to the
+    x.npy and y.npy already in target_dir, not written to new files, unless
+    the checkpoint shows that dataset_filename has been processed before.
+
+    With dedup='drop' only the first occurrence of every position is written.
+    The positions seen are tracked in a Bloom filter of bloom_capacity
+    positions, so memory use stays bounded. Games are hashed chunk_size
+    positions at a time. With workers > 1 the shards record the Zobrist
+    hashes of their positions and the duplicates are dropped during the
+    merge, in file order.
+
+    :param dataset_filename: File with multiple PGNs.
+    :param target_dir: Directory for x.npy and y.npy.
+    :param max_n: Max number of games to extract.
+    :param workers: Number of processes to parse the file with.
+    :param random_seed: Seed for the sampled states. Defaults to unseeded.
+    :param chunk_size: Number of samples encoded and written at once.
+    :param packed: Write the bit-packed format.
+    :param checkpoint_every: Number of games between checkpoints. Defaults to
+    no checkpoints.
+    :param resume: Pick up an interrupted run from its last checkpoint.
+    :param append: Append to the dataset in target_dir.
+    :param features: Names of the registered features to encode the states
+    with. They are recorded in target_dir/features.json, see
+    chess_engine.features.registry.
+    :param stats: chess_engine.data.profiling.PipelineStats to add the stage
+    timers and counters of every shard, and the time of the merge, to.
+    :param dedup: None to keep every position, or 'drop'. Can not be combined
+    with checkpoints, resume or append, because the Bloom filter is not
+    saved.
+    :param bloom_capacity: Number of positions the Bloom filter is sized for.
+    Defaults to chess_engine.data.dedup.DEFAULT_BLOOM_CAPACITY.
+    :param kwargs: index_filename, positions_per_game, fast_parser, raw and
+    header_filter, see create_state_result_dataset. Raw files are only supported with
+    workers=1 and without checkpoints.
+    :return: Number of samples in target_dir.
+    """
+    if kwargs.get('raw') and (workers > 1 or checkpoint_every or resume):
+        raise ValueError('Raw PGN files can not be sharded or checkpointed.')
+    if dedup not in (None, 'drop'):
+        raise ValueError('Streamed datasets support dedup="drop" only, got '
+                         '{}'.format(dedup))
+    if dedup is not None and (checkpoint_every or resume or append):
+        raise ValueError('dedup can not be combined with checkpoints, resume '
+                         'or append.')
+    write_shard = partial(_write_shard_state_result_dataset,
+                          dataset_filename=dataset_filename,
+                          chunk_size=chunk_size,
+                          max_n=max_n,
+                          random_seed=random_seed,
+                          packed=packed,
+                          checkpoint_every=checkpoint_every,
+                          resume=resume,
+                          features=features,
+                          **kwargs)
+    if stats is None:
+        stats = PipelineStats()
+    if workers <= 1:
+        return write_shard((0, 0, None), target_dir=target_dir, append=append,
+                           stats=stats, dedup=dedup,
+                           bloom_capacity=bloom_capacity)
+
+    source = get_source_key(dataset_filename)
+    checkpoint = load_checkpoint(target_dir) if resume or append else {}
+    progress = checkpoint.get(source)
+    writer_class = _get_writer_class(packed)
+    if progress is not None and progress['done']:
+        with writer_class(target_dir, chunk_size, 'a', features) as writer:
+            return writer.n_samples
+
+    if progress is not None:
+        offsets = progress['shard_offsets']
+        shards = [(shard_num, start, end) for shard_num, (start, end)
+                  in enumerate(zip(offsets[:-1], offsets[1:]))]
+    else:
+        shards = _make_shards(dataset_filename, workers)
+        offsets = [start for _, start, _ in shards] + [shards[-1][2]]
+    shard_dirs = [join(target_dir, 'shards', '{:05d}'.format(shard_num))
+                  for shard_num, _, _ in shards]
+    mode = 'a' if progress is not None or append else 'w'
+    with writer_class(target_dir, chunk_size, mode, features) as writer:
+        if progress is None:
+            progress = {'shard_offsets': offsets,
+                        'merge_start': writer.n_samples, 'done': False}
+            if checkpoint_every or append:
+                checkpoint[source] = progress
+                save_checkpoint(target_dir, checkpoint)
+
+        # Shards resume from the checkpoints in their own directories.
+        write_shard = partial(write_shard, append=False,
+                              record_game_sizes=True,
+                              record_hashes=dedup is not None)
+        with Pool(workers) as pool:
+            for shard_stats in pool.starmap(partial(_run_with_stats,
+                                                    write_shard),
+                                            zip(shards, shard_dirs)):
+                stats.merge(shard_stats)
+
+        # A merge that was interrupted is started over.
+        merge_start_time = time.perf_counter()
+        writer.truncate(progress['merge_start'])
+        bloom_filter = None
+        if dedup is not None:
+            bloom_filter = BloomFilter(bloom_capacity
+                                       or DEFAULT_BLOOM_CAPACITY)
+        games_left = max_n
+        for shard_dir in shard_dirs:
+            arrays = writer_class.load(shard_dir)
+            if bloom_filter is not None:
+                hashes = np.load(join(shard_dir, 'hashes.npy'),
+                                 mmap_mode='r')
+            game_sizes = np.load(join(shard_dir, 'game_sizes.npy'))
+            n_samples = int(game_sizes.sum())
+            # Each shard stops after max_n games, keep the first max_n overall.
+            if max_n:
+                n_samples = int(game_sizes[:games_left].sum())
+                games_left -= min(games_left, len(game_sizes))
+            for i in range(0, n_samples, chunk_size):
+                chunk_end = min(i + chunk_size, n_samples)
+                chunk = [array[i:chunk_end] for array in arrays]
+                if bloom_filter is not None:
+                    keep = find_first_occurrences(
+                        np.asarray(hashes[i:chunk_end]), bloom_filter)
+                    stats.count('duplicates_skipped', int(np.sum(~keep)))
+                    chunk = [array[keep] for array in chunk]
+                writer.append_arrays(*chunk)
+            del arrays
+            if bloom_filter is not None:
+                del hashes
+        writer.flush()
+        n_samples = writer.n_samples
+        stats.stage_seconds[MERGE] += time.perf_counter() - merge_start_time
+
+    if checkpoint_every or resume or append:
+        progress.update(n_samples=n_samples, done=True)
+        checkpoint[source] = progress
+        save_checkpoint(target_dir, checkpoint)
+    for shard_dir in shard_dirs:
+        shutil.rmtree(shard_dir)
+    os.rmdir(join(target_dir, 'shards'))
+
+    return n_samples
+
+
 if __name__ == '__main__':
     # TODO - add an overall description.
     parser = argparse.ArgumentParser(description='Converts a clean PGN file'
@@ -166,8 +934,136 @@ if __name__ == '__main__':
                         type=int,
                         help='Max number of games to parse and output into the '
                              'numpy dataset.')
+    parser.add_argument('--workers',
+                        default=1,
+                        type=int,
+                        help='Number of processes. The PGN file is split into '
+                             'one shard per process.')
+    parser.add_argument('--seed',
+                        default=None,
+                        type=int,
+                        help='Random seed for the sampled states. Output is '
+                             'reproducible for a given seed and --workers.')
+    parser.add_argument('--index_path',
+                        default=None,
+                        help='Game index built by chess_engine.data.index. '
+                             'Draws and unfinished games are skipped without '
+                             'being parsed.')
+    parser.add_argument('--positions-per-game',
+                        dest='positions_per_game',
+                        default=1,
+                        type=int,
+                        help='Number of states to sample from each game. 0 '
+                             'samples every state. Each game is replayed once.')
+    parser.add_argument('--fast-parser',
+                        dest='fast_parser',
+                        action='store_true',
+                        help='Read only the headers and mainline moves of each '
+                             'game instead of building a full chess.pgn.Game.')
+    parser.add_argument('--raw',
+                        action='store_true',
+                        help='--clean_dataset_path is a raw .pgn file, a '
+                             'directory of them or the KingBase .zip archive. '
+                             'It is cleaned on the fly, without running '
+                             'clean_dataset.sh first.')
+    parser.add_argument('--chunk_size',
+                        default=8192,
+                        type=int,
+                        help='Number of samples encoded and appended to x.npy '
+                             'and y.npy at once.')
+    parser.add_argument('--packed',
+                        action='store_true',
+                        help='Write a bit-packed samples.npy (99 bytes per '
+                             'sample) instead of x.npy and y.npy.')
+    parser.add_argument('--checkpoint_every',
+                        default=None,
+                        type=int,
+                        help='Save the progress to checkpoint.json in '
+                             '--target_dir every this many games.')
+    parser.add_argument('--resume',
+                        action='store_true',
+                        help='Continue an interrupted run from its last '
+                             'checkpoint. Use the same arguments as the '
+                             'interrupted run.')
+    parser.add_argument('--append',
+                        action='store_true',
+                        help='Append the samples of --clean_dataset_path to '
+                             'x.npy and y.npy in --target_dir. Source files '
+                             'that were already processed into it are '
+                             'skipped.')
+    parser.add_argument('--features',
+                        default=','.join(DEFAULT_FEATURES),
+                        help='Comma-separated input planes to compute, out '
+                             'of {}. They are recorded in features.json in '
+                             '--target_dir.'.format(', '.join(FEATURES)))
+    parser.add_argument('--dedup',
+                        action='store_const',
+                        const='drop',
+                        help='Write only the first occurrence of every '
+                             'position, tracked in a Bloom filter. Not '
+                             'supported with --checkpoint_every, --resume or '
+                             '--append.')
+    parser.add_argument('--bloom_capacity',
+                        default=None,
+                        type=int,
+                        help='Number of positions the --dedup Bloom filter '
+                             'is sized for, {} by default.'.format(
+                                 DEFAULT_BLOOM_CAPACITY))
+    parser.add_argument('--filter',
+                        default=None,
+                        help="Only sample the games whose headers match, e.g. "
+                             "'Elo>=2600, Year>=2010' or 'WhiteElo>2500 and "
+                             "ECO>=B20'. Games are rejected before their "
+                             "moves are parsed. See "
+                             "chess_engine/data/filters.py.")
+    parser.add_argument('--stats_path',
+                        default=None,
+                        help='JSON file to write the stage timers and counters '
+                             'of the run to. Defaults to stats.json in '
+                             '--target_dir.')
+    parser.add_argument('--profile',
+                        default=None,
+                        choices=PROFILERS,
+                        help='Profile the main process with cProfile or with '
+                             'a sampling profiler. Run with --workers 1 to '
+                             'profile the whole pipeline.')
+    parser.add_argument('--profile_path',
+                        default=None,
+                        help='File to write the profile to. Defaults to '
+                             'profile.prof (cprofile) or profile.txt '
+                             '(sampling, collapsed stacks) in --target_dir.')
     args = parser.parse_args()
-    x, y = create_state_result_dataset(args.clean_dataset_path,
-                                       max_n=args.max_n)
-    np.save(target_dir + 'x.npy', x)
-    np.save(target_dir + 'y.npy', y)
+    stats_path = args.stats_path or join(args.target_dir, 'stats.json')
+    profile_path = args.profile_path or join(
+        args.target_dir,
+        'profile.prof' if args.profile == 'cprofile' else 'profile.txt')
+
+    run_stats = PipelineStats()
+    os.makedirs(args.target_dir, exist_ok=True)
+    with run_profiler(args.profile, profile_path):
+        n_samples = write_state_result_dataset(
+            args.clean_dataset_path,
+            args.target_dir,
+            max_n=args.max_n,
+            workers=args.workers,
+            random_seed=args.seed,
+            chunk_size=args.chunk_size,
+            packed=args.packed,
+            index_filename=args.index_path,
+            positions_per_game=args.positions_per_game,
+            fast_parser=args.fast_parser,
+            raw=args.raw,
+            checkpoint_every=args.checkpoint_every,
+            resume=args.resume,
+            append=args.append,
+            features=args.features.split(','),
+            header_filter=args.filter,
+            dedup=args.dedup,
+            bloom_capacity=args.bloom_capacity,
+            stats=run_stats)
+    run_stats.finish()
+    print(run_stats.format_summary())
+    write_stats_summary(run_stats, stats_path, n_samples=n_samples,
+                        workers=args.workers, fast_parser=args.fast_parser,
+                        features=args.features.split(','),
+                        header_filter=args.filter)
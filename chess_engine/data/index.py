@@ -0,0 +1,165 @@
+import argparse
+import io
+import re
+from typing import Iterable, Optional
+
+import chess.pgn
+import numpy as np
+
+from chess_engine.data.parser import read_mainline_san
+from chess_engine.data.splitter import BLANK_LINE_PATTERN, split_game_buffers
+
+# One fixed-size record per game, 24 bytes each.
+GAME_INDEX_DTYPE = np.dtype([('offset', np.uint64),
+                             ('length', np.uint32),
+                             ('ply_count', np.uint16),
+                             ('white_elo', np.uint16),
+                             ('black_elo', np.uint16),
+                             ('year', np.uint16),
+                             ('result', np.uint8),
+                             ('padding', np.uint8, (3,))])
+
+# Uses the same encoding as serializer.convert_game_result_to_int for decisive
+# games.
+RESULT_CODES = {'1-0': 1, '0-1': 0, '1/2-1/2': 2, '*': 3}
+RESULT_UNKNOWN = 3
+
+HEADER_PATTERN = re.compile(rb'^\[(\w+)\s+"(.*)"\]', re.MULTILINE)
+
+
+def get_index_filename(pgn_file) -> str:
+    return str(pgn_file) + '.idx.npy'
+
+
+def count_plies(movetext: bytes) -> int:
+    """
+    Counts the halfmoves in the movetext of a PGN without replaying them.
+
+    :param movetext: Movetext section of a PGN.
+    :return: Number of halfmoves in the mainline.
+    """
+    return len(read_mainline_san(movetext.decode()))
+
+
+def _parse_int(value: bytes) -> int:
+    digits = re.match(rb'\d+', value)
+    return int(digits.group()) if digits else 0
+
+
+def _make_record(offset, length, headers, movetext):
+    return (offset,
+            length,
+            min(count_plies(movetext), np.iinfo(np.uint16).max),
+            _parse_int(headers.get(b'WhiteElo', b'')),
+            _parse_int(headers.get(b'BlackElo', b'')),
+            _parse_int(headers.get(b'Date', b'')),
+            RESULT_CODES.get(headers.get(b'Result', b'').decode(),
+                             RESULT_UNKNOWN),
+            (0, 0, 0))
+
+
+def build_game_index(pgn_file) -> np.ndarray:
+    """
+    Scans a file with multiple PGNs once and records the byte offset and
+    length of each game, along with the result, ply count, Elo ratings and
+    year. Game boundaries are found the same way extract_game finds them, by
+    counting blank lines.
+
+    :param pgn_file: File with multiple PGNs. Each PGN should be separated by a
+    single newline character. And the file should end with 2 newline characters.
+    :return: Structured np array with GAME_INDEX_DTYPE, one row per game.
+    """
+    records = []
+    offset = 0
+    for position, game in split_game_buffers(pgn_file):
+        headers_end = BLANK_LINE_PATTERN.search(game).end()
+        headers = dict(HEADER_PATTERN.findall(game[:headers_end]))
+        records.append(_make_record(offset, position - offset, headers,
+                                    bytes(game[headers_end:])))
+        offset = position
+
+    return np.array(records, dtype=GAME_INDEX_DTYPE)
+
+
+def save_game_index(index: np.ndarray, index_file):
+    np.save(index_file, index)
+
+
+def load_game_index(index_file, mmap: bool = True) -> np.ndarray:
+    """
+    Loads an index saved by build_game_index.
+
+    :param index_file: Path of the .npy index.
+    :param mmap: Memory-map the index instead of reading it into memory.
+    :return: Structured np array with GAME_INDEX_DTYPE.
+    """
+    index = np.load(index_file, mmap_mode='r' if mmap else None)
+    if index.dtype != GAME_INDEX_DTYPE:
+        raise ValueError('{} is not a game index'.format(index_file))
+    return index
+
+
+def filter_game_index(index: np.ndarray, decisive_only: bool = True,
+                      min_elo: Optional[int] = None,
+                      min_ply_count: Optional[int] = None) -> np.ndarray:
+    """
+    Selects the games in an index that match every given condition.
+
+    :param index: Game index from build_game_index or load_game_index.
+    :param decisive_only: Drop draws and unfinished games.
+    :param min_elo: Minimum rating of both players.
+    :param min_ply_count: Minimum number of halfmoves.
+    :return: The matching rows of the index.
+    """
+    mask = np.ones(len(index), dtype=bool)
+    if decisive_only:
+        mask &= index['result'] <= 1
+    if min_elo is not None:
+        mask &= np.minimum(index['white_elo'], index['black_elo']) >= min_elo
+    if min_ply_count is not None:
+        mask &= index['ply_count'] >= min_ply_count
+    return index[mask]
+
+
+def split_indexed_games(pgn_file, index: Iterable) -> Iterable[str]:
+    """
+    Generates the PGN text of the rows of a game index, seeking straight to
+    each game instead of streaming the file from the start.
+
+    :param pgn_file: The PGN file the index was built from.
+    :param index: Rows of a game index.
+    :return: Returns an iterator of PGN strings.
+    """
+    with open(pgn_file, 'rb') as file:
+        for row in index:
+            file.seek(int(row['offset']))
+            yield file.read(int(row['length'])).decode()
+
+
+def extract_indexed_games(pgn_file, index: Iterable) -> Iterable[chess.pgn.Game]:
+    """
+    Generates chess.pgn.Game objects for the rows of a game index. See
+    split_indexed_games.
+
+    :param pgn_file: The PGN file the index was built from.
+    :param index: Rows of a game index.
+    :return: Returns an iterator of chess.pgn.Game objects.
+    """
+    for pgn in split_indexed_games(pgn_file, index):
+        yield chess.pgn.read_game(io.StringIO(pgn))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Builds a byte-offset index '
+                                                 'of the games in a clean PGN '
+                                                 'file.')
+    parser.add_argument('pgn_file',
+                        help='The clean_dataset.pgn file to index.')
+    parser.add_argument('--index_file',
+                        default=None,
+                        help='Where to save the index. Defaults to '
+                             '<pgn_file>.idx.npy')
+    args = parser.parse_args()
+    index = build_game_index(args.pgn_file)
+    save_game_index(index, args.index_file or get_index_filename(args.pgn_file))
+    print(len(index), 'games indexed.')
@@ -0,0 +1,142 @@
+import argparse
+import glob
+import io
+import unicodedata
+import zipfile
+from os.path import isdir, join
+from typing import BinaryIO, Iterator
+
+import chess.pgn
+
+# Characters that do not decompose into ASCII, approximated the way
+# iconv -t ascii//TRANSLIT does.
+TRANSLITERATIONS = str.maketrans({
+    'ß': 'ss', 'æ': 'ae', 'Æ': 'AE', 'œ': 'oe', 'Œ': 'OE', 'ø': 'o',
+    'Ø': 'O', 'ł': 'l', 'Ł': 'L', 'đ': 'd', 'Đ': 'D', 'ð': 'd', 'Ð': 'D',
+    'þ': 'th', 'Þ': 'TH', 'ı': 'i', '‘': "'", '’': "'", '‚': "'",
+    '“': '"', '”': '"', '„': '"', '«': '"', '»': '"', '–': '-', '—': '-',
+    '…': '...', '\r': None,
+})
+
+
+def clean_line(line: bytes) -> str:
+    """
+    Does to a single line what data/clean_dataset.sh does to the whole raw
+    dataset: converts it from UTF-8 to ASCII, approximating characters that
+    can't be converted with something similar looking, dropping them
+    otherwise, and removes windows carriage returns.
+
+    :param line: A line of a raw PGN file.
+    :return: The line as ASCII text.
+    """
+    text = line.decode('utf-8', errors='ignore').translate(TRANSLITERATIONS)
+    if text.isascii():
+        return text
+    text = unicodedata.normalize('NFKD', text)
+    return text.encode('ascii', errors='ignore').decode('ascii')
+
+
+def open_raw_pgn_files(path) -> Iterator[BinaryIO]:
+    """
+    Opens the raw PGN files in path one after the other, in the order
+    clean_dataset.sh concatenates them.
+
+    :param path: A .pgn file, a directory of .pgn files like data/raw, or a
+    .zip archive of .pgn files like the KingBase download.
+    :return: Iterator of binary files, each closed once the next one is
+    requested.
+    """
+    if isdir(path):
+        for filename in sorted(glob.glob(join(path, '*.pgn'))):
+            with open(filename, 'rb') as file:
+                yield file
+    elif zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for name in sorted(archive.namelist()):
+                if name.lower().endswith('.pgn'):
+                    with archive.open(name) as file:
+                        yield file
+    else:
+        with open(path, 'rb') as file:
+            yield file
+
+
+def iterate_clean_lines(path) -> Iterator[str]:
+    """
+    Streams the cleaned lines of the raw PGN files in path, see
+    open_raw_pgn_files and clean_line. Nothing is written to disk.
+    """
+    for file in open_raw_pgn_files(path):
+        for line in file:
+            yield clean_line(line)
+
+
+def split_raw_games(path) -> Iterator[str]:
+    """
+    Generates the cleaned PGN text of each game in the raw PGN files in path.
+    Games are separated by counting blank lines, like
+    chess_engine.data.generate_dataset.split_games does for the output of
+    clean_dataset.sh.
+
+    :param path: A .pgn file, a directory of .pgn files or a .zip archive of
+    .pgn files.
+    :return: Returns an iterator of PGN strings.
+    """
+    current_pgn = []
+    newline_count = 0
+    for line in iterate_clean_lines(path):
+        current_pgn.append(line)
+        if line == '\n':
+            newline_count += 1
+        if newline_count == 2:  # end of PGN
+            yield ''.join(current_pgn)
+            current_pgn = []
+            newline_count = 0
+
+
+def extract_raw_game(path) -> Iterator[chess.pgn.Game]:
+    """
+    Generates chess.pgn.game objects straight from the raw PGN files in path,
+    without writing a cleaned copy of them first.
+
+    :param path: A .pgn file, a directory of .pgn files or a .zip archive of
+    .pgn files.
+    :return: Returns an iterator. Each call to next() will return a
+    chess.pgn.game object.
+    """
+    for pgn in split_raw_games(path):
+        yield chess.pgn.read_game(io.StringIO(pgn))
+
+
+def write_clean_dataset(path, clean_dataset_filename) -> int:
+    """
+    Python version of data/clean_dataset.sh. Cleans the raw PGN files in path
+    in a single streaming pass into clean_dataset_filename, without the
+    intermediate concatenated copy.
+
+    :param path: A .pgn file, a directory of .pgn files or a .zip archive of
+    .pgn files.
+    :param clean_dataset_filename: Where to write the cleaned PGN file.
+    :return: Number of bytes written.
+    """
+    n_bytes = 0
+    with open(clean_dataset_filename, 'w', encoding='ascii',
+              newline='') as file:
+        for line in iterate_clean_lines(path):
+            n_bytes += file.write(line)
+    return n_bytes
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Converts the raw PGN files '
+                                                 'to a single ASCII PGN file '
+                                                 'in one streaming pass, like '
+                                                 'data/clean_dataset.sh.')
+    parser.add_argument('raw_path',
+                        help='A raw .pgn file, a directory of them, or the '
+                             'KingBase .zip archive.')
+    parser.add_argument('clean_dataset_path',
+                        help='Where to write clean_dataset.pgn.')
+    args = parser.parse_args()
+    print(write_clean_dataset(args.raw_path, args.clean_dataset_path),
+          'bytes written.')
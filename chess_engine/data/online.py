@@ -0,0 +1,306 @@
+import multiprocessing as mp
+import os
+import time
+from random import Random
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from chess_engine.data.generate_dataset import find_next_game_offset, \
+    generate_shard_samples
+from chess_engine.features.registry import DEFAULT_FEATURES, count_planes, \
+    encode_positions, uses_repetitions
+
+# Producers run in spawned processes. Forking a process whose torch thread
+# pools are already running can deadlock.
+START_METHOD = 'spawn'
+
+# Seconds that blocked producers and consumers wait before checking whether
+# they should stop.
+POLL_INTERVAL = 0.1
+
+
+class SampleRingBuffer:
+    """
+    Bounded FIFO of encoded samples in shared memory. Producer processes put
+    samples in, the training process gets them out. put waits while the buffer
+    is full, which holds the producers back to the speed of training, and get
+    waits until enough samples are in.
+    """
+
+    def __init__(self, capacity: int, n_planes: int, context=None):
+        """
+        :param capacity: Max number of samples in the buffer.
+        :param n_planes: Number of 8 x 8 input planes per sample.
+        :param context: multiprocessing context to allocate the shared memory
+        and lock with. Defaults to the default context.
+        """
+        context = context or mp.get_context()
+        self.capacity = capacity
+        self.n_planes = n_planes
+        self._x = context.RawArray('b', capacity * n_planes * 64)
+        self._y = context.RawArray('b', capacity)
+        # Index of the oldest sample and number of samples in the buffer.
+        self._state = context.RawArray('q', 2)
+        self._condition = context.Condition()
+        self._arrays = None
+
+    @property
+    def arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        # Created lazily, so producers get views of the shared memory instead
+        # of pickled copies.
+        if self._arrays is None:
+            self._arrays = (np.frombuffer(self._x, dtype=np.int8).reshape(
+                                self.capacity, self.n_planes, 8, 8),
+                            np.frombuffer(self._y, dtype=np.int8))
+        return self._arrays
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_arrays'] = None
+        return state
+
+    def __len__(self):
+        with self._condition:
+            return self._state[1]
+
+    def put(self, x: np.ndarray, y: np.ndarray,
+            timeout: Optional[float] = None) -> int:
+        """
+        Appends as many samples as fit, waiting up to timeout seconds for free
+        space if the buffer is full.
+
+        :param x: int8 np array of shape (N, n_planes, 8, 8).
+        :param y: np array of shape (N,) with the game results.
+        :return: Number of samples appended, the first ones of x and y. 0 if
+        the buffer stayed full.
+        """
+        buffer_x, buffer_y = self.arrays
+        with self._condition:
+            if not self._condition.wait_for(
+                    lambda: self._state[1] < self.capacity, timeout):
+                return 0
+            first, size = self._state
+            n = min(len(x), self.capacity - size)
+            indices = (first + size + np.arange(n)) % self.capacity
+            buffer_x[indices] = x[:n]
+            buffer_y[indices] = y[:n]
+            self._state[1] = size + n
+            self._condition.notify_all()
+        return n
+
+    def get(self, n: int, timeout: Optional[float] = None) \
+            -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Removes the n oldest samples, waiting up to timeout seconds until
+        there are n.
+
+        :raises ValueError: If n is more than the capacity, which the buffer
+        can never hold.
+        :return: Tuple[x: int8 np array of shape (n, n_planes, 8, 8),
+        y: int8 np array of shape (n,)], copies of the samples. Empty if
+        the wait timed out.
+        """
+        if n > self.capacity:
+            raise ValueError('Can not get {} samples from a buffer of {}'
+                             .format(n, self.capacity))
+        buffer_x, buffer_y = self.arrays
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._state[1] >= n,
+                                            timeout):
+                return buffer_x[:0].copy(), buffer_y[:0].copy()
+            first, size = self._state
+            indices = (first + np.arange(n)) % self.capacity
+            x, y = buffer_x[indices], buffer_y[indices]
+            self._state[0] = (first + n) % self.capacity
+            self._state[1] = size - n
+            self._condition.notify_all()
+        return x, y
+
+
+def _put_all(buffer: SampleRingBuffer, x, y, stop) -> bool:
+    n_put = 0
+    while n_put < len(x):
+        if stop.is_set():
+            return False
+        n_put += buffer.put(x[n_put:], y[n_put:], timeout=POLL_INTERVAL)
+    return True
+
+
+def produce_samples(buffer: SampleRingBuffer, stop, dataset_filename,
+                    start: int = 0, end: Optional[int] = None,
+                    random_seed=None, positions_per_game: int = 1,
+                    fast_parser: bool = False,
+                    features: Sequence[str] = DEFAULT_FEATURES,
+                    chunk_size: int = 1024, header_filter=None):
+    """
+    Producer loop. Samples positions from the decisive games between the byte
+    offsets start and end, encodes them and puts them into buffer, over and
+    over until stop is set. Each pass over the games samples new positions.
+    The samples of chunk_size positions are shuffled before they are put, so
+    the positions of a game are spread over several batches.
+
+    :param buffer: SampleRingBuffer to fill.
+    :param stop: multiprocessing Event that ends the loop.
+    :param dataset_filename: File with multiple PGNs.
+    :param random_seed: Seed of the sampling and shuffling. Defaults to a
+    random one.
+    :return: Returns once stop is set, or after a pass without any samples.
+    """
+    rng = Random(random_seed)
+    while not stop.is_set():
+        n_pass = 0
+        positions_list = []
+        y_list = []
+        n_chunk = 0
+        for positions, game_result_int, _ in generate_shard_samples(
+                dataset_filename, start, end, rng=rng,
+                positions_per_game=positions_per_game,
+                fast_parser=fast_parser, header_filter=header_filter,
+                repetitions=uses_repetitions(features)):
+            positions_list.append(positions)
+            y_list.append(np.full(len(positions), game_result_int, np.int8))
+            n_chunk += len(positions)
+            if stop.is_set():
+                return
+            if n_chunk >= chunk_size:
+                if not _put_chunk(buffer, positions_list, y_list, features,
+                                  rng, stop):
+                    return
+                n_pass += n_chunk
+                positions_list, y_list, n_chunk = [], [], 0
+        if n_chunk:
+            if not _put_chunk(buffer, positions_list, y_list, features, rng,
+                              stop):
+                return
+            n_pass += n_chunk
+        if n_pass == 0:
+            return
+
+
+def _put_chunk(buffer, positions_list, y_list, features, rng, stop) -> bool:
+    positions = np.concatenate(positions_list)
+    y = np.concatenate(y_list)
+    order = np.random.default_rng(rng.getrandbits(32)).permutation(len(y))
+    return _put_all(buffer, encode_positions(positions[order], features),
+                    y[order], stop)
+
+
+class OnlineSampleProducer:
+    """
+    Pool of producer processes that keep a SampleRingBuffer filled with
+    positions sampled from a PGN file, see produce_samples. Each process
+    samples its own byte range of the file. Use as a context manager, or call
+    start and close.
+    """
+
+    def __init__(self, dataset_filename, producers: int = 2,
+                 capacity: int = 65536, start: int = 0,
+                 end: Optional[int] = None, random_seed=None,
+                 positions_per_game: int = 1, fast_parser: bool = False,
+                 features: Sequence[str] = DEFAULT_FEATURES,
+                 chunk_size: int = 1024, header_filter=None):
+        """
+        :param dataset_filename: File with multiple PGNs, cleaned like the
+        input of generate_dataset.py.
+        :param producers: Number of producer processes.
+        :param capacity: Max number of samples in the buffer.
+        :param start: Byte offset of the first game to sample from.
+        :param end: Byte offset to stop at. Defaults to the end of the file.
+        :param random_seed: Seed of the producers. Defaults to random.
+        :param positions_per_game: Number of positions sampled from each game
+        per pass. 0 samples every position.
+        :param fast_parser: Read games with
+        chess_engine.data.parser.read_mainline_game.
+        :param features: Names of the registered features to encode the
+        positions with.
+        :param chunk_size: Number of positions encoded and shuffled at once.
+        :param header_filter: Only sample the games whose headers match this
+        expression, see chess_engine.data.filters.
+        """
+        self.dataset_filename = dataset_filename
+        self.features = tuple(features)
+        self.n_producers = producers
+        self._context = mp.get_context(START_METHOD)
+        self.buffer = SampleRingBuffer(capacity, count_planes(features),
+                                       self._context)
+        self._stop = self._context.Event()
+        self._kwargs = {'random_seed': random_seed,
+                        'positions_per_game': positions_per_game,
+                        'fast_parser': fast_parser,
+                        'features': self.features,
+                        'chunk_size': chunk_size,
+                        'header_filter': header_filter}
+        self._start = start
+        self._end = end
+        self._processes: List[mp.Process] = []
+
+    def _get_shards(self) -> List[Tuple[int, int]]:
+        end = self._end
+        if end is None:
+            end = os.path.getsize(self.dataset_filename)
+        offsets = [self._start]
+        with open(self.dataset_filename, 'rb') as file:
+            for i in range(1, self.n_producers):
+                approximate_offset = self._start + (end - self._start) * i \
+                    // self.n_producers
+                offsets.append(find_next_game_offset(
+                    file, max(approximate_offset, offsets[-1])))
+        offsets.append(end)
+        return list(zip(offsets[:-1], offsets[1:]))
+
+    def start(self):
+        self._stop.clear()
+        for i, (start, end) in enumerate(self._get_shards()):
+            kwargs = dict(self._kwargs)
+            if kwargs['random_seed'] is not None:
+                kwargs['random_seed'] = '{}:{}'.format(kwargs['random_seed'],
+                                                       i)
+            process = self._context.Process(
+                target=produce_samples,
+                args=(self.buffer, self._stop, self.dataset_filename, start,
+                      end),
+                kwargs=kwargs,
+                daemon=True)
+            process.start()
+            self._processes.append(process)
+
+    def is_alive(self) -> bool:
+        return any(process.is_alive() for process in self._processes)
+
+    def get(self, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Waits for the next n samples, see SampleRingBuffer.get.
+
+        :raises RuntimeError: If every producer exited before there were n
+        samples, e.g. because the file has no decisive games.
+        :raises ValueError: If n is more than the capacity of the buffer.
+        """
+        while True:
+            x, y = self.buffer.get(n, timeout=POLL_INTERVAL)
+            if len(x):
+                return x, y
+            if not self.is_alive():
+                x, y = self.buffer.get(n, timeout=0)
+                if len(x):
+                    return x, y
+                raise RuntimeError('The producers exited after {} samples '
+                                   'were left in the buffer'.format(
+                                       len(self.buffer)))
+
+    def close(self, timeout: float = 10.0):
+        self._stop.set()
+        deadline = time.monotonic() + timeout
+        for process in self._processes:
+            process.join(max(deadline - time.monotonic(), 0))
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        self._processes = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
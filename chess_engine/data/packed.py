@@ -0,0 +1,220 @@
+import os
+from os.path import join
+from random import Random
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from chess_engine.data.serializer import POSITION_DTYPE, \
+    convert_bitboards_to_array
+from chess_engine.data.writer import NpyAppendWriter
+from chess_engine.features.registry import DEFAULT_FEATURES, count_planes, \
+    extract_planes, get_feature_extractors, record_features
+
+# Fields of a position kept in a packed sample.
+PACKED_POSITION_FIELDS = ('bitboards', 'state', 'ep_square')
+# The feature stored as the bitboards field. The planes of every other
+# feature are precomputed into the planes field.
+PIECES_FEATURE = 'pieces'
+
+
+def make_packed_sample_dtype(n_extra_planes: int = 0) -> np.dtype:
+    """
+    :param n_extra_planes: Number of precomputed feature planes, one uint64
+    bitboard each, see get_extra_features.
+    :return: dtype of a sample with that many extra planes.
+    """
+    fields = [field for field in POSITION_DTYPE.descr
+              if field[0] in PACKED_POSITION_FIELDS]
+    if n_extra_planes:
+        fields.append(('planes', '<u8', (n_extra_planes,)))
+    return np.dtype(fields + [('label', 'u1')])
+
+
+# A position and its label in 99 bytes, instead of the 768 + 8 bytes of a
+# row of x.npy and y.npy.
+PACKED_SAMPLE_DTYPE = make_packed_sample_dtype()
+
+
+def get_extra_features(features: Sequence[str]) -> List[str]:
+    """
+    :return: The features whose planes a packed dataset stores in its planes
+    field.
+    """
+    return [name for name in features if name != PIECES_FEATURE]
+
+
+PACKED_DATASET_FILENAME = 'samples.npy'
+
+
+class PackedStateResultWriter:
+    """
+    Streams a state/result dataset to a single samples.npy in target_dir,
+    with one make_packed_sample_dtype record per sample. Has the same
+    interface as chess_engine.data.writer.StateResultWriter. The planes of
+    features other than the pieces are computed here, once, and stored as
+    bitboards.
+    """
+
+    def __init__(self, target_dir, chunk_size=8192, mode='w',
+                 features: Sequence[str] = DEFAULT_FEATURES):
+        """
+        :param target_dir: Directory for samples.npy.
+        :param chunk_size: Number of samples written at once.
+        :param mode: 'w' to start a new dataset, 'a' to append to one.
+        :param features: Names of the registered features of the samples.
+        """
+        os.makedirs(target_dir, exist_ok=True)
+        record_features(target_dir, features, mode)
+        self.extra_features = get_extra_features(features)
+        dtype = make_packed_sample_dtype(count_planes(self.extra_features))
+        self.writer = NpyAppendWriter(join(target_dir, PACKED_DATASET_FILENAME),
+                                      dtype, (), mode)
+        self.chunk_size = chunk_size
+        self._samples = np.empty((chunk_size,), dtype)
+        self._n_buffered = 0
+
+    @property
+    def n_samples(self) -> int:
+        return self.writer.n_rows + self._n_buffered
+
+    @staticmethod
+    def load(target_dir) -> Tuple[np.ndarray]:
+        """
+        Memory-maps the samples written to target_dir, in the order
+        append_arrays takes them.
+        """
+        return load_packed_dataset(target_dir),
+
+    def append(self, positions: np.ndarray, game_result_int: int):
+        """
+        Adds the states sampled from one game.
+
+        :param positions: np array of shape (K,) with dtype POSITION_DTYPE.
+        :param game_result_int: Result of the game, the label of every state.
+        """
+        while len(positions):
+            n = min(len(positions), self.chunk_size - self._n_buffered)
+            chunk = self._samples[self._n_buffered:self._n_buffered + n]
+            for name in PACKED_POSITION_FIELDS:
+                chunk[name] = positions[name][:n]
+            if self.extra_features:
+                chunk['planes'] = extract_planes(positions[:n],
+                                                 self.extra_features)
+            chunk['label'] = game_result_int
+            self._n_buffered += n
+            positions = positions[n:]
+            if self._n_buffered == self.chunk_size:
+                self.flush()
+
+    def truncate(self, n_samples: int):
+        """
+        Drops every sample after the first n_samples.
+        """
+        self.flush()
+        self.writer.truncate(n_samples)
+
+    def append_arrays(self, samples: np.ndarray):
+        """
+        Adds already packed samples.
+
+        :param samples: np array with the dtype of the dataset.
+        """
+        self.flush()
+        self.writer.write(samples)
+
+    def flush(self):
+        if self._n_buffered == 0:
+            return
+        self.writer.write(self._samples[:self._n_buffered])
+        self._n_buffered = 0
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def load_packed_dataset(filename, mmap: bool = True) -> np.ndarray:
+    """
+    Loads a samples.npy written by PackedStateResultWriter.
+
+    :param filename: Path of samples.npy, or the directory that holds it.
+    :param mmap: Memory-map the file instead of reading it into memory.
+    :return: np array with a make_packed_sample_dtype dtype.
+    """
+    if os.path.isdir(filename):
+        filename = join(filename, PACKED_DATASET_FILENAME)
+    samples = np.load(filename, mmap_mode='r' if mmap else None)
+    n_extra_planes = 0
+    if samples.dtype.names and 'planes' in samples.dtype.names:
+        n_extra_planes = samples.dtype['planes'].shape[0]
+    if samples.dtype != make_packed_sample_dtype(n_extra_planes):
+        raise ValueError('{} is not a packed dataset'.format(filename))
+    return samples
+
+
+def unpack_samples(samples: np.ndarray,
+                   features: Sequence[str] = DEFAULT_FEATURES) \
+        -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Unpacks samples into the inputs and labels models.model.Net trains on.
+    Only the bits are unpacked, the feature planes were computed when the
+    samples were written.
+
+    :param samples: np array with a make_packed_sample_dtype dtype.
+    :param features: Features of the samples, see
+    chess_engine.features.registry.load_features.
+    :return: Tuple[float32 np array of shape (N, n_planes, 8, 8),
+    float32 np array of shape (N, 1)]
+    """
+    planes = []
+    offset = 0
+    for extractor in get_feature_extractors(features):
+        if extractor.name == PIECES_FEATURE:
+            planes.append(samples['bitboards'])
+        else:
+            planes.append(samples['planes'][:, offset:offset
+                                            + extractor.n_planes])
+            offset += extractor.n_planes
+    bitboards = planes[0] if len(planes) == 1 else np.concatenate(planes,
+                                                                  axis=1)
+    x = convert_bitboards_to_array(bitboards).astype(np.float32)
+    y = samples['label'].astype(np.float32)[:, np.newaxis]
+    return x, y
+
+
+def iterate_packed_batches(samples: np.ndarray, batch_size: int,
+                           shuffle: bool = False,
+                           rng: Optional[Random] = None,
+                           features: Sequence[str] = DEFAULT_FEATURES) \
+        -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Unpacks a packed dataset one batch at a time, so only the packed samples
+    have to fit in memory. Wrap the arrays with torch.from_numpy to get
+    tensors without copying them.
+
+    :param samples: np array with dtype PACKED_SAMPLE_DTYPE, e.g. from
+    load_packed_dataset.
+    :param batch_size: Number of samples per batch.
+    :param shuffle: Visit the samples in random order.
+    :param rng: random.Random used to shuffle. Defaults to unseeded.
+    :param features: Features of the samples.
+    :return: Returns an iterator of (x, y) batches, see unpack_samples.
+    """
+    if not shuffle:
+        for i in range(0, len(samples), batch_size):
+            yield unpack_samples(samples[i:i + batch_size], features)
+        return
+
+    seed = (rng or Random()).getrandbits(32)
+    order = np.random.default_rng(seed).permutation(len(samples))
+    for i in range(0, len(samples), batch_size):
+        # Sorted indices read a memory-mapped file front to back.
+        yield unpack_samples(samples[np.sort(order[i:i + batch_size])],
+                             features)
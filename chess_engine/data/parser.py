@@ -0,0 +1,137 @@
+import argparse
+import re
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import chess
+
+HEADER_PATTERN = re.compile(r'^\[(\w+)\s+"(.*)"\]', re.MULTILINE)
+HEADER_END_PATTERN = re.compile(r'\n[ \t\r]*\n')
+COMMENT_PATTERN = re.compile(r'\{[^}]*\}|;[^\n]*|\$\d+')
+VARIATION_PATTERN = re.compile(r'\([^()]*\)')
+MOVE_NUMBER_PATTERN = re.compile(r'\d+\.+')
+ANNOTATION_PATTERN = re.compile(r'[?!]+$')
+GAME_TERMINATIONS = {'1-0', '0-1', '1/2-1/2', '*'}
+
+
+class MainlineGame(NamedTuple):
+    """
+    Headers and mainline SAN moves of a PGN. A lightweight stand-in for
+    chess.pgn.Game without comments, NAGs, variations or a node tree.
+    """
+    headers: Dict[str, str]
+    moves: List[str]
+
+    def setup_board(self, board: Optional[chess.Board] = None) -> chess.Board:
+        """
+        Resets board to the starting position of the game, so a single board
+        can be reused for every game.
+
+        :param board: Board to reset. Defaults to a new board.
+        :return: The board, set to the starting position.
+        """
+        if board is None:
+            board = chess.Board()
+        fen = self.headers.get('FEN')
+        if fen and self.headers.get('SetUp', '1') == '1':
+            board.set_fen(fen)
+        else:
+            board.reset()
+        return board
+
+
+def split_headers_movetext(pgn: str) -> Tuple[str, str]:
+    """
+    Splits a PGN at the first blank line into its header section and its
+    movetext.
+
+    :param pgn: A single game in PGN format.
+    :return: Tuple[headers: str, movetext: str]
+    """
+    header_end = HEADER_END_PATTERN.search(pgn)
+    if header_end is None:
+        if pgn.lstrip().startswith('['):
+            return pgn, ''
+        return '', pgn
+    return pgn[:header_end.start()], pgn[header_end.end():]
+
+
+def read_headers(header_text: str) -> Dict[str, str]:
+    return dict(HEADER_PATTERN.findall(header_text))
+
+
+def read_mainline_san(movetext: str) -> List[str]:
+    """
+    Returns the mainline moves of a movetext in SAN. Comments, NAGs,
+    variations, move numbers, move annotations and the game termination marker
+    are dropped.
+
+    :param movetext: Movetext section of a PGN.
+    :return: List of SAN strings, e.g. ['e4', 'e5', 'Nf3']
+    """
+    movetext = COMMENT_PATTERN.sub(' ', movetext)
+    stripped = VARIATION_PATTERN.sub(' ', movetext)
+    while stripped != movetext:  # remove nested variations inside out
+        movetext = stripped
+        stripped = VARIATION_PATTERN.sub(' ', movetext)
+    movetext = MOVE_NUMBER_PATTERN.sub(' ', movetext)
+    moves = []
+    for token in movetext.split():
+        if token in GAME_TERMINATIONS:
+            continue
+        san = ANNOTATION_PATTERN.sub('', token)
+        # Annotations can also stand on their own, e.g. '1. e4 !? e5'.
+        if san:
+            moves.append(san)
+    return moves
+
+
+def read_mainline_game(pgn: str) -> MainlineGame:
+    """
+    Fast replacement for chess.pgn.read_game when only the headers and the
+    mainline are needed. Moves are not validated until they are replayed,
+    see MainlineGame.setup_board.
+
+    :param pgn: A single game in PGN format.
+    :return: MainlineGame
+    """
+    header_text, movetext = split_headers_movetext(pgn)
+    return MainlineGame(read_headers(header_text), read_mainline_san(movetext))
+
+
+if __name__ == '__main__':
+    from chess_engine.data.generate_dataset import extract_game, \
+        sample_game_positions, sample_mainline_game_positions, split_games
+
+    parser = argparse.ArgumentParser(description='Compares the throughput of '
+                                                 'chess.pgn.read_game and the '
+                                                 'mainline parser on a clean '
+                                                 'PGN file.')
+    parser.add_argument('pgn_file',
+                        help='The clean_dataset.pgn file to parse.')
+    parser.add_argument('--max_n',
+                        default=10000,
+                        type=int,
+                        help='Number of games to parse with each parser.')
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    n_games = 0
+    for n_games, game in enumerate(extract_game(args.pgn_file), start=1):
+        sample_game_positions(game, positions_per_game=0)
+        if n_games == args.max_n:
+            break
+    read_game_seconds = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    reusable_board = chess.Board()
+    for n_games, pgn in enumerate(split_games(args.pgn_file), start=1):
+        sample_mainline_game_positions(read_mainline_game(pgn),
+                                       positions_per_game=0,
+                                       board=reusable_board)
+        if n_games == args.max_n:
+            break
+    mainline_seconds = time.perf_counter() - start_time
+
+    print('chess.pgn.read_game: {:.0f} games/sec'.format(n_games / read_game_seconds))
+    print('read_mainline_game: {:.0f} games/sec'.format(n_games / mainline_seconds))
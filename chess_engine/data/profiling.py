@@ -0,0 +1,229 @@
+import cProfile
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from os.path import basename
+from typing import List, Optional, Tuple
+
+import chess
+import numpy as np
+
+# Stages of generate_dataset, in pipeline order.
+SPLIT = 'split'  # reading the file and splitting it into games
+HEADERS = 'headers'  # reading the headers to skip games before parsing
+PARSE = 'parse'  # chess.pgn.read_game or read_mainline_game
+REPLAY = 'replay'  # replaying the moves and recording the sampled positions
+WRITE = 'write'  # encoding the feature planes and writing the arrays
+MERGE = 'merge'  # concatenating the shard files of a parallel run
+STAGES = (SPLIT, HEADERS, PARSE, REPLAY, WRITE, MERGE)
+
+PROFILERS = ('cprofile', 'sampling')
+SAMPLING_INTERVAL = 0.001
+
+
+class PipelineStats:
+    """
+    Per-stage timers and counters of a dataset generation run. Stats
+    collected by worker processes are sent back and merged into the stats of
+    the run, so stage times are summed over processes and can add up to more
+    than the wall time.
+    """
+
+    def __init__(self):
+        self.stage_seconds = defaultdict(float)
+        self.counters = Counter()
+        self.start_time = time.perf_counter()
+        self.wall_seconds = None
+
+    @contextmanager
+    def time(self, stage: str):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_seconds[stage] += time.perf_counter() - start_time
+
+    def count(self, name: str, n: int = 1):
+        self.counters[name] += n
+
+    def merge(self, other: 'PipelineStats'):
+        for stage, seconds in other.stage_seconds.items():
+            self.stage_seconds[stage] += seconds
+        self.counters.update(other.counters)
+
+    def finish(self):
+        """
+        Stops the wall clock, which started when the stats were created.
+        """
+        self.wall_seconds = time.perf_counter() - self.start_time
+
+    def to_dict(self) -> dict:
+        """
+        :return: JSON-friendly summary with the wall time, the seconds spent
+        in every stage, the counters and the overall games, positions and
+        bytes per second.
+        """
+        wall_seconds = self.wall_seconds
+        if wall_seconds is None:
+            wall_seconds = time.perf_counter() - self.start_time
+
+        def per_second(value):
+            return value / wall_seconds if wall_seconds > 0 else 0.0
+
+        stages = {stage: self.stage_seconds[stage] for stage in STAGES
+                  if stage in self.stage_seconds}
+        stages.update(self.stage_seconds)
+        return {'wall_seconds': wall_seconds,
+                'stage_seconds': stages,
+                'counters': dict(self.counters),
+                'games_per_sec': per_second(self.counters['games_sampled']),
+                'positions_per_sec': per_second(self.counters['positions']),
+                'bytes_per_sec': per_second(self.counters['bytes'])}
+
+    def format_summary(self) -> str:
+        summary = self.to_dict()
+        lines = ['{} games, {} positions in {:.2f}s: {:.0f} games/s, '
+                 '{:.0f} positions/s, {:.2f} MB/s'.format(
+                     self.counters['games_sampled'],
+                     self.counters['positions'], summary['wall_seconds'],
+                     summary['games_per_sec'], summary['positions_per_sec'],
+                     summary['bytes_per_sec'] / 2 ** 20)]
+        total = sum(summary['stage_seconds'].values())
+        for stage, seconds in summary['stage_seconds'].items():
+            lines.append('  {:<7} {:>9.3f}s {:>6.1%}'.format(
+                stage, seconds, seconds / total if total else 0.0))
+        skipped = ', '.join('{} {}'.format(self.counters[name], name)
+                            for name in ('draws_skipped',
+                                         'unfinished_skipped',
+                                         'filtered_skipped',
+                                         'duplicates_skipped'))
+        lines.append('  skipped: {}'.format(skipped))
+        return '\n'.join(lines)
+
+
+def get_run_info() -> dict:
+    """
+    :return: The command line and library versions of this run, so
+    summaries of different releases can be told apart.
+    """
+    return {'argv': sys.argv,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'numpy': np.__version__,
+            'chess': chess.__version__}
+
+
+def write_stats_summary(stats: PipelineStats, filename, **extra):
+    """
+    Writes the summary of stats, see PipelineStats.to_dict, with
+    get_run_info and any extra fields to a JSON file.
+    """
+    summary = stats.to_dict()
+    summary['run'] = get_run_info()
+    summary.update(extra)
+    with open(filename, 'w') as file:
+        json.dump(summary, file, indent=2)
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler. A background thread records the call stack of the
+    profiled thread every interval seconds. Much cheaper than cProfile on
+    code that makes many small calls, like move replay, at the cost of
+    exact call counts.
+    """
+
+    def __init__(self, interval: float = SAMPLING_INTERVAL):
+        self.interval = interval
+        self.samples = Counter()
+        self._thread_id = None
+        self._stop = threading.Event()
+        self._sampler = None
+
+    def start(self):
+        """
+        Starts sampling the calling thread.
+        """
+        self._thread_id = threading.get_ident()
+        self._stop.clear()
+        self._sampler = threading.Thread(target=self._run, daemon=True)
+        self._sampler.start()
+
+    def stop(self):
+        self._stop.set()
+        self._sampler.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append('{}:{}'.format(basename(code.co_filename),
+                                            code.co_name))
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def get_top_functions(self, n: int = 20) -> List[Tuple[str, float]]:
+        """
+        :return: The n functions that were running, not just on the stack,
+        in most samples, with the fraction of samples.
+        """
+        leaves = Counter()
+        for stack, count in self.samples.items():
+            leaves[stack.rsplit(';', 1)[-1]] += count
+        total = sum(leaves.values())
+        return [(function, count / total)
+                for function, count in leaves.most_common(n)]
+
+    def write_collapsed_stacks(self, filename):
+        """
+        Writes the samples in the collapsed stack format of flamegraph.pl and
+        speedscope, one "frame;frame;frame count" line per stack.
+        """
+        with open(filename, 'w') as file:
+            for stack, count in self.samples.most_common():
+                file.write('{} {}\n'.format(stack, count))
+
+
+@contextmanager
+def run_profiler(profiler: Optional[str], filename):
+    """
+    Profiles the code in the with block of the calling thread. Worker
+    processes are not profiled.
+
+    :param profiler: 'cprofile' writes stats for pstats or snakeviz,
+    'sampling' writes collapsed stacks, see SamplingProfiler. None does not
+    profile.
+    :param filename: File to write the profile to.
+    """
+    if profiler is None:
+        yield
+    elif profiler == 'cprofile':
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            profile.dump_stats(filename)
+    elif profiler == 'sampling':
+        sampler = SamplingProfiler()
+        sampler.start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            sampler.write_collapsed_stacks(filename)
+    else:
+        raise ValueError('profiler must be one of {}, got {}'.format(
+            PROFILERS, profiler))
+
@@ -14,6 +14,26 @@ LAYERS = [(chess.WHITE, chess.KING),
           (chess.BLACK, chess.KNIGHT),
           (chess.BLACK, chess.PAWN)]
 
+# A sampled position: the 12 piece bitboards ordered like LAYERS, a state
+# byte, the en passant square, the halfmove clock and how often the position
+# occurred before in the game. The feature extractors in
+# chess_engine.features.registry compute their planes from these records.
+POSITION_DTYPE = np.dtype([('bitboards', '<u8', (12,)),
+                           ('state', 'u1'),
+                           ('ep_square', 'u1'),
+                           ('halfmove_clock', 'u1'),
+                           ('repetitions', 'u1')])
+
+# Bits of the state byte.
+WHITE_TO_MOVE = 1
+CASTLING_FLAGS = [(chess.BB_H1, 2),  # white king side
+                  (chess.BB_A1, 4),  # white queen side
+                  (chess.BB_H8, 8),  # black king side
+                  (chess.BB_A8, 16)]  # black queen side
+NO_EP_SQUARE = 64
+MAX_HALFMOVE_CLOCK = 255
+MAX_REPETITIONS = 2
+
 
 def convert_fen_to_array(fen: str):
     """
@@ -41,13 +61,74 @@ def convert_fen_to_array(fen: str):
     """
 
     board = chess.Board(fen=fen)
-    piece_arrays = []
-    for color, piece_type in LAYERS:
-        piece_square_list = list(board.pieces(piece_type, color))
-        piece_array = convert_piece_list_to_array(piece_square_list)
-        piece_arrays.append(piece_array)
+    return convert_bitboards_to_array(convert_board_to_bitboards(board))
+
+
+def convert_board_to_bitboards(board: chess.BaseBoard) -> np.ndarray:
+    """
+    Returns the 12 piece bitboards of a board as uint64s, ordered like LAYERS.
+    Bit i of each bitboard is set when the piece is on square i (0 = A1,
+    63 = H8).
+
+    :param board: chess.Board or chess.BaseBoard.
+    :return: np array of shape (12,) and dtype uint64.
+    """
+    return np.array([board.pieces_mask(piece_type, color)
+                     for color, piece_type in LAYERS], dtype=np.uint64)
+
 
-    return np.stack(piece_arrays, axis=0)
+def convert_board_to_position(board: chess.Board,
+                              repetitions: bool = True) -> tuple:
+    """
+    Returns the fields of a POSITION_DTYPE record for a board: its piece
+    bitboards (see convert_board_to_bitboards), the state byte with the side
+    to move and castling rights, the en passant square (NO_EP_SQUARE if
+    there is none), the halfmove clock and the number of earlier occurrences
+    of the position in board.move_stack, up to MAX_REPETITIONS. Build the
+    records of many boards at once with
+    np.array(positions, dtype=POSITION_DTYPE).
+
+    :param board: chess.Board
+    :param repetitions: Count the earlier occurrences, which replays
+    board.move_stack. When False the count is left at 0, for positions that
+    are not encoded with the repetition feature.
+    :return: Tuple[bitboards: tuple, state: int, ep_square: int,
+    halfmove_clock: int, repetitions: int]
+    """
+    state = WHITE_TO_MOVE if board.turn == chess.WHITE else 0
+    for rook_square, flag in CASTLING_FLAGS:
+        if board.castling_rights & rook_square:
+            state |= flag
+    ep_square = NO_EP_SQUARE if board.ep_square is None else board.ep_square
+    bitboards = tuple(board.pieces_mask(piece_type, color)
+                      for color, piece_type in LAYERS)
+    n_repetitions = 0
+    while repetitions and n_repetitions < MAX_REPETITIONS \
+            and board.is_repetition(n_repetitions + 2):
+        n_repetitions += 1
+    return bitboards, state, ep_square, \
+        min(board.halfmove_clock, MAX_HALFMOVE_CLOCK), n_repetitions
+
+
+def convert_bitboards_to_array(bitboards) -> np.ndarray:
+    """
+    Vectorized version of convert_fen_to_array that works on piece bitboards.
+    Takes the 12 bitboards of one position, shape (12,), or of a batch of N
+    positions, shape (N, 12), and unpacks them into one-hot arrays of shape
+    (12, 8, 8) or (N, 12, 8, 8). The layers follow LAYERS and the rows are
+    flipped the same way as convert_piece_list_to_array, so row 0 is the 8th
+    rank.
+
+    :param bitboards: uint64 array-like of shape (12,) or (N, 12).
+    :return: int8 np array of shape (12, 8, 8) or (N, 12, 8, 8).
+    """
+    bitboards = np.asarray(bitboards, dtype=np.uint64)
+    # Little-endian byte k holds rank k + 1, and bit j of it holds file j.
+    ranks = bitboards.astype('<u8').view(np.uint8).reshape(
+        bitboards.shape + (8,))
+    squares = np.unpackbits(ranks, axis=-1, bitorder='little')
+    squares = squares.reshape(bitboards.shape + (8, 8))
+    return np.ascontiguousarray(squares[..., ::-1, :]).view(np.int8)
 
 
 def convert_piece_list_to_array(piece_position_list: list[int]):
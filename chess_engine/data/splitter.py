@@ -0,0 +1,107 @@
+import argparse
+import os
+import re
+import time
+from typing import Iterator, Tuple
+
+# A line break followed by a line with nothing but a line break. A game ends
+# at its second blank line, one after the headers and one after the
+# movetext.
+BLANK_LINE_PATTERN = re.compile(rb'\n\r?\n')
+BLOCK_SIZE = 1 << 20
+
+
+def split_game_buffers(pgn_file, start=0, end=None, block_size=BLOCK_SIZE) \
+        -> Iterator[Tuple[int, memoryview]]:
+    """
+    Finds the games in a file with multiple PGNs by reading it in large blocks
+    and searching each block for blank lines, instead of looking at it line
+    by line. Games are separated by counting blank lines, see
+    chess_engine.data.generate_dataset.extract_game.
+
+    Only the bytes of a game that spans two blocks are copied, every other
+    game is returned as a view of the block it was read in.
+
+    :param pgn_file: File with multiple PGNs. Each PGN should be separated by a
+    single newline character. And the file should end with 2 newline characters.
+    :param start: Byte offset to start reading from. Must be the first byte of
+    a game.
+    :param end: Byte offset to stop at. Games that start at or after this
+    offset are not returned. Defaults to the end of the file.
+    :param block_size: Number of bytes read at once.
+    :return: Returns an iterator of (end offset, game) tuples, where the end
+    offset is the byte offset right after the game and game is a memoryview of
+    its bytes. A trailing game without its final blank line is dropped.
+    """
+    with open(pgn_file, 'rb') as file:
+        file.seek(start)
+        # The line break in front of the first line lets the pattern find a
+        # blank first line too.
+        buffer = b'\n'
+        buffer_offset = start - 1  # file offset of buffer[0]
+        game_start = 1
+        search_from = 0
+        newline_count = 0
+        while end is None or buffer_offset + game_start < end:
+            blank_line = BLANK_LINE_PATTERN.search(buffer, search_from)
+            if blank_line is None:
+                block = file.read(block_size)
+                if not block:
+                    return
+                # Keep the line break in front of the game as well.
+                buffer = buffer[game_start - 1:] + block
+                buffer_offset += game_start - 1
+                search_from -= game_start - 1
+                game_start = 1
+                continue
+
+            # The next blank line may start right after this one.
+            search_from = blank_line.end() - 1
+            newline_count += 1
+            if newline_count == 2:  # end of PGN
+                game_end = blank_line.end()
+                yield buffer_offset + game_end, \
+                    memoryview(buffer)[game_start:game_end]
+                game_start = game_end
+                newline_count = 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measures how fast the games '
+                                                 'of a clean PGN file are '
+                                                 'split, line by line and in '
+                                                 'blocks.')
+    parser.add_argument('pgn_file',
+                        help='The clean_dataset.pgn file to split.')
+    parser.add_argument('--block_size',
+                        default=BLOCK_SIZE,
+                        type=int,
+                        help='Number of bytes read at once.')
+    args = parser.parse_args()
+    megabytes = os.path.getsize(args.pgn_file) / 2 ** 20
+
+    start_time = time.perf_counter()
+    n_games = 0
+    with open(args.pgn_file, 'rb') as pgn_file:
+        current_pgn = b''
+        newline_count = 0
+        for line in pgn_file:
+            current_pgn += line
+            if line in (b'\n', b'\r\n'):
+                newline_count += 1
+            if newline_count == 2:
+                n_games += 1
+                current_pgn = b''
+                newline_count = 0
+    line_seconds = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    n_block_games = 0
+    for _ in split_game_buffers(args.pgn_file, block_size=args.block_size):
+        n_block_games += 1
+    block_seconds = time.perf_counter() - start_time
+
+    assert n_games == n_block_games
+    print('{} games, {:.1f} MB'.format(n_games, megabytes))
+    print('line by line: {:.1f} MB/s'.format(megabytes / line_seconds))
+    print('blocks: {:.1f} MB/s'.format(megabytes / block_seconds))
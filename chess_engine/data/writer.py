@@ -0,0 +1,221 @@
+import os
+import struct
+from os.path import join
+from typing import Sequence, Tuple
+
+import numpy as np
+
+from chess_engine.data.serializer import POSITION_DTYPE
+from chess_engine.features.registry import DEFAULT_FEATURES, count_planes, \
+    encode_positions, record_features
+
+# Headers are padded to a multiple of 64 bytes, like the ones np.save writes.
+NPY_HEADER_ALIGNMENT = 64
+# Room for any row count, so the header never has to move.
+NPY_MAX_ROWS = 2 ** 64 - 1
+
+
+class NpyAppendWriter:
+    """
+    Appends rows to a .npy file without holding them in memory. The header is
+    rewritten after every write, so the file is a valid .npy at every write
+    boundary and can be loaded with np.load(filename, mmap_mode='r') while it
+    is being written, or after the writing process crashed.
+    """
+
+    def __init__(self, filename, dtype, row_shape=(), mode='w'):
+        """
+        :param filename: Path of the .npy file.
+        :param dtype: dtype of the rows.
+        :param row_shape: Shape of a single row, e.g. (12, 8, 8).
+        :param mode: 'w' creates a new file. 'a' appends to an existing .npy
+        file with the same dtype and row shape. Trailing bytes of a row that
+        was only partially written are dropped.
+        """
+        self.filename = filename
+        self.dtype = np.dtype(dtype)
+        self.row_shape = tuple(row_shape)
+        self.row_size = self.dtype.itemsize * int(np.prod(self.row_shape))
+
+        if mode == 'a' and os.path.exists(filename):
+            self.file = open(filename, 'r+b')
+            self._read_header()
+            self.truncate(self.n_rows)
+        elif mode in ('w', 'a'):
+            self.file = open(filename, 'w+b')
+            # magic string, version and header length take 10 bytes
+            header_size = len(self._header_dict(NPY_MAX_ROWS)) + 10 + 1
+            self.header_size = -(-header_size // NPY_HEADER_ALIGNMENT) \
+                * NPY_HEADER_ALIGNMENT
+            self.n_rows = 0
+            self._write_header()
+        else:
+            raise ValueError('mode must be "w" or "a", got {}'.format(mode))
+        self.file.seek(0, os.SEEK_END)
+
+    def _read_header(self):
+        version = np.lib.format.read_magic(self.file)
+        if version != (1, 0):
+            raise ValueError('{} uses .npy format {}, only 1.0 can be appended '
+                             'to'.format(self.filename, version))
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(
+            self.file)
+        if dtype != self.dtype or tuple(shape[1:]) != self.row_shape \
+                or fortran_order:
+            raise ValueError('{} holds {} rows of shape {}, expected {} rows '
+                             'of shape {}'.format(self.filename, dtype,
+                                                  shape[1:], self.dtype,
+                                                  self.row_shape))
+        self.header_size = self.file.tell()
+        data_size = os.path.getsize(self.filename) - self.header_size
+        self.n_rows = min(shape[0], data_size // self.row_size)
+
+    def _header_dict(self, n_rows: int) -> str:
+        return repr({'descr': np.lib.format.dtype_to_descr(self.dtype),
+                     'fortran_order': False,
+                     'shape': (n_rows,) + self.row_shape})
+
+    def _write_header(self):
+        header = self._header_dict(self.n_rows)
+        # magic string (6 bytes), version (2 bytes), header length (2 bytes)
+        if len(header) + 10 + 1 > self.header_size:
+            raise ValueError('The .npy header of {} is too small for shape '
+                             '{}'.format(self.filename, self.n_rows))
+        header = header.ljust(self.header_size - 10 - 1) + '\n'
+        self.file.seek(0)
+        self.file.write(np.lib.format.magic(1, 0))
+        self.file.write(struct.pack('<H', len(header)))
+        self.file.write(header.encode('latin1'))
+
+    def write(self, rows: np.ndarray):
+        rows = np.ascontiguousarray(rows, dtype=self.dtype)
+        if rows.shape[1:] != self.row_shape:
+            raise ValueError('Expected rows of shape {}, got {}'.format(
+                self.row_shape, rows.shape[1:]))
+        self.file.seek(self.header_size + self.n_rows * self.row_size)
+        self.file.write(rows.tobytes())
+        self.n_rows += len(rows)
+        self._write_header()
+        self.file.flush()
+
+    def truncate(self, n_rows: int):
+        """
+        Drops every row after the first n_rows.
+        """
+        self.n_rows = min(self.n_rows, n_rows)
+        self.file.truncate(self.header_size + self.n_rows * self.row_size)
+        self._write_header()
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class StateResultWriter:
+    """
+    Streams a state/result dataset to x.npy and y.npy in target_dir. Samples
+    are buffered as positions and every chunk_size samples they are encoded
+    with chess_engine.features.registry.encode_positions and appended to both
+    files, so memory use does not grow with the size of the dataset. After a
+    crash, the first min(len(x), len(y)) rows are complete samples. The
+    features are recorded in features.json.
+    """
+
+    def __init__(self, target_dir, chunk_size=8192, mode='w',
+                 features: Sequence[str] = DEFAULT_FEATURES):
+        """
+        :param target_dir: Directory for x.npy and y.npy.
+        :param chunk_size: Number of samples encoded and written at once.
+        :param mode: 'w' to start a new dataset, 'a' to append to one.
+        :param features: Names of the registered features that make up the
+        planes of x.
+        """
+        os.makedirs(target_dir, exist_ok=True)
+        record_features(target_dir, features, mode)
+        self.features = tuple(features)
+        self.x_writer = NpyAppendWriter(join(target_dir, 'x.npy'), np.int8,
+                                        (count_planes(features), 8, 8),
+                                        mode)
+        self.y_writer = NpyAppendWriter(join(target_dir, 'y.npy'), np.int64,
+                                        (), mode)
+        self.chunk_size = chunk_size
+        self._positions = np.empty((chunk_size,), POSITION_DTYPE)
+        self._y = np.empty((chunk_size,), np.int64)
+        self._n_buffered = 0
+        if mode == 'a':  # keep both files at the same number of samples
+            self.truncate(min(self.x_writer.n_rows, self.y_writer.n_rows))
+
+    @property
+    def n_samples(self) -> int:
+        return self.y_writer.n_rows + self._n_buffered
+
+    @staticmethod
+    def load(target_dir) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Memory-maps the arrays written to target_dir, in the order
+        append_arrays takes them.
+        """
+        return (np.load(join(target_dir, 'x.npy'), mmap_mode='r'),
+                np.load(join(target_dir, 'y.npy'), mmap_mode='r'))
+
+    def append(self, positions: np.ndarray, game_result_int: int):
+        """
+        Adds the states sampled from one game.
+
+        :param positions: np array of shape (K,) with dtype POSITION_DTYPE.
+        :param game_result_int: Result of the game, the label of every state.
+        """
+        while len(positions):
+            n = min(len(positions), self.chunk_size - self._n_buffered)
+            end = self._n_buffered + n
+            self._positions[self._n_buffered:end] = positions[:n]
+            self._y[self._n_buffered:end] = game_result_int
+            self._n_buffered = end
+            positions = positions[n:]
+            if self._n_buffered == self.chunk_size:
+                self.flush()
+
+    def truncate(self, n_samples: int):
+        """
+        Drops every sample after the first n_samples.
+        """
+        self.flush()
+        self.x_writer.truncate(n_samples)
+        self.y_writer.truncate(n_samples)
+
+    def append_arrays(self, x: np.ndarray, y: np.ndarray):
+        """
+        Adds already encoded samples.
+
+        :param x: int8 np array of shape (N, n_planes, 8, 8).
+        :param y: np array of shape (N,).
+        """
+        self.flush()
+        self.x_writer.write(x)
+        self.y_writer.write(y)
+
+    def flush(self):
+        if self._n_buffered == 0:
+            return
+        n = self._n_buffered
+        self.x_writer.write(encode_positions(self._positions[:n],
+                                             self.features))
+        self.y_writer.write(self._y[:n])
+        self._n_buffered = 0
+
+    def close(self):
+        self.flush()
+        self.x_writer.close()
+        self.y_writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
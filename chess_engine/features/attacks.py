@@ -0,0 +1,120 @@
+import chess
+import numpy as np
+
+from chess_engine.data.serializer import LAYERS
+
+FILE_A = np.uint64(0x0101010101010101)
+FILE_H = np.uint64(0x8080808080808080)
+NOT_FILE_A = ~FILE_A
+NOT_FILE_H = ~FILE_H
+NOT_FILES_AB = ~(FILE_A | (FILE_A << np.uint64(1)))
+NOT_FILES_GH = ~(FILE_H | (FILE_H >> np.uint64(1)))
+
+
+def _shift_up(bitboards, n):
+    return bitboards << np.uint64(n)
+
+
+def _shift_down(bitboards, n):
+    return bitboards >> np.uint64(n)
+
+
+# One step in each direction. Squares that would wrap around to the other
+# side of the board are masked out.
+def _north(b):
+    return _shift_up(b, 8)
+
+
+def _south(b):
+    return _shift_down(b, 8)
+
+
+def _east(b):
+    return _shift_up(b, 1) & NOT_FILE_A
+
+
+def _west(b):
+    return _shift_down(b, 1) & NOT_FILE_H
+
+
+def _north_east(b):
+    return _shift_up(b, 9) & NOT_FILE_A
+
+
+def _north_west(b):
+    return _shift_up(b, 7) & NOT_FILE_H
+
+
+def _south_east(b):
+    return _shift_down(b, 7) & NOT_FILE_A
+
+
+def _south_west(b):
+    return _shift_down(b, 9) & NOT_FILE_H
+
+
+ORTHOGONAL_STEPS = (_north, _south, _east, _west)
+DIAGONAL_STEPS = (_north_east, _north_west, _south_east, _south_west)
+
+
+def _slide(sliders: np.ndarray, empty: np.ndarray, steps) -> np.ndarray:
+    attacks = np.zeros_like(sliders)
+    for step in steps:
+        ray = step(sliders)
+        attacks |= ray
+        # A ray continues through empty squares and stops at the first
+        # piece, which it attacks.
+        for _ in range(6):
+            ray = step(ray & empty)
+            attacks |= ray
+    return attacks
+
+
+def _knight_attacks(knights: np.ndarray) -> np.ndarray:
+    return ((_shift_up(knights, 17) & NOT_FILE_A)
+            | (_shift_up(knights, 15) & NOT_FILE_H)
+            | (_shift_up(knights, 10) & NOT_FILES_AB)
+            | (_shift_up(knights, 6) & NOT_FILES_GH)
+            | (_shift_down(knights, 17) & NOT_FILE_H)
+            | (_shift_down(knights, 15) & NOT_FILE_A)
+            | (_shift_down(knights, 10) & NOT_FILES_GH)
+            | (_shift_down(knights, 6) & NOT_FILES_AB))
+
+
+def _king_attacks(kings: np.ndarray) -> np.ndarray:
+    attacks = np.zeros_like(kings)
+    for step in ORTHOGONAL_STEPS + DIAGONAL_STEPS:
+        attacks |= step(kings)
+    return attacks
+
+
+def compute_attack_bitboards(bitboards: np.ndarray) -> np.ndarray:
+    """
+    Vectorized attack maps. Computes the squares attacked by each side in a
+    batch of positions with shifts of the piece bitboards, the same squares
+    as the union of chess.Board.attacks_mask over a side's pieces.
+
+    :param bitboards: uint64 np array of shape (N, 12), ordered like LAYERS.
+    :return: uint64 np array of shape (N, 2), the squares attacked by white
+    and by black.
+    """
+    bitboards = np.asarray(bitboards, dtype=np.uint64)
+    empty = ~np.bitwise_or.reduce(bitboards, axis=1)
+    attacks = np.empty((len(bitboards), 2), dtype=np.uint64)
+    for i, color in enumerate((chess.WHITE, chess.BLACK)):
+        pieces = {piece_type: bitboards[:, layer]
+                  for layer, (layer_color, piece_type) in enumerate(LAYERS)
+                  if layer_color == color}
+        pawns = pieces[chess.PAWN]
+        if color == chess.WHITE:
+            pawn_attacks = _north_east(pawns) | _north_west(pawns)
+        else:
+            pawn_attacks = _south_east(pawns) | _south_west(pawns)
+        attacks[:, i] = (pawn_attacks
+                         | _knight_attacks(pieces[chess.KNIGHT])
+                         | _king_attacks(pieces[chess.KING])
+                         | _slide(pieces[chess.ROOK] | pieces[chess.QUEEN],
+                                  empty, ORTHOGONAL_STEPS)
+                         | _slide(pieces[chess.BISHOP] | pieces[chess.QUEEN],
+                                  empty, DIAGONAL_STEPS))
+    return attacks
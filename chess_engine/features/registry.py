@@ -0,0 +1,212 @@
+import json
+import os
+from os.path import exists, join
+from typing import Callable, Dict, List, NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+from chess_engine.data.serializer import CASTLING_FLAGS, NO_EP_SQUARE, \
+    WHITE_TO_MOVE, convert_bitboards_to_array
+from chess_engine.features.attacks import compute_attack_bitboards
+
+FEATURES_FILENAME = 'features.json'
+
+# The 12 piece planes models.model.Net was first trained on. Datasets without
+# a features.json hold these.
+DEFAULT_FEATURES = ('pieces',)
+
+ALL_SQUARES = np.uint64(0xFFFFFFFFFFFFFFFF)
+HALFMOVE_CLOCK_BITS = 7
+
+
+class FeatureExtractor(NamedTuple):
+    name: str
+    n_planes: int
+    # Maps POSITION_DTYPE records of shape (N,) to uint64 bitboards of shape
+    # (N, n_planes), one per 8 x 8 plane.
+    extract: Callable[[np.ndarray], np.ndarray]
+
+
+FEATURES: Dict[str, FeatureExtractor] = {}
+
+
+def register_feature(name: str, n_planes: int):
+    """
+    Decorator that adds a feature extractor to FEATURES, e.g.
+
+    @register_feature('side_to_move', 1)
+    def extract_side_to_move(positions):
+        ...
+
+    :param name: Name of the feature in datasets and on the command line.
+    :param n_planes: Number of 8 x 8 planes the extractor returns.
+    """
+    def decorator(extract):
+        if name in FEATURES:
+            raise ValueError('Feature {} is already registered'.format(name))
+        FEATURES[name] = FeatureExtractor(name, n_planes, extract)
+        return extract
+    return decorator
+
+
+def get_feature_extractors(features: Sequence[str]) \
+        -> List[FeatureExtractor]:
+    unknown = [name for name in features if name not in FEATURES]
+    if unknown:
+        raise ValueError('Unknown features {}. Registered features are {}'
+                         .format(unknown, list(FEATURES)))
+    return [FEATURES[name] for name in features]
+
+
+def count_planes(features: Sequence[str]) -> int:
+    return sum(extractor.n_planes
+               for extractor in get_feature_extractors(features))
+
+
+def uses_repetitions(features: Sequence[str]) -> bool:
+    """
+    :return: Whether the planes of features depend on the repetitions field,
+    which is costly to compute, see convert_board_to_position.
+    """
+    return 'repetition' in features
+
+
+def extract_planes(positions: np.ndarray, features: Sequence[str]) \
+        -> np.ndarray:
+    """
+    Runs the extractors of features on a batch of positions.
+
+    :param positions: np array of shape (N,) with dtype POSITION_DTYPE.
+    :param features: Names of registered features.
+    :return: uint64 np array of shape (N, count_planes(features)), the
+    bitboard of every plane in the order of features.
+    """
+    planes = [extractor.extract(positions)
+              for extractor in get_feature_extractors(features)]
+    if not planes:
+        return np.empty((len(positions), 0), dtype=np.uint64)
+    return np.concatenate(planes, axis=1).astype(np.uint64, copy=False)
+
+
+def encode_positions(positions: np.ndarray, features: Sequence[str]) \
+        -> np.ndarray:
+    """
+    Encodes a batch of positions into the input planes of a model.
+
+    :param positions: np array of shape (N,) with dtype POSITION_DTYPE.
+    :param features: Names of registered features.
+    :return: int8 np array of shape (N, count_planes(features), 8, 8), laid
+    out like convert_bitboards_to_array.
+    """
+    return convert_bitboards_to_array(extract_planes(positions, features))
+
+
+def save_features(target_dir, features: Sequence[str]):
+    """
+    Records the features of the dataset or model in target_dir.
+    """
+    os.makedirs(target_dir, exist_ok=True)
+    with open(join(target_dir, FEATURES_FILENAME), 'w') as file:
+        json.dump({'features': list(features),
+                   'n_planes': count_planes(features)}, file)
+
+
+def record_features(target_dir, features: Sequence[str], mode: str = 'w'):
+    """
+    Saves the features of a dataset that is written with mode 'w', and checks
+    that they match the recorded ones when it is appended to with mode 'a'.
+    """
+    if mode == 'a' and exists(join(target_dir, FEATURES_FILENAME)):
+        recorded = load_features(target_dir)
+        if recorded != tuple(features):
+            raise ValueError('{} holds features {}, not {}'.format(
+                target_dir, list(recorded), list(features)))
+    else:
+        save_features(target_dir, features)
+
+
+def load_features(target_dir) -> Tuple[str, ...]:
+    """
+    :return: The features recorded in target_dir by save_features, or
+    DEFAULT_FEATURES if there are none.
+    """
+    path = join(target_dir, FEATURES_FILENAME)
+    if not exists(path):
+        return DEFAULT_FEATURES
+    with open(path) as file:
+        return tuple(json.load(file)['features'])
+
+
+def _fill_planes(*conditions: np.ndarray) -> np.ndarray:
+    return np.stack([np.where(condition, ALL_SQUARES, np.uint64(0))
+                     for condition in conditions], axis=1)
+
+
+@register_feature('pieces', 12)
+def extract_pieces(positions: np.ndarray) -> np.ndarray:
+    """
+    One plane per piece type and color, ordered like LAYERS.
+    """
+    return positions['bitboards']
+
+
+@register_feature('side_to_move', 1)
+def extract_side_to_move(positions: np.ndarray) -> np.ndarray:
+    """
+    A full plane when white is to move.
+    """
+    return _fill_planes(positions['state'] & WHITE_TO_MOVE)
+
+
+@register_feature('castling', 4)
+def extract_castling(positions: np.ndarray) -> np.ndarray:
+    """
+    A full plane per castling right: white king side, white queen side,
+    black king side, black queen side.
+    """
+    return _fill_planes(*[positions['state'] & flag
+                          for _, flag in CASTLING_FLAGS])
+
+
+@register_feature('en_passant', 1)
+def extract_en_passant(positions: np.ndarray) -> np.ndarray:
+    """
+    The en passant target square, if any.
+    """
+    ep_square = positions['ep_square'].astype(np.uint64)
+    has_ep_square = ep_square != NO_EP_SQUARE
+    plane = np.where(has_ep_square,
+                     np.uint64(1) << np.where(has_ep_square, ep_square,
+                                              np.uint64(0)),
+                     np.uint64(0))
+    return plane[:, np.newaxis]
+
+
+@register_feature('attacks', 2)
+def extract_attacks(positions: np.ndarray) -> np.ndarray:
+    """
+    The squares attacked by white and the squares attacked by black.
+    """
+    return compute_attack_bitboards(positions['bitboards'])
+
+
+@register_feature('repetition', 2)
+def extract_repetition(positions: np.ndarray) -> np.ndarray:
+    """
+    A full plane if the position occurred at least once before in the game,
+    and one if it occurred at least twice before.
+    """
+    repetitions = positions['repetitions']
+    return _fill_planes(repetitions >= 1, repetitions >= 2)
+
+
+@register_feature('halfmove_clock', HALFMOVE_CLOCK_BITS)
+def extract_halfmove_clock(positions: np.ndarray) -> np.ndarray:
+    """
+    The halfmove clock of the fifty-move rule in binary, one full plane per
+    set bit, least significant bit first. Clocks above 127 read as 127.
+    """
+    clock = np.minimum(positions['halfmove_clock'],
+                       2 ** HALFMOVE_CLOCK_BITS - 1)
+    return _fill_planes(*[(clock >> bit) & 1
+                          for bit in range(HALFMOVE_CLOCK_BITS)])
@@ -0,0 +1,165 @@
+from os.path import join
+from typing import Tuple
+
+import numpy as np
+import torch
+from torch.utils.data import BatchSampler, DataLoader, Dataset, \
+    RandomSampler, SequentialSampler
+
+from chess_engine.data.packed import load_packed_dataset, unpack_samples
+from chess_engine.features.registry import count_planes, load_features
+
+
+class StateResultDataset(Dataset):
+    """
+    Memory-mapped view of the x.npy and y.npy written by
+    chess_engine.data.generate_dataset. Nothing is read until a batch is
+    requested, so the dataset can be much larger than memory.
+
+    Indexing with a list of indices returns a whole batch at once, which is
+    much faster than collating single samples. Use make_data_loader to get a
+    DataLoader that works that way.
+    """
+
+    def __init__(self, features_dir):
+        """
+        :param features_dir: Directory with x.npy and y.npy.
+        """
+        self.features_dir = features_dir
+        self.features = load_features(features_dir)
+        self._arrays = None
+        self._length = len(self._load()[-1])
+
+    def _load(self) -> Tuple[np.ndarray, ...]:
+        return (np.load(join(self.features_dir, 'x.npy'), mmap_mode='r'),
+                np.load(join(self.features_dir, 'y.npy'), mmap_mode='r'))
+
+    @property
+    def arrays(self) -> Tuple[np.ndarray, ...]:
+        # Opened lazily, so every DataLoader worker maps the files itself
+        # instead of receiving a pickled copy of them.
+        if self._arrays is None:
+            self._arrays = self._load()
+        return self._arrays
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_arrays'] = None
+        return state
+
+    def __len__(self):
+        return self._length
+
+    @property
+    def n_planes(self) -> int:
+        return count_planes(self.features)
+
+    def _get_batch(self, indices: np.ndarray) \
+            -> Tuple[np.ndarray, np.ndarray]:
+        x, y = self.arrays
+        return x[indices].astype(np.float32), \
+            y[indices].astype(np.float32)[:, np.newaxis]
+
+    def __getitem__(self, index):
+        """
+        :param index: int, or a list of indices for a batch.
+        :return: Tuple[x: float tensor of shape (n_planes, 8, 8) or
+        (N, n_planes, 8, 8),
+        y: float tensor of shape (1,) or (N, 1)]
+        """
+        if isinstance(index, (int, np.integer)):
+            x, y = self[[index]]
+            return x[0], y[0]
+
+        # Sorted indices read the memory-mapped files front to back.
+        indices = np.sort(np.asarray(index, dtype=np.int64))
+        x, y = self._get_batch(indices)
+        return torch.from_numpy(x), torch.from_numpy(y)
+
+
+class PackedStateResultDataset(StateResultDataset):
+    """
+    StateResultDataset over the bit-packed samples.npy written by
+    chess_engine.data.generate_dataset --packed. Batches are unpacked on the
+    fly.
+    """
+
+    def _load(self) -> Tuple[np.ndarray, ...]:
+        return load_packed_dataset(self.features_dir),
+
+    def _get_batch(self, indices: np.ndarray) \
+            -> Tuple[np.ndarray, np.ndarray]:
+        samples, = self.arrays
+        return unpack_samples(samples[indices], self.features)
+
+
+class BatchSubset(Dataset):
+    """
+    Like torch.utils.data.Subset, but passes batches of indices on to the
+    dataset in one lookup.
+    """
+
+    def __init__(self, dataset: Dataset, indices):
+        self.dataset = dataset
+        self.indices = indices
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            return self.dataset[self.indices[index]]
+        return self.dataset[[self.indices[i] for i in index]]
+
+
+def split_dataset(dataset: Dataset, validation_fraction: float) \
+        -> Tuple[BatchSubset, BatchSubset]:
+    """
+    Naively splits a dataset into a train set with the first samples and a
+    validation set with the last validation_fraction of the samples.
+    """
+    n = len(dataset)
+    n_train = int(n * (1 - validation_fraction))
+    return BatchSubset(dataset, range(n_train)), \
+        BatchSubset(dataset, range(n_train, n))
+
+
+def shard_dataset(dataset: Dataset, rank: int, world_size: int) \
+        -> BatchSubset:
+    """
+    Splits a dataset into world_size contiguous shards of equal size and
+    returns the one for rank. Contiguous shards keep each process reading its
+    own region of the memory-mapped files. Equal sizes give every rank the
+    same number of batches, which DistributedDataParallel needs; the last
+    len(dataset) % world_size samples are left out.
+    """
+    shard_size = len(dataset) // world_size
+    return BatchSubset(dataset, range(rank * shard_size,
+                                      (rank + 1) * shard_size))
+
+
+def make_data_loader(dataset: Dataset, batch_size: int, shuffle: bool = True,
+                     num_workers: int = 0, pin_memory: bool = False,
+                     drop_last: bool = False) -> DataLoader:
+    """
+    Returns a DataLoader that fetches whole mini-batches from dataset with a
+    single index lookup, see StateResultDataset.__getitem__.
+
+    :param dataset: StateResultDataset, PackedStateResultDataset or a
+    BatchSubset of one.
+    :param batch_size: Number of samples per batch.
+    :param shuffle: Reshuffle the samples every epoch.
+    :param num_workers: Number of worker processes loading batches.
+    :param pin_memory: Copy batches into pinned memory, for faster transfers
+    to a GPU.
+    :param drop_last: Drop the last batch if it is smaller than batch_size.
+    :return: DataLoader yielding (x, y) batches.
+    """
+    sampler = RandomSampler(dataset) if shuffle else SequentialSampler(dataset)
+    batch_sampler = BatchSampler(sampler, batch_size, drop_last)
+    return DataLoader(dataset,
+                      sampler=batch_sampler,
+                      batch_size=None,
+                      num_workers=num_workers,
+                      pin_memory=pin_memory,
+                      persistent_workers=num_workers > 0)
@@ -0,0 +1,238 @@
+import os
+import socket
+import time
+from typing import Dict, Iterable, Optional
+
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+import torch.nn as nn
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.tensorboard import SummaryWriter
+
+from chess_engine.features.registry import save_features
+from chess_engine.models.dataset import PackedStateResultDataset, \
+    StateResultDataset, make_data_loader, shard_dataset, split_dataset
+from chess_engine.models.model import Net, get_argument_parser, training_loop
+
+BACKEND = 'gloo'
+WARMUP_BATCHES = 3
+
+
+def get_threads_per_process(world_size: int) -> int:
+    """
+    :return: Intra-op threads for each of world_size processes so that
+    together they use every core once.
+    """
+    return max(1, (os.cpu_count() or 1) // world_size)
+
+
+def get_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _load_dataset(features_dir: str, packed: bool):
+    if packed:
+        return PackedStateResultDataset(features_dir)
+    return StateResultDataset(features_dir)
+
+
+def train(args, rank: int, world_size: int):
+    """
+    Trains one rank of a data-parallel run. Every rank reads its own shard of
+    the training set and DistributedDataParallel all-reduces the gradients
+    after each backward pass, so all ranks keep identical weights. Only rank
+    0 validates, logs and writes checkpoints. The process group must be
+    initialized already.
+
+    :param args: Options from chess_engine.models.model.get_argument_parser.
+    :param rank: Rank of this process.
+    :param world_size: Number of processes.
+    :return: History from training_loop.
+    """
+    torch.set_num_threads(args.threads_per_process
+                          or get_threads_per_process(world_size))
+    is_main_process = rank == 0
+
+    dataset = _load_dataset(args.features_dir, args.packed)
+    train_set, validation_set = split_dataset(dataset,
+                                              validation_fraction=0.10)
+    train_loader = make_data_loader(shard_dataset(train_set, rank, world_size),
+                                    args.batch_size, shuffle=True,
+                                    num_workers=args.num_workers)
+    validation_loader = make_data_loader(validation_set, args.batch_size,
+                                         shuffle=False,
+                                         num_workers=args.num_workers)
+
+    # DistributedDataParallel copies rank 0's initial weights to the others.
+    model = DistributedDataParallel(Net(in_channels=dataset.n_planes))
+    optimizer = torch.optim.Adam(model.parameters(), lr=0.0001)
+    if is_main_process and args.checkpoint_dir is not None:
+        save_features(args.checkpoint_dir, dataset.features)
+    writer = SummaryWriter(args.log_dir) if is_main_process else None
+    history = training_loop(n_epochs=args.n_epochs,
+                            optimizer=optimizer,
+                            model=model,
+                            loss_fn=nn.BCELoss(),
+                            train_loader=train_loader,
+                            validation_loader=validation_loader,
+                            validate_every=args.validate_every,
+                            checkpoint_dir=args.checkpoint_dir,
+                            checkpoint_every=args.checkpoint_every,
+                            resume=args.resume,
+                            writer=writer,
+                            is_main_process=is_main_process)
+    if writer is not None:
+        writer.close()
+    return history
+
+
+def _init_local_process_group(rank: int, world_size: int, port: int):
+    os.environ['MASTER_ADDR'] = '127.0.0.1'
+    os.environ['MASTER_PORT'] = str(port)
+    dist.init_process_group(BACKEND, rank=rank, world_size=world_size)
+
+
+def _train_worker(rank: int, world_size: int, port: int, args):
+    _init_local_process_group(rank, world_size, port)
+    try:
+        train(args, rank, world_size)
+    finally:
+        dist.destroy_process_group()
+
+
+def spawn_training(args, world_size: int):
+    """
+    Runs train in world_size local processes without torchrun.
+    """
+    mp.spawn(_train_worker, args=(world_size, get_free_port(), args),
+             nprocs=world_size)
+
+
+def _benchmark_worker(rank: int, world_size: int, port: int,
+                      features_dir: str, packed: bool, batch_size: int,
+                      n_batches: int, threads_per_process: Optional[int],
+                      results):
+    _init_local_process_group(rank, world_size, port)
+    try:
+        torch.set_num_threads(threads_per_process
+                              or get_threads_per_process(world_size))
+        dataset = _load_dataset(features_dir, packed)
+        loader = make_data_loader(shard_dataset(dataset, rank, world_size),
+                                  batch_size, shuffle=True, drop_last=True)
+        model = DistributedDataParallel(Net(in_channels=dataset.n_planes))
+        optimizer = torch.optim.Adam(model.parameters(), lr=0.0001)
+        loss_fn = nn.BCELoss()
+
+        def batches():
+            while True:
+                yield from loader
+
+        n_samples = 0
+        start_time = time.perf_counter()
+        for i, (x_batch, y_batch) in enumerate(batches()):
+            if i == WARMUP_BATCHES:
+                n_samples = 0
+                start_time = time.perf_counter()
+            elif i == WARMUP_BATCHES + n_batches:
+                break
+            loss = loss_fn(model(x_batch), y_batch)
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            n_samples += len(x_batch)
+
+        # Total samples over the slowest rank's time.
+        totals = torch.tensor([n_samples, time.perf_counter() - start_time],
+                              dtype=torch.float64)
+        seconds = totals[1:].clone()
+        dist.all_reduce(totals, op=dist.ReduceOp.SUM)
+        dist.all_reduce(seconds, op=dist.ReduceOp.MAX)
+        if rank == 0:
+            results.put(totals[0].item() / seconds.item())
+    finally:
+        dist.destroy_process_group()
+
+
+def benchmark_scaling(features_dir: str,
+                      world_sizes: Iterable[int] = (1, 2, 4, 8),
+                      packed: bool = False, batch_size: int = 1024,
+                      n_batches: int = 50,
+                      threads_per_process: Optional[int] = None) \
+        -> Dict[int, float]:
+    """
+    Measures data-parallel training throughput with an increasing number of
+    processes on this machine.
+
+    :param features_dir: Dataset written by generate_dataset.py.
+    :param world_sizes: Numbers of processes to try.
+    :param packed: Read the bit-packed samples.npy.
+    :param batch_size: Samples per batch and process.
+    :param n_batches: Batches each process trains on after a warm-up.
+    :param threads_per_process: Intra-op threads per process. Defaults to
+    sharing the cores evenly, see get_threads_per_process.
+    :return: Samples per second over all processes, by number of processes.
+    """
+    context = mp.get_context('spawn')
+    results = context.SimpleQueue()
+    samples_per_sec = {}
+    for world_size in world_sizes:
+        mp.spawn(_benchmark_worker,
+                 args=(world_size, get_free_port(), features_dir, packed,
+                       batch_size, n_batches, threads_per_process, results),
+                 nprocs=world_size)
+        samples_per_sec[world_size] = results.get()
+    return samples_per_sec
+
+
+def main():
+    """
+    Entry point for torchrun, which starts one process per rank and sets
+    RANK, WORLD_SIZE, MASTER_ADDR and MASTER_PORT, e.g.
+    torchrun --nproc_per_node 8 -m chess_engine.models.distributed
+    --features_dir data/features
+
+    With --benchmark it instead runs benchmark_scaling and needs no torchrun.
+    """
+    parser = get_argument_parser(description='Trains Net with data-parallel '
+                                             'processes, launched with '
+                                             'torchrun.')
+    parser.add_argument('--threads_per_process',
+                        default=None,
+                        type=int,
+                        help='Intra-op threads per process. Defaults to the '
+                             'number of cores over the number of processes.')
+    parser.add_argument('--benchmark',
+                        default=None,
+                        help='Comma-separated numbers of processes, e.g. '
+                             '1,2,4,8, to measure samples/sec with instead '
+                             'of training.')
+    parser.add_argument('--benchmark_batches',
+                        default=50,
+                        type=int,
+                        help='Batches per process in the benchmark.')
+    args = parser.parse_args()
+
+    if args.benchmark is not None:
+        world_sizes = [int(n) for n in args.benchmark.split(',')]
+        samples_per_sec = benchmark_scaling(
+            args.features_dir, world_sizes, args.packed, args.batch_size,
+            args.benchmark_batches, args.threads_per_process)
+        baseline = samples_per_sec[world_sizes[0]]
+        print('processes  samples/sec  speedup')
+        for world_size, value in samples_per_sec.items():
+            print('{:>9}  {:>11.0f}  {:>6.2f}x'.format(world_size, value,
+                                                       value / baseline))
+        return
+
+    dist.init_process_group(BACKEND)
+    try:
+        train(args, dist.get_rank(), dist.get_world_size())
+    finally:
+        dist.destroy_process_group()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+from collections import OrderedDict
+from typing import Iterable, Optional, Sequence, Union
+
+import chess
+import chess.polyglot
+import numpy as np
+import torch
+import torch.nn as nn
+
+from chess_engine.data.serializer import POSITION_DTYPE, \
+    convert_board_to_position
+from chess_engine.features.registry import DEFAULT_FEATURES, \
+    encode_positions, uses_repetitions
+
+BoardLike = Union[chess.Board, str]
+
+# POSITION_DTYPE fields that features read but the Zobrist hash leaves out.
+# The hash only holds the en passant file when a capture is legal, while the
+# en_passant feature encodes the square after every double push.
+UNHASHED_FIELDS = {'en_passant': 'ep_square',
+                   'halfmove_clock': 'halfmove_clock',
+                   'repetition': 'repetitions'}
+
+
+class Evaluator:
+    """
+    Evaluates chess positions with a trained model, e.g. models.model.Net.
+    Positions are encoded and run through the model in batches, and the
+    evaluations are kept in an LRU cache keyed by the Zobrist hash of the
+    position, so positions that come up again skip both the encoding and the
+    forward pass. With the en_passant, halfmove_clock or repetition features
+    the key also holds the fields of UNHASHED_FIELDS they read.
+    """
+
+    def __init__(self, model: nn.Module, cache_size: int = 2 ** 16,
+                 batch_size: int = 256, device=None,
+                 features: Sequence[str] = DEFAULT_FEATURES):
+        """
+        :param model: Model that maps float tensors of shape
+        (N, n_planes, 8, 8) to tensors of shape (N, 1). It is put in eval
+        mode.
+        :param cache_size: Max number of cached evaluations. 0 disables the
+        cache.
+        :param batch_size: Max number of positions per forward pass.
+        :param device: Device to run the model on. Defaults to the device of
+        the model's parameters.
+        :param features: Features the model was trained on, see
+        chess_engine.features.registry.
+        """
+        if device is None:
+            parameter = next(model.parameters(), None)
+            device = parameter.device if parameter is not None else 'cpu'
+        self.model = model.eval()
+        self.device = torch.device(device)
+        self.cache_size = cache_size
+        self.batch_size = batch_size
+        self.features = tuple(features)
+        self._repetitions = uses_repetitions(self.features)
+        # The repetition count is read from the move history of the boards.
+        self.needs_move_stack = self._repetitions
+        self._key_fields = [POSITION_DTYPE.names.index(field)
+                            for name, field in UNHASHED_FIELDS.items()
+                            if name in self.features]
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+
+    def evaluate(self, board: BoardLike) -> float:
+        """
+        :param board: chess.Board or FEN string.
+        :return: The model output for the position, for Net the probability
+        that white wins.
+        """
+        return float(self.evaluate_many([board])[0])
+
+    def evaluate_many(self, boards: Iterable[BoardLike]) -> np.ndarray:
+        """
+        Evaluates many positions at once. Positions that are not cached are
+        encoded and evaluated in batches of batch_size.
+
+        :param boards: chess.Boards or FEN strings.
+        :return: float32 np array of shape (N,).
+        """
+        boards = [chess.Board(board) if isinstance(board, str) else board
+                  for board in boards]
+        keys = [self._cache_key(board) for board in boards]
+        values = np.empty(len(boards), dtype=np.float32)
+
+        missing = OrderedDict()  # key -> indices of the boards with that key
+        for i, key in enumerate(keys):
+            value = self._lookup(key)
+            if value is None:
+                missing.setdefault(key, []).append(i)
+            else:
+                values[i] = value
+        self.hits += len(boards) - len(missing)
+        self.misses += len(missing)
+
+        missing_keys = list(missing)
+        for start in range(0, len(missing_keys), self.batch_size):
+            batch_keys = missing_keys[start:start + self.batch_size]
+            batch = self._forward([boards[missing[key][0]]
+                                   for key in batch_keys])
+            for key, value in zip(batch_keys, batch.tolist()):
+                values[missing[key]] = value
+                self._store(key, value)
+        return values
+
+    def _cache_key(self, board: chess.Board):
+        key = chess.polyglot.zobrist_hash(board)
+        if not self._key_fields:
+            return key
+        position = convert_board_to_position(board, self._repetitions)
+        return (key,) + tuple(position[i] for i in self._key_fields)
+
+    def _forward(self, boards) -> np.ndarray:
+        positions = np.array([convert_board_to_position(board,
+                                                        self._repetitions)
+                              for board in boards], dtype=POSITION_DTYPE)
+        x = torch.from_numpy(encode_positions(positions, self.features)) \
+            .to(self.device, torch.float32)
+        with torch.inference_mode():
+            return self.model(x).reshape(len(boards)).cpu().numpy()
+
+    def _lookup(self, key) -> Optional[float]:
+        value = self._cache.get(key)
+        if value is not None:
+            self._cache.move_to_end(key)
+        return value
+
+    def _store(self, key, value: float):
+        if self.cache_size <= 0:
+            return
+        self._cache[key] = value
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    @property
+    def cache_len(self) -> int:
+        return len(self._cache)
+
+    def clear_cache(self):
+        self._cache.clear()
+        self.hits = 0
+        self.misses = 0
@@ -0,0 +1,226 @@
+import argparse
+import time
+from os.path import dirname, exists, isdir, join
+from typing import Dict, NamedTuple, Optional, Sequence, Tuple
+
+import torch
+import torch.nn as nn
+
+from chess_engine.features.registry import DEFAULT_FEATURES, count_planes, \
+    load_features, save_features
+from chess_engine.models.model import MODEL_FILENAME, Net, load_net
+
+EAGER = 'eager'
+SCRIPTED = 'scripted'
+QUANTIZED = 'quantized'
+BACKENDS = (EAGER, SCRIPTED, QUANTIZED)
+FILENAMES = {EAGER: MODEL_FILENAME,
+             SCRIPTED: 'scripted.pt',
+             QUANTIZED: 'quantized.pt'}
+
+# Max absolute difference from the eager output, a win probability, that each
+# backend may have.
+TOLERANCES = {EAGER: 0.0,
+              SCRIPTED: 1e-5,
+              QUANTIZED: 0.02}
+
+# Batch size and repeats used to time the backends when loading with 'auto'.
+PROBE_BATCH_SIZE = 64
+PROBE_REPEATS = 5
+
+
+class BackendBenchmark(NamedTuple):
+    latency_ms: float
+    samples_per_sec: float
+    max_error: float
+    tolerance: float = 0.0
+
+    @property
+    def within_tolerance(self) -> bool:
+        return self.max_error <= self.tolerance
+
+
+def quantize(model: nn.Module) -> nn.Module:
+    """
+    :return: Copy of model with the weights of its linear layers, fc1, fc2 and
+    fc3 for Net, quantized to int8. Activations are quantized on the fly.
+    """
+    return torch.ao.quantization.quantize_dynamic(model.eval(), {nn.Linear},
+                                                  dtype=torch.qint8)
+
+
+def export_model(model: nn.Module, target_dir: str,
+                 features: Sequence[str] = DEFAULT_FEATURES) \
+        -> Dict[str, str]:
+    """
+    Saves model to target_dir in every backend: its state_dict as model.pt,
+    TorchScript as scripted.pt and TorchScript of the quantized model as
+    quantized.pt. The TorchScript files load without the Net source code.
+    The features the model takes are saved to features.json.
+
+    :return: Path of the file for each backend.
+    """
+    save_features(target_dir, features)
+    model = model.eval()
+    paths = {backend: join(target_dir, FILENAMES[backend])
+             for backend in BACKENDS}
+    torch.save(model.state_dict(), paths[EAGER])
+    torch.jit.save(torch.jit.script(model), paths[SCRIPTED])
+    torch.jit.save(torch.jit.script(quantize(model)), paths[QUANTIZED])
+    return paths
+
+
+def get_available_backends(model_dir: str) -> Tuple[str, ...]:
+    """
+    :return: Backends exported to model_dir that can run here. Quantized
+    models need a quantized engine, e.g. fbgemm on x86 or qnnpack on ARM.
+    """
+    quantized_engine = torch.backends.quantized.engine != 'none'
+    return tuple(backend for backend in BACKENDS
+                 if exists(join(model_dir, FILENAMES[backend]))
+                 and (backend != QUANTIZED or quantized_engine))
+
+
+def load_model(model_dir: str, backend: str) -> nn.Module:
+    """
+    Loads one backend written by export_model, in eval mode on the CPU.
+    """
+    path = join(model_dir, FILENAMES[backend])
+    if backend == EAGER:
+        model = load_net(path)
+    else:
+        model = torch.jit.load(path, map_location='cpu')
+    return model.eval()
+
+
+def _time_forward(model: nn.Module, x: torch.Tensor, n_repeats: int) \
+        -> float:
+    with torch.inference_mode():
+        model(x)
+        start_time = time.perf_counter()
+        for _ in range(n_repeats):
+            model(x)
+    return (time.perf_counter() - start_time) / n_repeats
+
+
+def make_probe_batch(batch_size: int, seed: int = 0, n_planes: int = 12) \
+        -> torch.Tensor:
+    """
+    :return: Random 0/1 tensor of shape (batch_size, n_planes, 8, 8), shaped
+    like encoded positions.
+    """
+    generator = torch.Generator().manual_seed(seed)
+    return torch.randint(0, 2, (batch_size, n_planes, 8, 8),
+                         generator=generator).float()
+
+
+def load_inference_model(model_dir: str, backend: str = 'auto') \
+        -> Tuple[nn.Module, str]:
+    """
+    Loads the model exported to model_dir for evaluation.
+
+    :param backend: One of BACKENDS, or 'auto' to time every available
+    backend on a small batch and pick the fastest.
+    :return: The model and the name of its backend.
+    """
+    if backend != 'auto':
+        return load_model(model_dir, backend), backend
+    backends = get_available_backends(model_dir)
+    if not backends:
+        raise FileNotFoundError('No exported model in {}'.format(model_dir))
+    x = make_probe_batch(PROBE_BATCH_SIZE, n_planes=count_planes(
+        load_features(model_dir)))
+    models = {name: load_model(model_dir, name) for name in backends}
+    fastest = min(backends,
+                  key=lambda name: _time_forward(models[name], x,
+                                                 PROBE_REPEATS))
+    return models[fastest], fastest
+
+
+def load_trained_model(model_path: Optional[str] = None,
+                       backend: str = 'auto') \
+        -> Tuple[nn.Module, Tuple[str, ...]]:
+    """
+    Loads a model to evaluate positions with, together with the features it
+    takes, as recorded in features.json next to it.
+
+    :param model_path: Directory written by export_model, loaded with
+    load_inference_model, or a Net state_dict such as model.pt from
+    training. Defaults to an untrained Net.
+    :param backend: Backend to load from a directory, see
+    load_inference_model.
+    :return: The model and its features.
+    """
+    if model_path is None:
+        return Net().eval(), DEFAULT_FEATURES
+    if isdir(model_path):
+        model, _ = load_inference_model(model_path, backend)
+        return model, load_features(model_path)
+    return load_net(model_path).eval(), load_features(dirname(model_path))
+
+
+def benchmark_backends(models: Dict[str, nn.Module], batch_size: int = 256,
+                       n_repeats: int = 100,
+                       x: Optional[torch.Tensor] = None,
+                       n_planes: int = 12) \
+        -> Dict[str, BackendBenchmark]:
+    """
+    Compares the backends of one model.
+
+    :param models: Model by backend. Must include EAGER, the reference for
+    the errors.
+    :param batch_size: Batch size for the throughput.
+    :param n_repeats: Forward passes timed per measurement.
+    :param x: Input batch. Defaults to make_probe_batch(batch_size) with
+    n_planes planes.
+    :return: For each backend the single position latency, the batch
+    throughput and the max absolute difference from the eager output.
+    """
+    if x is None:
+        x = make_probe_batch(batch_size, n_planes=n_planes)
+    with torch.inference_mode():
+        reference = models[EAGER](x)
+    results = {}
+    for backend, model in models.items():
+        with torch.inference_mode():
+            max_error = (model(x) - reference).abs().max().item()
+        results[backend] = BackendBenchmark(
+            latency_ms=1000 * _time_forward(model, x[:1], n_repeats),
+            samples_per_sec=len(x) / _time_forward(model, x, n_repeats),
+            max_error=max_error,
+            tolerance=TOLERANCES.get(backend, 0.0))
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Exports a trained Net to '
+                                                 'TorchScript and int8 and '
+                                                 'benchmarks the backends.')
+    parser.add_argument('target_dir',
+                        help='Directory to write model.pt, scripted.pt and '
+                             'quantized.pt to.')
+    parser.add_argument('--model_path',
+                        default=None,
+                        help='state_dict of a trained Net, e.g. model.pt '
+                             'from training. Defaults to an untrained Net.')
+    parser.add_argument('--batch_size',
+                        default=256,
+                        type=int)
+    parser.add_argument('--n_repeats',
+                        default=100,
+                        type=int)
+    args = parser.parse_args()
+
+    net, net_features = load_trained_model(args.model_path)
+    export_model(net, args.target_dir, net_features)
+
+    results = benchmark_backends(
+        {backend: load_model(args.target_dir, backend)
+         for backend in get_available_backends(args.target_dir)},
+        args.batch_size, args.n_repeats, n_planes=count_planes(net_features))
+    print('backend    latency ms  samples/sec  max error  tolerance')
+    for backend, result in results.items():
+        print('{:<9}  {:>10.3f}  {:>11.0f}  {:>9.2e}  {:>9.2e} {}'.format(
+            backend, result.latency_ms, result.samples_per_sec,
+            result.max_error, result.tolerance,
+            'ok' if result.within_tolerance else 'EXCEEDED'))
@@ -1,20 +1,28 @@
-import numpy as np
+import argparse
+import os
+import time
+from os.path import dirname, exists, join
+
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 from torch.utils.tensorboard import SummaryWriter
 
+from chess_engine.features.registry import save_features
+from chess_engine.models.dataset import PackedStateResultDataset, \
+    StateResultDataset, make_data_loader, split_dataset
+
 
 class Net(nn.Module):
     """
     Minimal supervised image classification model. Takes as input a chess board
-    represented as 12 * 8 * 8 tensor. Predicts whether white won the game or
-    not.
+    represented as in_channels * 8 * 8 tensor, by default the 12 piece planes.
+    Predicts whether white won the game or not.
     """
 
-    def __init__(self):
+    def __init__(self, in_channels=12):
         super(Net, self).__init__()
-        self.conv1 = nn.Conv2d(in_channels=12, out_channels=12, kernel_size=3, stride=1, padding=1)
+        self.conv1 = nn.Conv2d(in_channels=in_channels, out_channels=12, kernel_size=3, stride=1, padding=1)
         self.conv2 = nn.Conv2d(in_channels=12, out_channels=12, kernel_size=3, stride=1, padding=1)
         self.fc1 = nn.Linear(in_features=8 * 8 * 12, out_features=400)
         self.fc2 = nn.Linear(in_features=400, out_features=200)
@@ -31,40 +39,279 @@ class Net(nn.Module):
         return x
 
 
-def training_loop(n_epochs, optimizer, model, loss_fn, x_train, x_validate, y_train, y_validate):
-    writer = SummaryWriter()
+def load_net(model_path) -> Net:
+    """
+    Loads a Net from a saved state_dict, e.g. model.pt from training. The
+    number of input planes is read from the weights.
+    """
+    state_dict = torch.load(model_path, map_location='cpu')
+    model = Net(in_channels=state_dict['conv1.weight'].shape[1])
+    model.load_state_dict(state_dict)
+    return model
+
+
+CHECKPOINT_FILENAME = 'checkpoint.pt'
+MODEL_FILENAME = 'model.pt'
 
-    for epoch in range(1, n_epochs + 1):
-        y_train_pred = model(x_train)
-        loss_train = loss_fn(y_train_pred, y_train)
 
-        y_val_pred = model(x_validate)
-        loss_val = loss_fn(y_val_pred, y_validate)
+def save_training_checkpoint(checkpoint_dir, model, optimizer, epoch: int,
+                             step: int):
+    """
+    Saves the model and optimizer state after epoch to
+    checkpoint_dir/checkpoint.pt, and the model's state_dict on its own to
+    checkpoint_dir/model.pt, which chess_engine.uci --model_path loads. Both
+    files are replaced atomically.
+    """
+    # Save the wrapped model of a DistributedDataParallel, so the
+    # checkpoint loads into a plain Net.
+    model = getattr(model, 'module', model)
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    for filename, state in ((CHECKPOINT_FILENAME,
+                             {'epoch': epoch,
+                              'step': step,
+                              'model_state_dict': model.state_dict(),
+                              'optimizer_state_dict': optimizer.state_dict()}),
+                            (MODEL_FILENAME, model.state_dict())):
+        path = join(checkpoint_dir, filename)
+        torch.save(state, path + '.tmp')
+        os.replace(path + '.tmp', path)
 
-        optimizer.zero_grad()
-        loss_train.backward()
-        optimizer.step()
 
-        writer.add_scalar("training_loss", loss_train.item(), epoch)
-        writer.add_scalar("validation_loss", loss_val.item(), epoch)
+def load_training_checkpoint(checkpoint_dir, model, optimizer) -> dict:
+    """
+    Restores the model and optimizer state saved by save_training_checkpoint.
+
+    :return: dict with the epoch and step the checkpoint was saved after, or
+    an empty dict if there is no checkpoint.
+    """
+    path = join(checkpoint_dir, CHECKPOINT_FILENAME)
+    if not exists(path):
+        return {}
+    checkpoint = torch.load(path, map_location='cpu')
+    getattr(model, 'module', model).load_state_dict(
+        checkpoint['model_state_dict'])
+    optimizer.load_state_dict(checkpoint['optimizer_state_dict'])
+    return {'epoch': checkpoint['epoch'], 'step': checkpoint['step']}
+
+
+def _to_device(batch, device):
+    if device is None:
+        return batch
+    # Asynchronous when the batch is in pinned memory.
+    return [tensor.to(device, non_blocking=True) for tensor in batch]
+
+
+def validate(model, loss_fn, validation_loader, device=None) -> float:
+    """
+    :param device: Device to move the batches to, see training_loop.
+    :return: Mean loss over validation_loader, computed without autograd.
+    """
+    model.eval()
+    loss_val = 0.0
+    n_val = 0
+    with torch.no_grad():
+        for batch in validation_loader:
+            x_batch, y_batch = _to_device(batch, device)
+            loss_val += loss_fn(model(x_batch), y_batch).item() * len(x_batch)
+            n_val += len(x_batch)
+    return loss_val / max(n_val, 1)
+
+
+def training_loop(n_epochs, optimizer, model, loss_fn, train_loader,
+                  validation_loader, validate_every=1, checkpoint_dir=None,
+                  checkpoint_every=1, resume=False, log_every=100,
+                  writer=None, is_main_process=True, device=None):
+    """
+    Trains model with mini-batches from train_loader.
+
+    Every log_every batches the samples per second, the compute time per
+    batch and the time spent waiting for the data loader are logged to
+    tensorboard, so it shows whether training is bound by I/O or compute.
+
+    :param n_epochs: Epoch to train up to.
+    :param validate_every: Epochs between validation runs.
+    :param checkpoint_dir: Directory for checkpoints. Defaults to not saving
+    any.
+    :param checkpoint_every: Epochs between checkpoints.
+    :param resume: Continue from the checkpoint in checkpoint_dir, if any.
+    :param log_every: Batches between throughput logs.
+    :param writer: SummaryWriter. Defaults to a new one in ./runs.
+    :param is_main_process: False for the other ranks of a distributed run,
+    which neither validate, log nor save checkpoints.
+    :param device: Device to move the batches to, the one model is on. The
+    copies are asynchronous for loaders with pin_memory=True. Defaults to
+    using the batches as they are loaded.
+    :return: List of (epoch, training loss, validation loss or None).
+    """
+    if is_main_process:
+        writer = writer or SummaryWriter()
+    start_epoch = 1
+    step = 0
+    if resume and checkpoint_dir is not None:
+        checkpoint = load_training_checkpoint(checkpoint_dir, model, optimizer)
+        start_epoch = checkpoint.get('epoch', 0) + 1
+        step = checkpoint.get('step', 0)
+
+    history = []
+    for epoch in range(start_epoch, n_epochs + 1):
+        model.train()
+        loss_train = 0.0
+        n_train = 0
+        window_samples = 0
+        window_wait = 0.0
+        window_compute = 0.0
+        window_batches = 0
+        batches = iter(train_loader)
+        while True:
+            start_time = time.perf_counter()
+            batch = next(batches, None)
+            loaded_time = time.perf_counter()
+            if batch is None:
+                break
+            x_batch, y_batch = _to_device(batch, device)
+
+            y_pred = model(x_batch)
+            loss = loss_fn(y_pred, y_batch)
+
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+
+            loss_train += loss.item() * len(x_batch)
+            n_train += len(x_batch)
+            step += 1
+
+            window_wait += loaded_time - start_time
+            window_compute += time.perf_counter() - loaded_time
+            window_samples += len(x_batch)
+            window_batches += 1
+            if window_batches == log_every:
+                if is_main_process:
+                    _log_throughput(writer, step, window_samples,
+                                    window_batches, window_wait,
+                                    window_compute)
+                window_samples = window_batches = 0
+                window_wait = window_compute = 0.0
+        if window_batches and is_main_process:
+            _log_throughput(writer, step, window_samples, window_batches,
+                            window_wait, window_compute)
+
+        loss_train /= max(n_train, 1)
+        loss_val = None
+        if is_main_process:
+            writer.add_scalar("training_loss", loss_train, epoch)
+            if epoch % validate_every == 0 or epoch == n_epochs:
+                loss_val = validate(model, loss_fn, validation_loader,
+                                    device)
+                writer.add_scalar("validation_loss", loss_val, epoch)
+            if checkpoint_dir is not None and (epoch % checkpoint_every == 0
+                                               or epoch == n_epochs):
+                save_training_checkpoint(checkpoint_dir, model, optimizer,
+                                         epoch, step)
+        history.append((epoch, loss_train, loss_val))
+
+    if is_main_process:
+        writer.flush()
+    return history
+
+
+def _log_throughput(writer, step, n_samples, n_batches, wait_seconds,
+                    compute_seconds):
+    writer.add_scalar('throughput/samples_per_sec',
+                      n_samples / max(wait_seconds + compute_seconds, 1e-9),
+                      step)
+    writer.add_scalar('throughput/batch_latency_ms',
+                      1000 * compute_seconds / n_batches, step)
+    writer.add_scalar('throughput/data_wait_ms',
+                      1000 * wait_seconds / n_batches, step)
+
+
+def get_argument_parser(description='Trains Net on a dataset written by '
+                                    'generate_dataset.py.',
+                        dataset_options: bool = True) \
+        -> argparse.ArgumentParser:
+    """
+    :param dataset_options: Add --features_dir and --packed, which select the
+    dataset written by generate_dataset.py to train on.
+    :return: Parser for the training options, shared with
+    chess_engine.models.distributed and chess_engine.models.online.
+    """
+    parser = argparse.ArgumentParser(description=description)
+    if dataset_options:
+        # ../chess-engine/data/features/
+        features_dir = dirname(dirname(dirname(__file__))) + '/data/features/'
+        parser.add_argument('--features_dir',
+                            default=features_dir,
+                            help='Directory with x.npy and y.npy, or '
+                                 'samples.npy with --packed.')
+        parser.add_argument('--packed',
+                            action='store_true',
+                            help='Train on the bit-packed samples.npy.')
+    parser.add_argument('--batch_size',
+                        default=1024,
+                        type=int,
+                        help='Number of samples per mini-batch.')
+    parser.add_argument('--num_workers',
+                        default=0,
+                        type=int,
+                        help='Number of DataLoader worker processes.')
+    parser.add_argument('--pin_memory',
+                        action='store_true',
+                        help='Load batches into pinned memory, so they are '
+                             'copied to a GPU --device asynchronously.')
+    parser.add_argument('--device',
+                        default=None,
+                        help='Device to train on. Defaults to cuda when '
+                             'available, else cpu.')
+    parser.add_argument('--n_epochs',
+                        default=1000,
+                        type=int)
+    parser.add_argument('--validate_every',
+                        default=1,
+                        type=int,
+                        help='Epochs between validation runs.')
+    parser.add_argument('--checkpoint_dir',
+                        default=None,
+                        help='Directory to save checkpoint.pt and model.pt '
+                             'in.')
+    parser.add_argument('--checkpoint_every',
+                        default=1,
+                        type=int,
+                        help='Epochs between checkpoints.')
+    parser.add_argument('--resume',
+                        action='store_true',
+                        help='Continue from the checkpoint in '
+                             '--checkpoint_dir.')
+    parser.add_argument('--log_dir',
+                        default=None,
+                        help='Tensorboard log directory. Defaults to ./runs.')
+    return parser
 
 
 if __name__ == '__main__':
-    x = np.load('/Users/brianelinsky/repos/chess-engine/data/features/x.npy')
-    y = np.load('/Users/brianelinsky/repos/chess-engine/data/features/y.npy')
-    x_tensor = torch.tensor(x, dtype=torch.float32)
-    y_tensor = torch.tensor(y, dtype=torch.float32)
-    y_tensor = torch.unsqueeze(y_tensor, 1)  # Add batch dimension
+    args = get_argument_parser().parse_args()
+
+    if args.packed:
+        dataset = PackedStateResultDataset(args.features_dir)
+    else:
+        dataset = StateResultDataset(args.features_dir)
 
     # Naively split into test and train
-    n = len(x_tensor)
-    n_train = int(n * 0.90)
-    n_test = int(n - n_train)
-    x_train, x_test = torch.split(x_tensor, split_size_or_sections=[n_train, n_test])
-    y_train, y_test = torch.split(y_tensor, split_size_or_sections=[n_train, n_test])
+    train_set, test_set = split_dataset(dataset, validation_fraction=0.10)
+    train_loader = make_data_loader(train_set, args.batch_size, shuffle=True,
+                                    num_workers=args.num_workers,
+                                    pin_memory=args.pin_memory)
+    test_loader = make_data_loader(test_set, args.batch_size, shuffle=False,
+                                   num_workers=args.num_workers,
+                                   pin_memory=args.pin_memory)
 
     # Instantiate the network
-    model = Net()
+    device = torch.device(args.device or ('cuda' if torch.cuda.is_available()
+                                          else 'cpu'))
+    model = Net(in_channels=dataset.n_planes).to(device)
+    if args.checkpoint_dir is not None:
+        # Evaluators read the features the model expects from here.
+        save_features(args.checkpoint_dir, dataset.features)
 
     # Define the loss function
     loss_fn = nn.BCELoss()
@@ -72,16 +319,19 @@ if __name__ == '__main__':
     # Define the optimizer
     optimizer = torch.optim.Adam(model.parameters(), lr=0.0001)
 
-    # TODO - Incorporate tensorboard for logging
-    # TODO - figure out how to compare the model results to an engine like stockfish
+    # Compare the trained model with an engine like stockfish with
+    # python -m chess_engine.benchmark.harness --engine stockfish
     # TODO - what is a good loss number? How do you interpret it?
-    # TODO - add model checkpointing.
 
-    training_loop(n_epochs=1000,
+    training_loop(n_epochs=args.n_epochs,
                   optimizer=optimizer,
                   model=model,
                   loss_fn=loss_fn,
-                  x_train=x_train,
-                  x_validate=x_test,
-                  y_train=y_train,
-                  y_validate=y_test)
+                  train_loader=train_loader,
+                  validation_loader=test_loader,
+                  validate_every=args.validate_every,
+                  checkpoint_dir=args.checkpoint_dir,
+                  checkpoint_every=args.checkpoint_every,
+                  resume=args.resume,
+                  writer=SummaryWriter(args.log_dir),
+                  device=device)
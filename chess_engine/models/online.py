@@ -0,0 +1,183 @@
+import argparse
+import os
+from random import Random
+from typing import Tuple
+
+import torch
+import torch.nn as nn
+from torch.utils.data import TensorDataset
+from torch.utils.tensorboard import SummaryWriter
+
+from chess_engine.data.generate_dataset import \
+    create_shard_state_result_dataset, find_next_game_offset
+from chess_engine.data.online import OnlineSampleProducer
+from chess_engine.features.registry import DEFAULT_FEATURES, FEATURES, \
+    count_planes, save_features
+from chess_engine.models.dataset import make_data_loader
+from chess_engine.models.model import Net, get_argument_parser, training_loop
+
+
+class OnlineBatches:
+    """
+    Training batches taken from the ring buffer of an OnlineSampleProducer.
+    Every iteration is one epoch of batches_per_epoch batches of fresh
+    samples, so it can stand in for the train DataLoader of training_loop.
+    """
+
+    def __init__(self, producer: OnlineSampleProducer, batch_size: int,
+                 batches_per_epoch: int):
+        self.producer = producer
+        self.batch_size = batch_size
+        self.batches_per_epoch = batches_per_epoch
+
+    def __len__(self):
+        return self.batches_per_epoch
+
+    def __iter__(self):
+        for _ in range(self.batches_per_epoch):
+            x, y = self.producer.get(self.batch_size)
+            yield torch.from_numpy(x).float(), \
+                torch.from_numpy(y).float()[:, None]
+
+
+def find_validation_offset(dataset_filename, validation_fraction: float) \
+        -> int:
+    """
+    :return: Byte offset of the first game of the last validation_fraction of
+    the file. The producers sample from the games before it.
+    """
+    size = os.path.getsize(dataset_filename)
+    with open(dataset_filename, 'rb') as file:
+        return find_next_game_offset(
+            file, int(size * (1 - validation_fraction)))
+
+
+def make_validation_set(dataset_filename, start: int, **kwargs) \
+        -> TensorDataset:
+    """
+    Samples a fixed validation set from the games after the byte offset start
+    into memory. See generate_shard_samples for the keyword arguments.
+    """
+    x, y = create_shard_state_result_dataset(dataset_filename, start,
+                                             **kwargs)
+    return TensorDataset(torch.from_numpy(x).float(),
+                         torch.from_numpy(y).float()[:, None])
+
+
+def train_online(args) -> Tuple[list, Net]:
+    """
+    Trains Net on positions sampled from a PGN file while it trains, without
+    generating a dataset first. The last --validation_fraction of the file is
+    sampled once for validation; producer processes sample the rest over and
+    over into a shared memory ring buffer that the training loop reads from.
+
+    :param args: Options from get_argument_parser.
+    :return: History from training_loop and the trained model.
+    """
+    features = args.features.split(',')
+    validation_start = find_validation_offset(args.dataset_path,
+                                              args.validation_fraction)
+    sampling_kwargs = {'positions_per_game': args.positions_per_game,
+                       'fast_parser': args.fast_parser,
+                       'header_filter': args.filter}
+    validation_set = make_validation_set(
+        args.dataset_path, validation_start, features=features,
+        rng=Random(args.seed), **sampling_kwargs)
+    validation_loader = make_data_loader(validation_set, args.batch_size,
+                                         shuffle=False,
+                                         pin_memory=args.pin_memory)
+
+    device = torch.device(args.device or ('cuda' if torch.cuda.is_available()
+                                          else 'cpu'))
+    model = Net(in_channels=count_planes(features)).to(device)
+    optimizer = torch.optim.Adam(model.parameters(), lr=0.0001)
+    if args.checkpoint_dir is not None:
+        save_features(args.checkpoint_dir, features)
+    writer = SummaryWriter(args.log_dir)
+    with OnlineSampleProducer(args.dataset_path, producers=args.producers,
+                              capacity=args.buffer_size,
+                              end=validation_start, random_seed=args.seed,
+                              features=features, **sampling_kwargs) \
+            as producer:
+        history = training_loop(
+            n_epochs=args.n_epochs,
+            optimizer=optimizer,
+            model=model,
+            loss_fn=nn.BCELoss(),
+            train_loader=OnlineBatches(producer, args.batch_size,
+                                       args.batches_per_epoch),
+            validation_loader=validation_loader,
+            validate_every=args.validate_every,
+            checkpoint_dir=args.checkpoint_dir,
+            checkpoint_every=args.checkpoint_every,
+            resume=args.resume,
+            writer=writer,
+            device=device)
+    writer.close()
+    return history, model
+
+
+def get_online_argument_parser() -> argparse.ArgumentParser:
+    """
+    :return: Parser for the training options of
+    chess_engine.models.model.get_argument_parser and the online sampling
+    options.
+    """
+    parser = get_argument_parser(description='Trains Net on positions sampled '
+                                             'from a PGN file by producer '
+                                             'processes while it trains.',
+                                 dataset_options=False)
+    parser.add_argument('--dataset_path',
+                        required=True,
+                        help='Cleaned PGN file, like --clean_dataset_path of '
+                             'generate_dataset.py.')
+    parser.add_argument('--producers',
+                        default=2,
+                        type=int,
+                        help='Number of processes sampling and encoding '
+                             'positions.')
+    parser.add_argument('--buffer_size',
+                        default=65536,
+                        type=int,
+                        help='Max number of samples waiting in the shared '
+                             'memory ring buffer. Producers wait while it is '
+                             'full.')
+    parser.add_argument('--batches_per_epoch',
+                        default=1000,
+                        type=int)
+    parser.add_argument('--validation_fraction',
+                        default=0.10,
+                        type=float,
+                        help='Fraction of the file, at its end, to sample the '
+                             'validation set from once.')
+    parser.add_argument('--positions-per-game',
+                        dest='positions_per_game',
+                        default=1,
+                        type=int,
+                        help='Number of states to sample from each game per '
+                             'pass. 0 samples every state.')
+    parser.add_argument('--fast-parser',
+                        dest='fast_parser',
+                        action='store_true',
+                        help='Read only the headers and mainline moves of each '
+                             'game.')
+    parser.add_argument('--features',
+                        default=','.join(DEFAULT_FEATURES),
+                        help='Comma-separated input planes to compute, out '
+                             'of {}.'.format(', '.join(FEATURES)))
+    parser.add_argument('--filter',
+                        default=None,
+                        help="Only sample the games whose headers match, e.g. "
+                             "'Elo>=2600, Year>=2010'.")
+    parser.add_argument('--seed',
+                        default=None,
+                        type=int)
+    return parser
+
+
+def main():
+    train_online(get_online_argument_parser().parse_args())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,345 @@
+import argparse
+import math
+import threading
+import time
+from typing import Callable, List, NamedTuple, Optional
+
+import chess
+import chess.polyglot
+
+from chess_engine.search.transposition import EXACT, LOWER_BOUND, \
+    UPPER_BOUND, TranspositionTable
+
+# Scores are from the point of view of the side to move. A position the
+# evaluator scores as a sure win for the side to move is worth 0.5, a sure
+# loss -0.5. Mates are worth far more, and are found sooner the closer they
+# are to the root.
+MATE_SCORE = 1000.0
+MATE_THRESHOLD = MATE_SCORE - 500
+DRAW_SCORE = 0.0
+INFINITY = math.inf
+
+# Nodes searched between two checks of the clock and the stop flag.
+NODES_PER_CHECK = 256
+PIECE_ORDER_VALUES = {chess.PAWN: 1, chess.KNIGHT: 3, chess.BISHOP: 3,
+                      chess.ROOK: 5, chess.QUEEN: 9, chess.KING: 100}
+
+
+class SearchResult(NamedTuple):
+    best_move: Optional[chess.Move]
+    score: float
+    depth: int
+    nodes: int
+    seconds: float
+    pv: List[chess.Move]
+
+    @property
+    def nps(self) -> float:
+        return self.nodes / self.seconds if self.seconds > 0 else 0.0
+
+
+class SearchStopped(Exception):
+    """
+    Raised inside the search when the time is up or stop() was called.
+    """
+    pass
+
+
+def _score_to_table(score: float, ply: int) -> float:
+    # Mate scores are stored relative to the position, not the root.
+    if score > MATE_THRESHOLD:
+        return score + ply
+    if score < -MATE_THRESHOLD:
+        return score - ply
+    return score
+
+
+def _score_from_table(score: float, ply: int) -> float:
+    if score > MATE_THRESHOLD:
+        return score - ply
+    if score < -MATE_THRESHOLD:
+        return score + ply
+    return score
+
+
+def order_moves(board: chess.Board, moves: List[chess.Move],
+                first_move: Optional[chess.Move] = None) -> List[chess.Move]:
+    """
+    Orders moves for the alpha-beta search: first_move (usually the best move
+    from the transposition table), then promotions and captures, most
+    valuable victim first and least valuable attacker second, then the quiet
+    moves.
+    """
+    def key(move):
+        if move == first_move:
+            return -10000
+        score = 0
+        if move.promotion:
+            score -= 100 * PIECE_ORDER_VALUES[move.promotion]
+        if board.is_capture(move):
+            victim = board.piece_type_at(move.to_square) or chess.PAWN
+            attacker = board.piece_type_at(move.from_square)
+            score -= 10 * PIECE_ORDER_VALUES[victim] \
+                - PIECE_ORDER_VALUES[attacker]
+        return score
+
+    return sorted(moves, key=key)
+
+
+class AlphaBetaSearcher:
+    """
+    Iterative-deepening negamax alpha-beta search over python-chess boards.
+    Positions are scored by an evaluator with an evaluate_many(boards) method
+    that returns the probability that white wins, e.g.
+    models.evaluator.Evaluator wrapping a trained Net. All children of a node
+    one ply above the horizon are evaluated in a single batch, so each
+    forward pass of the model scores a whole move list. Searched positions go
+    into a transposition table keyed by their Zobrist hash, and its best
+    moves are tried first.
+    """
+
+    def __init__(self, evaluator, table_size: int = 2 ** 20,
+                 table: Optional[TranspositionTable] = None):
+        """
+        :param evaluator: Object with evaluate_many(boards) -> np array of
+        P(white wins). Its needs_move_stack attribute, True if missing, tells
+        whether the boards must keep their move history, e.g. for the
+        repetition feature.
+        :param table_size: Max number of transposition table entries.
+        :param table: Transposition table to use instead of a new one, e.g.
+        to share it between searchers running on several threads.
+        """
+        self.evaluator = evaluator
+        self.table = table if table is not None else \
+            TranspositionTable(table_size)
+        self.nodes = 0
+        self._deadline = None
+        self._root_best_move = None
+        self._stop_event = threading.Event()
+        self._needs_move_stack = getattr(evaluator, 'needs_move_stack', True)
+
+    def stop(self):
+        """
+        Makes a running search return its last completed iteration. Safe to
+        call from another thread.
+        """
+        self._stop_event.set()
+
+    def search(self, board: chess.Board, max_depth: int = 64,
+               time_limit: Optional[float] = None,
+               callback: Optional[Callable[[SearchResult], None]] = None) \
+            -> SearchResult:
+        """
+        Searches board one ply deeper at a time, until max_depth is reached,
+        the time limit is up or stop() is called.
+
+        :param board: Position to search. It is not modified.
+        :param max_depth: Depth of the last iteration, in plies.
+        :param time_limit: Seconds to search for. Defaults to no limit.
+        :param callback: Called with the result of every completed iteration.
+        :return: SearchResult of the deepest completed iteration. If not even
+        the first one completed, the best move found so far.
+        """
+        board = board.copy()
+        self._stop_event.clear()
+        self.nodes = 0
+        start_time = time.perf_counter()
+        self._deadline = None if time_limit is None else \
+            start_time + time_limit
+        self._root_best_move = None
+
+        moves = list(board.legal_moves)
+        result = SearchResult(moves[0] if moves else None, DRAW_SCORE, 0, 0,
+                              0.0, moves[:1])
+        for depth in range(1, max_depth + 1):
+            try:
+                score = self._negamax(board, depth, -INFINITY, INFINITY, 0)
+            except SearchStopped:
+                if result.depth == 0 and self._root_best_move is not None:
+                    result = result._replace(best_move=self._root_best_move,
+                                             pv=[self._root_best_move])
+                break
+            pv = self._principal_variation(board, depth)
+            result = SearchResult(pv[0] if pv else None, score, depth,
+                                  self.nodes,
+                                  time.perf_counter() - start_time, pv)
+            if callback is not None:
+                callback(result)
+            if not moves or abs(score) > MATE_THRESHOLD:
+                break
+
+        return result._replace(nodes=self.nodes,
+                               seconds=time.perf_counter() - start_time)
+
+    def _count_nodes(self, n: int = 1):
+        previous = self.nodes
+        self.nodes += n
+        if previous // NODES_PER_CHECK != self.nodes // NODES_PER_CHECK:
+            if self._stop_event.is_set() or (
+                    self._deadline is not None
+                    and time.perf_counter() > self._deadline):
+                raise SearchStopped()
+
+    def _is_draw(self, board: chess.Board) -> bool:
+        return board.is_insufficient_material() \
+            or board.halfmove_clock >= 100 or board.is_repetition(3)
+
+    def _negamax(self, board: chess.Board, depth: int, alpha: float,
+                 beta: float, ply: int) -> float:
+        self._count_nodes()
+        if ply > 0 and self._is_draw(board):
+            return DRAW_SCORE
+
+        key = chess.polyglot.zobrist_hash(board)
+        entry = self.table.get(key)
+        table_move = None
+        if entry is not None:
+            table_move = entry.best_move
+            if ply > 0 and entry.depth >= depth:
+                score = _score_from_table(entry.score, ply)
+                if entry.bound == EXACT:
+                    return score
+                if entry.bound == LOWER_BOUND:
+                    alpha = max(alpha, score)
+                else:
+                    beta = min(beta, score)
+                if alpha >= beta:
+                    return score
+
+        moves = list(board.legal_moves)
+        if not moves:
+            return -MATE_SCORE + ply if board.is_check() else DRAW_SCORE
+        if depth <= 0:
+            return self._evaluate(board, [board])[0]
+
+        moves = order_moves(board, moves, table_move)
+        if depth == 1:
+            scores = self._evaluate_children(board, moves, ply)
+
+        original_alpha = alpha
+        best_score = -INFINITY
+        best_move = None
+        for i, move in enumerate(moves):
+            if depth == 1:
+                score = scores[i]
+            else:
+                board.push(move)
+                try:
+                    score = -self._negamax(board, depth - 1, -beta, -alpha,
+                                           ply + 1)
+                finally:
+                    board.pop()
+            if score > best_score:
+                best_score = score
+                best_move = move
+                if ply == 0:
+                    self._root_best_move = move
+            alpha = max(alpha, score)
+            if alpha >= beta:
+                break
+
+        if best_score <= original_alpha:
+            bound = UPPER_BOUND
+        elif best_score >= beta:
+            bound = LOWER_BOUND
+        else:
+            bound = EXACT
+        self.table.store(key, depth, _score_to_table(best_score, ply), bound,
+                         best_move)
+        return best_score
+
+    def _evaluate(self, board: chess.Board, positions) -> List[float]:
+        # Scores positions after board.turn has moved, or board itself, for
+        # the side to move in board.
+        white_win_probabilities = self.evaluator.evaluate_many(positions)
+        sign = 1 if board.turn == chess.WHITE else -1
+        return [sign * (float(p) - 0.5) for p in white_win_probabilities]
+
+    def _evaluate_children(self, board: chess.Board, moves: List[chess.Move],
+                           ply: int) -> List[float]:
+        """
+        Scores every move of board one ply deep, with a single call to the
+        evaluator for all the children that are not mate or a draw.
+        """
+        self._count_nodes(len(moves))
+        scores = [DRAW_SCORE] * len(moves)
+        children = []
+        child_indices = []
+        for i, move in enumerate(moves):
+            board.push(move)
+            if not any(board.generate_legal_moves()):
+                # Mate, or stalemate, which keeps the DRAW_SCORE.
+                if board.is_check():
+                    scores[i] = MATE_SCORE - (ply + 1)
+            elif not self._is_draw(board):
+                children.append(board.copy(stack=self._needs_move_stack))
+                child_indices.append(i)
+            board.pop()
+        if children:
+            for i, score in zip(child_indices,
+                                self._evaluate(board, children)):
+                scores[i] = score
+        return scores
+
+    def _principal_variation(self, board: chess.Board, depth: int) \
+            -> List[chess.Move]:
+        pv = []
+        seen = set()
+        board = board.copy()
+        for _ in range(depth):
+            key = chess.polyglot.zobrist_hash(board)
+            entry = self.table.get(key)
+            if entry is None or entry.best_move is None or key in seen \
+                    or entry.best_move not in board.legal_moves:
+                break
+            seen.add(key)
+            pv.append(entry.best_move)
+            board.push(entry.best_move)
+        return pv
+
+
+if __name__ == '__main__':
+    from chess_engine.models.evaluator import Evaluator
+    from chess_engine.models.export import load_trained_model
+    from chess_engine.search.evaluation import MaterialEvaluator
+
+    parser = argparse.ArgumentParser(description='Searches a position and '
+                                                 'prints every completed '
+                                                 'iteration.')
+    parser.add_argument('--fen',
+                        default=chess.STARTING_FEN)
+    parser.add_argument('--depth',
+                        default=4,
+                        type=int,
+                        help='Depth of the last iteration, in plies.')
+    parser.add_argument('--time_limit',
+                        default=None,
+                        type=float,
+                        help='Seconds to search for.')
+    parser.add_argument('--model_path',
+                        default=None,
+                        help='state_dict of a trained Net, or a directory '
+                             'written by chess_engine.models.export. '
+                             'Defaults to an untrained Net.')
+    parser.add_argument('--material',
+                        action='store_true',
+                        help='Evaluate with the material balance instead of '
+                             'Net.')
+    args = parser.parse_args()
+
+    if args.material:
+        evaluator = MaterialEvaluator()
+    else:
+        model, features = load_trained_model(args.model_path)
+        evaluator = Evaluator(model, features=features)
+
+    def print_iteration(result: SearchResult):
+        print('depth {} score {:.3f} nodes {} nps {:.0f} time {:.2f}s pv {}'
+              .format(result.depth, result.score, result.nodes, result.nps,
+                      result.seconds, ' '.join(move.uci()
+                                               for move in result.pv)))
+
+    searcher = AlphaBetaSearcher(evaluator)
+    result = searcher.search(chess.Board(args.fen), args.depth,
+                             args.time_limit, print_iteration)
+    print('bestmove', result.best_move)
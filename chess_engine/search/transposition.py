@@ -0,0 +1,61 @@
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+import chess
+
+# Kinds of scores stored in the table.
+EXACT = 0
+LOWER_BOUND = 1  # the search failed high, the score is at least this
+UPPER_BOUND = 2  # the search failed low, the score is at most this
+
+
+class TableEntry(NamedTuple):
+    depth: int
+    score: float
+    bound: int
+    best_move: Optional[chess.Move]
+
+
+class TranspositionTable:
+    """
+    Results of searched positions, keyed by their Zobrist hash. Holds at most
+    max_entries entries and evicts the least recently stored one when full.
+    An entry is only replaced by the result of a search at least as deep.
+    Safe to share between the threads of a parallel search.
+    """
+
+    def __init__(self, max_entries: int = 2 ** 20):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: int) -> Optional[TableEntry]:
+        with self._lock:
+            return self._entries.get(key)
+
+    def store(self, key: int, depth: int, score: float, bound: int,
+              best_move: Optional[chess.Move]):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.depth > depth:
+                return
+            self._entries[key] = TableEntry(depth, score, bound, best_move)
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def resize(self, max_entries: int):
+        with self._lock:
+            self.max_entries = max_entries
+            self._evict()
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,353 @@
+import argparse
+import math
+import sys
+import threading
+from typing import Callable, Dict, List, Optional
+
+import chess
+
+from chess_engine.search.alphabeta import MATE_SCORE, MATE_THRESHOLD, \
+    AlphaBetaSearcher, SearchResult
+from chess_engine.search.transposition import TranspositionTable
+
+ENGINE_NAME = 'chess_engine'
+ENGINE_AUTHOR = 'Brian Elinsky'
+
+# Rough memory use of one transposition table entry, a key in an
+# OrderedDict plus a TableEntry tuple.
+TABLE_ENTRY_BYTES = 256
+DEFAULT_HASH_MB = 16
+MAX_HASH_MB = 4096
+MAX_THREADS = 64
+
+# Time kept in reserve for the GUI and the process, in seconds.
+MOVE_OVERHEAD = 0.05
+STOP_POLL_SECONDS = 0.01
+# Moves the remaining time is spread over when the GUI does not say.
+DEFAULT_MOVES_TO_GO = 30
+
+
+def convert_score_to_centipawns(score: float) -> int:
+    """
+    Converts a search score that is not a mate, see
+    chess_engine.search.alphabeta, to centipawns with the usual logistic
+    model, 400 centipawns for 10:1 odds.
+    """
+    probability = min(max(score + 0.5, 1e-6), 1 - 1e-6)
+    return round(400 * math.log10(probability / (1 - probability)))
+
+
+def convert_score_to_uci(score: float) -> str:
+    """
+    Formats a search score as the score part of a UCI info line.
+    """
+    if abs(score) > MATE_THRESHOLD:
+        plies = int(MATE_SCORE - abs(score))
+        moves = (plies + 1) // 2
+        return 'mate {}'.format(moves if score > 0 else -moves)
+    return 'cp {}'.format(convert_score_to_centipawns(score))
+
+
+def get_time_limit(board: chess.Board, options: Dict[str, float]) \
+        -> Optional[float]:
+    """
+    Picks the number of seconds to search for from the arguments of a UCI go
+    command.
+
+    :param board: Position to search.
+    :param options: go arguments, e.g. {'wtime': 60000, 'winc': 1000}, times
+    in milliseconds.
+    :return: Seconds, or None to search until depth or stop.
+    """
+    if 'movetime' in options:
+        return max(options['movetime'] / 1000 - MOVE_OVERHEAD, 0.01)
+    prefix = 'w' if board.turn == chess.WHITE else 'b'
+    if prefix + 'time' not in options:
+        return None
+    remaining = options[prefix + 'time'] / 1000
+    increment = options.get(prefix + 'inc', 0) / 1000
+    moves_to_go = options.get('movestogo', DEFAULT_MOVES_TO_GO) or 1
+    budget = remaining / moves_to_go + increment / 2
+    return max(min(budget, remaining / 2) - MOVE_OVERHEAD, 0.01)
+
+
+def _stop_thread(thread: threading.Thread,
+                 searchers: List[AlphaBetaSearcher]):
+    # A searcher clears its stop flag when it starts, so keep stopping until
+    # the thread is done.
+    while thread.is_alive():
+        for searcher in searchers:
+            searcher.stop()
+        thread.join(STOP_POLL_SECONDS)
+
+
+class UciEngine:
+    """
+    Speaks the UCI protocol on behalf of AlphaBetaSearcher. Commands are
+    passed to handle() one line at a time. A go command starts the search on
+    a worker thread and returns at once, so stop, isready and the other
+    commands are answered while it runs. The worker writes the info lines and
+    the bestmove.
+    """
+
+    def __init__(self, make_evaluator: Callable[[], object],
+                 output: Callable[[str], None] = None):
+        """
+        :param make_evaluator: Returns a new evaluator, see
+        AlphaBetaSearcher. Every search thread gets its own one.
+        :param output: Writes one line to the GUI. Defaults to stdout.
+        """
+        self.make_evaluator = make_evaluator
+        self._output = output or self._print
+        self._output_lock = threading.Lock()
+        self.board = chess.Board()
+        self.table = TranspositionTable(self._get_table_entries(
+            DEFAULT_HASH_MB))
+        self.searchers = []
+        self.set_threads(1)
+        self._worker = None
+        self._options = {}
+        # Set once the bestmove of an infinite or ponder search may be sent.
+        self._bestmove_allowed = threading.Event()
+
+    @staticmethod
+    def _print(line: str):
+        sys.stdout.write(line + '\n')
+        sys.stdout.flush()
+
+    def output(self, line: str):
+        with self._output_lock:
+            self._output(line)
+
+    @staticmethod
+    def _get_table_entries(hash_mb: int) -> int:
+        return max(1, hash_mb * 2 ** 20 // TABLE_ENTRY_BYTES)
+
+    def set_hash(self, hash_mb: int):
+        self.table.resize(self._get_table_entries(hash_mb))
+
+    def set_threads(self, n_threads: int):
+        self.searchers = [AlphaBetaSearcher(self.make_evaluator(),
+                                            table=self.table)
+                          for _ in range(n_threads)]
+
+    def handle(self, line: str) -> bool:
+        """
+        Handles one command from the GUI.
+
+        :param line: A line of UCI input.
+        :return: False after quit, True otherwise.
+        """
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, arguments = tokens[0], tokens[1:]
+        if command == 'uci':
+            self.output('id name {}'.format(ENGINE_NAME))
+            self.output('id author {}'.format(ENGINE_AUTHOR))
+            self.output('option name Hash type spin default {} min 1 max {}'
+                        .format(DEFAULT_HASH_MB, MAX_HASH_MB))
+            self.output('option name Threads type spin default 1 min 1 '
+                        'max {}'.format(MAX_THREADS))
+            self.output('uciok')
+        elif command == 'isready':
+            self.output('readyok')
+        elif command == 'setoption':
+            self._set_option(arguments)
+        elif command == 'ucinewgame':
+            self.stop()
+            self.table.clear()
+        elif command == 'position':
+            self.stop()
+            self.board = self._parse_position(arguments)
+        elif command == 'go':
+            self.go(self._parse_go(arguments))
+        elif command == 'stop':
+            self.stop()
+        elif command == 'ponderhit':
+            self.ponderhit()
+        elif command == 'quit':
+            self.stop()
+            return False
+        return True
+
+    def _set_option(self, arguments: List[str]):
+        if 'name' not in arguments or 'value' not in arguments:
+            return
+        name_index = arguments.index('name') + 1
+        value_index = arguments.index('value')
+        name = ' '.join(arguments[name_index:value_index]).lower()
+        value = ' '.join(arguments[value_index + 1:])
+        if name not in ('hash', 'threads'):
+            return
+        try:
+            value = int(value)
+        except ValueError:
+            # Ignored, like other engines do, rather than ending the loop.
+            return
+        self.stop()
+        if name == 'hash':
+            self.set_hash(min(max(value, 1), MAX_HASH_MB))
+        else:
+            self.set_threads(min(max(value, 1), MAX_THREADS))
+
+    @staticmethod
+    def _parse_position(arguments: List[str]) -> chess.Board:
+        if arguments[:1] == ['startpos']:
+            board = chess.Board()
+            rest = arguments[1:]
+        else:
+            moves_index = arguments.index('moves') if 'moves' in arguments \
+                else len(arguments)
+            board = chess.Board(' '.join(arguments[1:moves_index]))
+            rest = arguments[moves_index:]
+        for uci in rest[1:]:
+            board.push_uci(uci)
+        return board
+
+    @staticmethod
+    def _parse_go(arguments: List[str]) -> Dict[str, float]:
+        options = {}
+        i = 0
+        while i < len(arguments):
+            name = arguments[i]
+            if name in ('infinite', 'ponder'):
+                options[name] = True
+                i += 1
+            elif i + 1 < len(arguments):
+                try:
+                    options[name] = int(arguments[i + 1])
+                except ValueError:
+                    pass
+                i += 2
+            else:
+                i += 1
+        return options
+
+    def go(self, options: Dict[str, float]):
+        """
+        Starts searching the current position on a worker thread.
+        """
+        self.stop()
+        self._bestmove_allowed.clear()
+        self._options = options
+        self._worker = threading.Thread(target=self._search,
+                                        args=(self.board.copy(), options),
+                                        daemon=True)
+        self._worker.start()
+
+    def ponderhit(self):
+        """
+        The opponent played the move a go ponder search was started for. The
+        search goes on under the time control of the go command and sends
+        its bestmove when it ends.
+        """
+        if self._worker is None or not self._options.get('ponder'):
+            return
+        options = dict(self._options)
+        del options['ponder']
+        self._options = options
+        time_limit = get_time_limit(self.board, options)
+        self._bestmove_allowed.set()
+        if time_limit is not None:
+            threading.Thread(target=self._stop_after,
+                             args=(self._worker, time_limit),
+                             daemon=True).start()
+
+    def _stop_after(self, worker: threading.Thread, seconds: float):
+        worker.join(seconds)
+        _stop_thread(worker, self.searchers)
+
+    def stop(self):
+        """
+        Stops the running search, if any, and waits for its bestmove.
+        """
+        if self._worker is None:
+            return
+        self._bestmove_allowed.set()
+        _stop_thread(self._worker, self.searchers)
+        self._worker = None
+
+    def _print_info(self, result: SearchResult):
+        self.output('info depth {} score {} nodes {} nps {:.0f} hashfull {} '
+                    'time {:.0f} pv {}'.format(
+                        result.depth, convert_score_to_uci(result.score),
+                        result.nodes, result.nps,
+                        len(self.table) * 1000 // self.table.max_entries,
+                        result.seconds * 1000,
+                        ' '.join(move.uci() for move in result.pv)))
+
+    def _search(self, board: chess.Board, options: Dict[str, float]):
+        # A ponder search has no time limit until ponderhit.
+        time_limit = None if options.get('ponder') \
+            else get_time_limit(board, options)
+        max_depth = int(options.get('depth', 64))
+        main_searcher, helpers = self.searchers[0], self.searchers[1:]
+
+        # Helpers search the same position and fill the shared
+        # transposition table, which the main searcher reads from.
+        helper_threads = [threading.Thread(target=helper.search,
+                                           args=(board, max_depth + 1,
+                                                 time_limit),
+                                           daemon=True)
+                          for helper in helpers]
+        for thread in helper_threads:
+            thread.start()
+        result = main_searcher.search(board, max_depth, time_limit,
+                                      self._print_info)
+        for thread, helper in zip(helper_threads, helpers):
+            _stop_thread(thread, [helper])
+
+        # In infinite mode the bestmove may only be sent after stop, and
+        # while pondering after stop or ponderhit.
+        if options.get('infinite') or options.get('ponder'):
+            self._bestmove_allowed.wait()
+        if result.best_move is None:
+            self.output('bestmove 0000')
+        else:
+            self.output('bestmove {}'.format(result.best_move.uci()))
+
+
+def main():
+    """
+    Runs the UCI loop on stdin until quit.
+    """
+    from chess_engine.models.evaluator import Evaluator
+    from chess_engine.models.export import load_trained_model
+    from chess_engine.search.evaluation import MaterialEvaluator
+
+    parser = argparse.ArgumentParser(description='UCI chess engine that '
+                                                 'searches with Net '
+                                                 'evaluations.')
+    parser.add_argument('--model_path',
+                        default=None,
+                        help='state_dict of a trained Net, or a directory '
+                             'written by chess_engine.models.export. '
+                             'Defaults to an untrained Net.')
+    parser.add_argument('--backend',
+                        default='auto',
+                        help='Backend to load from an export directory: '
+                             'eager, scripted, quantized or auto for the '
+                             'fastest.')
+    parser.add_argument('--material',
+                        action='store_true',
+                        help='Evaluate with the material balance instead of '
+                             'Net.')
+    args = parser.parse_args()
+
+    if args.material:
+        make_evaluator = MaterialEvaluator
+    else:
+        model, features = load_trained_model(args.model_path, args.backend)
+
+        def make_evaluator():
+            return Evaluator(model, features=features)
+
+    engine = UciEngine(make_evaluator)
+    for line in sys.stdin:
+        if not engine.handle(line):
+            break
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+from os.path import dirname, join
+
+import pytest
+
+from chess_engine.data.generate_dataset import split_games
+
+RESOURCES_DIR = join(dirname(dirname(__file__)), 'resources')
+SOURCE_PGNS = ['three_games.pgn', 'single_game.pgn', 'rolvag-kjartansson-2018.pgn',
+               'sundararajan-ziatdinov-2018.pgn']
+N_SYNTHETIC_GAMES = 2000
+
+
+def write_synthetic_pgn(filename, n_games):
+    """
+    Writes n_games games to filename by cycling through the games in SOURCE_PGNS, in the layout of the cleaned
+    dataset.
+    """
+    games = [game for name in SOURCE_PGNS for game in split_games(join(RESOURCES_DIR, name))]
+    with open(filename, 'w') as file:
+        for i in range(n_games):
+            file.write(games[i % len(games)])
+
+
+def pytest_collection_modifyitems(config, items):
+    """
+    Leaves the benchmarks out of the test run unless they are selected with -m benchmark.
+    """
+    if 'benchmark' in config.getoption('markexpr'):
+        return
+    selected = [item for item in items if item.get_closest_marker('benchmark') is None]
+    if len(selected) < len(items):
+        config.hook.pytest_deselected(items=[item for item in items if item.get_closest_marker('benchmark')])
+        items[:] = selected
+
+
+@pytest.fixture
+def resources_dir():
+    return RESOURCES_DIR
+
+
+@pytest.fixture(scope='session')
+def synthetic_pgn(tmp_path_factory):
+    filename = str(tmp_path_factory.mktemp('pgn') / 'synthetic.pgn')
+    write_synthetic_pgn(filename, N_SYNTHETIC_GAMES)
+    return filename
@@ -0,0 +1,37 @@
+from os.path import join
+
+import chess.pgn
+import pytest
+
+from chess_engine.data.generate_dataset import create_state_result_dataset, extract_game, sample_game_state_result
+
+pytest.importorskip('pytest_benchmark')
+
+
+@pytest.mark.benchmark(group='generate_dataset')
+def test_extract_game(benchmark, resources_dir):
+    filename = join(resources_dir, 'three_games.pgn')
+
+    games = benchmark(lambda: list(extract_game(filename)))
+
+    assert len(games) == 3
+
+
+@pytest.mark.benchmark(group='generate_dataset')
+def test_sample_game_state_result(benchmark, resources_dir):
+    with open(join(resources_dir, 'rolvag-kjartansson-2018.pgn')) as file:
+        game = chess.pgn.read_game(file)
+
+    fen, result = benchmark(sample_game_state_result, game, 40)
+
+    assert result == '0-1'
+
+
+@pytest.mark.benchmark(group='create_state_result_dataset')
+@pytest.mark.parametrize('fast_parser', [False, True])
+def test_create_state_result_dataset(benchmark, synthetic_pgn, fast_parser):
+    # A single round, each one parses every game of the synthetic PGN.
+    x, y = benchmark.pedantic(create_state_result_dataset, args=(synthetic_pgn,),
+                              kwargs={'random_seed': 0, 'fast_parser': fast_parser}, rounds=1, iterations=1)
+
+    assert len(x) == len(y) > 0
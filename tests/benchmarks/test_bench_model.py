@@ -0,0 +1,47 @@
+import pytest
+import torch
+
+from chess_engine.models.export import make_probe_batch
+from chess_engine.models.model import Net
+
+pytest.importorskip('pytest_benchmark')
+
+BATCH_SIZES = [1, 64, 512]
+
+
+@pytest.mark.benchmark(group='net_forward')
+@pytest.mark.parametrize('batch_size', BATCH_SIZES)
+def test_net_forward(benchmark, batch_size):
+    torch.manual_seed(0)
+    model = Net().eval()
+    x = make_probe_batch(batch_size)
+
+    def forward():
+        with torch.inference_mode():
+            return model(x)
+
+    y = benchmark(forward)
+
+    assert y.shape == (batch_size, 1)
+
+
+@pytest.mark.benchmark(group='net_backward')
+@pytest.mark.parametrize('batch_size', BATCH_SIZES)
+def test_net_forward_backward(benchmark, batch_size):
+    torch.manual_seed(0)
+    model = Net()
+    optimizer = torch.optim.Adam(model.parameters(), lr=0.0001)
+    loss_fn = torch.nn.BCELoss()
+    x = make_probe_batch(batch_size)
+    y = torch.randint(0, 2, (batch_size, 1)).float()
+
+    def train_step():
+        loss = loss_fn(model(x), y)
+        optimizer.zero_grad()
+        loss.backward()
+        optimizer.step()
+        return loss.item()
+
+    loss = benchmark(train_step)
+
+    assert loss >= 0
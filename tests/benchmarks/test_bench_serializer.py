@@ -0,0 +1,21 @@
+import pytest
+
+from chess_engine.data.serializer import convert_fen_to_array, convert_piece_list_to_array
+
+pytest.importorskip('pytest_benchmark')
+
+MIDDLEGAME_FEN = 'r1bq1rk1/pp2bppp/2n1pn2/3p4/2PP4/2N2N2/PP2BPPP/R2QKB1R w KQ - 4 9'
+
+
+@pytest.mark.benchmark(group='serializer')
+def test_convert_fen_to_array(benchmark):
+    array = benchmark(convert_fen_to_array, MIDDLEGAME_FEN)
+
+    assert array.shape == (12, 8, 8)
+
+
+@pytest.mark.benchmark(group='serializer')
+def test_convert_piece_list_to_array(benchmark):
+    array = benchmark(convert_piece_list_to_array, [8, 9, 10, 11, 12, 13, 14, 15])
+
+    assert array.sum() == 8
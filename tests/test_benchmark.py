@@ -0,0 +1,58 @@
+import unittest
+
+import chess
+import chess.engine
+
+from chess_engine.benchmark.harness import BENCHMARK_FENS, analyse_with_engine, compare_with_engine, \
+    get_engine_command, get_random_mover_command, play_game, play_match
+from chess_engine.search.alphabeta import AlphaBetaSearcher
+from chess_engine.search.evaluation import MaterialEvaluator
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_random_mover_plays_legal_moves(self):
+        # Act
+        analyses, seconds = analyse_with_engine(get_random_mover_command(seed=0), BENCHMARK_FENS,
+                                                chess.engine.Limit(time=0.01))
+
+        # Assert
+        self.assertEqual(len(analyses), len(BENCHMARK_FENS))
+        for fen, analysis in zip(BENCHMARK_FENS, analyses):
+            self.assertIn(analysis.best_move, chess.Board(fen).legal_moves)
+            self.assertEqual(analysis.centipawns, 0)
+
+    def test_compare_with_engine(self):
+        # Arrange
+        fens = BENCHMARK_FENS[:4]
+
+        # Act
+        report = compare_with_engine(get_random_mover_command(seed=0), AlphaBetaSearcher(MaterialEvaluator()),
+                                     fens, depth=1, engine_limit=chess.engine.Limit(time=0.01))
+
+        # Assert
+        self.assertEqual(report.n_positions, 4)
+        self.assertTrue(0 <= report.agreement <= 1)
+        self.assertGreater(report.net_positions_per_sec, 0)
+        self.assertGreater(report.engine_positions_per_sec, 0)
+
+    def test_play_game_adjudicates_long_games(self):
+        # Act
+        result = play_game(get_random_mover_command(seed=1), get_random_mover_command(seed=2),
+                           time_control=(5, 0), opening='e4 e5', max_plies=12)
+
+        # Assert
+        self.assertEqual(result, '1/2-1/2')
+
+    def test_play_match_in_parallel(self):
+        # Act
+        result = play_match(get_engine_command(material=True), get_random_mover_command(), n_games=2,
+                            time_control=(2, 0.05), workers=2, max_plies=16)
+
+        # Assert
+        self.assertEqual(result.wins + result.draws + result.losses, 2)
+        self.assertTrue(0 <= result.score <= 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from os.path import join
+from unittest import mock
+
+import numpy as np
+
+from chess_engine.data import generate_dataset
+from chess_engine.data.checkpoint import CHECKPOINT_FILENAME, get_rng_state, load_checkpoint, set_rng_state
+from chess_engine.data.generate_dataset import write_state_result_dataset
+from chess_engine.data.serializer import POSITION_DTYPE
+from chess_engine.data.writer import StateResultWriter
+from chess_engine.features.registry import FEATURES_FILENAME, load_features
+
+
+def interrupt_after(n_games):
+    generate_shard_samples = generate_dataset.generate_shard_samples
+
+    def interrupted(*args, **kwargs):
+        for i, sample in enumerate(generate_shard_samples(*args, **kwargs)):
+            if i == n_games:
+                raise KeyboardInterrupt
+            yield sample
+
+    return mock.patch.object(generate_dataset, 'generate_shard_samples', interrupted)
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.filename = 'resources/three_games.pgn'
+
+    def load(self, target_dir):
+        return np.load(join(target_dir, 'x.npy')), np.load(join(target_dir, 'y.npy'))
+
+    def test_rng_state_round_trip(self):
+        # Arrange
+        rng = random.Random(3)
+        rng.random()
+        state = get_rng_state(rng)
+        expected = [rng.random() for _ in range(3)]
+
+        # Act
+        set_rng_state(rng, state)
+
+        # Assert
+        self.assertEqual([rng.random() for _ in range(3)], expected)
+
+    def test_resume_matches_uninterrupted_run(self):
+        for packed in (False, True):
+            with self.subTest(packed=packed):
+                # Arrange
+                expected_dir = join(self.tmp_dir.name, 'expected', str(packed))
+                target_dir = join(self.tmp_dir.name, 'resumed', str(packed))
+                write_state_result_dataset(self.filename, expected_dir, random_seed=4, positions_per_game=3,
+                                           packed=packed)
+                with interrupt_after(1), self.assertRaises(KeyboardInterrupt):
+                    write_state_result_dataset(self.filename, target_dir, random_seed=4, positions_per_game=3,
+                                               chunk_size=1, packed=packed, checkpoint_every=1)
+                checkpoint, = load_checkpoint(target_dir).values()
+
+                # Act
+                n_samples = write_state_result_dataset(self.filename, target_dir, random_seed=4,
+                                                       positions_per_game=3, packed=packed, checkpoint_every=1,
+                                                       resume=True)
+
+                # Assert
+                self.assertEqual((checkpoint['n_games'], checkpoint['n_samples'], checkpoint['done']), (1, 3, False))
+                self.assertEqual(n_samples, 6)
+                self.assertEqual(load_features(target_dir), load_features(expected_dir))
+                for name in os.listdir(expected_dir):
+                    if not name.endswith('.npy'):
+                        continue
+                    self.assertTrue(np.array_equal(np.load(join(target_dir, name)),
+                                                   np.load(join(expected_dir, name))))
+
+    def test_resume_drops_samples_after_checkpoint(self):
+        # Arrange
+        expected_dir = join(self.tmp_dir.name, 'expected')
+        target_dir = join(self.tmp_dir.name, 'resumed')
+        write_state_result_dataset(self.filename, expected_dir, random_seed=4, positions_per_game=2)
+        with interrupt_after(1), self.assertRaises(KeyboardInterrupt):
+            write_state_result_dataset(self.filename, target_dir, random_seed=4, positions_per_game=2,
+                                       checkpoint_every=1)
+        with StateResultWriter(target_dir, mode='a') as writer:  # written after the checkpoint
+            writer.append(np.zeros(5, POSITION_DTYPE), 0)
+
+        # Act
+        n_samples = write_state_result_dataset(self.filename, target_dir, random_seed=4, positions_per_game=2,
+                                               checkpoint_every=1, resume=True)
+        x, y = self.load(target_dir)
+
+        # Assert
+        expected_x, expected_y = self.load(expected_dir)
+        self.assertEqual(n_samples, 4)
+        self.assertTrue(np.array_equal(x, expected_x))
+        self.assertTrue(np.array_equal(y, expected_y))
+
+    def test_append_interrupted_before_first_checkpoint(self):
+        # Arrange
+        new_filename = join(self.tmp_dir.name, 'new_games.pgn')
+        shutil.copy(self.filename, new_filename)
+        target_dir = join(self.tmp_dir.name, 'dataset')
+        write_state_result_dataset(self.filename, target_dir, random_seed=6, positions_per_game=2, chunk_size=1,
+                                   append=True)
+        first_x, first_y = self.load(target_dir)
+        with interrupt_after(1), self.assertRaises(KeyboardInterrupt):
+            write_state_result_dataset(new_filename, target_dir, random_seed=6, positions_per_game=2, chunk_size=1,
+                                       append=True)
+
+        # Act
+        n_samples = write_state_result_dataset(new_filename, target_dir, random_seed=6, positions_per_game=2,
+                                               chunk_size=1, append=True)
+        x, y = self.load(target_dir)
+
+        # Assert
+        self.assertEqual(n_samples, 8)
+        self.assertTrue(np.array_equal(x, np.concatenate([first_x, first_x])))
+        self.assertTrue(np.array_equal(y, np.concatenate([first_y, first_y])))
+
+    def test_append_processes_only_new_sources(self):
+        for workers in (1, 2):
+            with self.subTest(workers=workers):
+                # Arrange
+                target_dir = join(self.tmp_dir.name, str(workers))
+                new_filename = join(self.tmp_dir.name, 'new_games.pgn')
+                shutil.copy(self.filename, new_filename)
+                write_state_result_dataset(self.filename, target_dir, workers=workers, random_seed=6,
+                                           positions_per_game=2, append=True)
+                first_x, first_y = self.load(target_dir)
+
+                # Act
+                write_state_result_dataset(new_filename, target_dir, workers=workers, random_seed=6,
+                                           positions_per_game=2, append=True)
+                n_samples = write_state_result_dataset(self.filename, target_dir, workers=workers, random_seed=6,
+                                                       positions_per_game=2, append=True)
+                x, y = self.load(target_dir)
+
+                # Assert
+                self.assertEqual(n_samples, 8)
+                self.assertTrue(np.array_equal(x, np.concatenate([first_x, first_x])))
+                self.assertTrue(np.array_equal(y, np.concatenate([first_y, first_y])))
+                self.assertEqual(sorted(os.listdir(target_dir)), [CHECKPOINT_FILENAME, FEATURES_FILENAME, 'x.npy', 'y.npy'])
+                self.assertTrue(all(progress['done'] for progress in load_checkpoint(target_dir).values()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import tempfile
+import unittest
+
+import numpy as np
+import torch
+
+from chess_engine.data.generate_dataset import create_state_result_dataset, write_state_result_dataset
+from chess_engine.models.dataset import PackedStateResultDataset, StateResultDataset, make_data_loader, \
+    split_dataset
+
+
+class TestDataset(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        filename = 'resources/three_games.pgn'
+        write_state_result_dataset(filename, cls.tmp_dir.name, random_seed=2, positions_per_game=5)
+        write_state_result_dataset(filename, cls.tmp_dir.name, random_seed=2, positions_per_game=5, packed=True)
+        cls.x, cls.y = create_state_result_dataset(filename, random_seed=2, positions_per_game=5)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp_dir.cleanup()
+
+    def test_state_result_dataset_single_item(self):
+        # Arrange
+        dataset = StateResultDataset(self.tmp_dir.name)
+
+        # Act
+        x, y = dataset[7]
+
+        # Assert
+        self.assertEqual(len(dataset), 10)
+        self.assertEqual(x.dtype, torch.float32)
+        self.assertTrue(np.array_equal(x.numpy(), self.x[7]))
+        self.assertEqual(y.tolist(), [1.0])
+
+    def test_make_data_loader_covers_dataset(self):
+        for dataset_class in (StateResultDataset, PackedStateResultDataset):
+            for num_workers in (0, 1):
+                with self.subTest(dataset_class=dataset_class, num_workers=num_workers):
+                    # Arrange
+                    dataset = dataset_class(self.tmp_dir.name)
+                    loader = make_data_loader(dataset, batch_size=4, num_workers=num_workers)
+
+                    # Act
+                    batches = list(loader)
+
+                    # Assert
+                    self.assertEqual([tuple(x.shape) for x, _ in batches],
+                                     [(4, 12, 8, 8), (4, 12, 8, 8), (2, 12, 8, 8)])
+                    self.assertEqual([tuple(y.shape) for _, y in batches], [(4, 1), (4, 1), (2, 1)])
+                    self.assertEqual(sum(y.sum().item() for _, y in batches), 5.0)
+
+    def test_split_dataset(self):
+        # Arrange
+        dataset = StateResultDataset(self.tmp_dir.name)
+
+        # Act
+        train_set, validation_set = split_dataset(dataset, validation_fraction=0.3)
+        x, y = next(iter(make_data_loader(validation_set, batch_size=10, shuffle=False)))
+
+        # Assert
+        self.assertEqual(len(train_set), 7)
+        self.assertEqual(len(validation_set), 3)
+        self.assertTrue(np.array_equal(x.numpy(), self.x[7:]))
+        self.assertTrue(np.array_equal(y[:, 0].numpy(), self.y[7:]))
+
+
+if __name__ == '__main__':
+    unittest.main()
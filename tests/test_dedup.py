@@ -0,0 +1,131 @@
+import tempfile
+import unittest
+from os.path import join
+
+import chess
+import chess.polyglot
+import numpy as np
+
+from chess_engine.data.dedup import BloomFilter, aggregate_duplicates, find_first_occurrences, \
+    zobrist_hash_positions
+from chess_engine.data.generate_dataset import create_state_result_dataset, write_state_result_dataset
+from chess_engine.data.profiling import PipelineStats
+from chess_engine.data.serializer import POSITION_DTYPE, convert_board_to_position
+
+
+class TestDedup(unittest.TestCase):
+
+    def test_zobrist_hash_matches_polyglot(self):
+        # Arrange
+        boards = [chess.Board(),
+                  chess.Board('r3k2r/8/8/8/8/8/8/R3K2R b Kq - 0 1'),
+                  chess.Board('rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3')]
+        positions = np.array([convert_board_to_position(board) for board in boards], dtype=POSITION_DTYPE)
+
+        # Act
+        hashes = zobrist_hash_positions(positions)
+
+        # Assert
+        self.assertEqual(hashes.tolist(), [chess.polyglot.zobrist_hash(board) for board in boards])
+
+    def test_bloom_filter(self):
+        # Arrange
+        rng = np.random.default_rng(0)
+        added = rng.integers(0, 2 ** 63, 10000, dtype=np.uint64)
+        other = rng.integers(0, 2 ** 63, 10000, dtype=np.uint64)
+        bloom_filter = BloomFilter(capacity=10000, error_rate=0.01)
+
+        # Act
+        bloom_filter.add(added)
+
+        # Assert
+        self.assertTrue(bloom_filter.contains(added).all())
+        self.assertLess(bloom_filter.contains(other).mean(), 0.02)
+
+    def test_find_first_occurrences(self):
+        # Arrange
+        hashes = np.array([5, 3, 5, 7, 3, 9, 7], dtype=np.uint64)
+        bloom_filter = BloomFilter(capacity=100)
+
+        # Act
+        keep = find_first_occurrences(hashes, bloom_filter, chunk_size=3)
+        keep_again = find_first_occurrences(hashes, bloom_filter)
+
+        # Assert
+        self.assertEqual(keep.tolist(), [True, True, False, True, False, True, False])
+        self.assertFalse(keep_again.any())
+
+    def test_aggregate_duplicates(self):
+        # Arrange
+        hashes = np.array([5, 3, 5, 7, 3, 5], dtype=np.uint64)
+        y = np.array([1, 0, 0, 1, 0, 1])
+
+        # Act
+        first_indices, wins, counts = aggregate_duplicates(hashes, y)
+
+        # Assert
+        self.assertEqual(first_indices.tolist(), [0, 1, 3])
+        self.assertEqual(wins.tolist(), [2, 0, 1])
+        self.assertEqual(counts.tolist(), [3, 2, 1])
+
+    def test_create_state_result_dataset_dedup(self):
+        # Arrange
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        filename = join(tmp_dir.name, 'repeated_games.pgn')
+        with open('resources/three_games.pgn', 'rb') as file:
+            pgn = file.read()
+        with open(filename, 'wb') as file:
+            file.write(pgn * 2)
+        all_x, _ = create_state_result_dataset(filename, positions_per_game=0)
+
+        for dedup in ('drop', 'aggregate'):
+            for workers in (1, 2):
+                with self.subTest(dedup=dedup, workers=workers):
+                    # Act
+                    x, y = create_state_result_dataset('resources/three_games.pgn', positions_per_game=0,
+                                                       dedup=dedup)
+                    actual_x, actual_y = create_state_result_dataset(filename, positions_per_game=0,
+                                                                     workers=workers, dedup=dedup)
+
+                    # Assert
+                    self.assertLessEqual(len(x), len(all_x) // 2)
+                    self.assertTrue(np.array_equal(actual_x, x))
+                    self.assertTrue(np.array_equal(actual_y, y))
+
+    def test_write_state_result_dataset_dedup(self):
+        # Arrange
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        filename = join(tmp_dir.name, 'repeated_games.pgn')
+        with open('resources/three_games.pgn', 'rb') as file:
+            pgn = file.read()
+        with open(filename, 'wb') as file:
+            file.write(pgn * 2)
+        x, y = create_state_result_dataset('resources/three_games.pgn', positions_per_game=0, dedup='drop')
+        all_x, _ = create_state_result_dataset(filename, positions_per_game=0)
+
+        for workers in (1, 2):
+            with self.subTest(workers=workers):
+                stats = PipelineStats()
+                target_dir = join(tmp_dir.name, str(workers))
+
+                # Act
+                n_samples = write_state_result_dataset(filename, target_dir, workers=workers, chunk_size=16,
+                                                       positions_per_game=0, dedup='drop', bloom_capacity=1000,
+                                                       stats=stats)
+
+                # Assert
+                self.assertEqual(n_samples, len(x))
+                self.assertTrue(np.array_equal(np.load(join(target_dir, 'x.npy')), x))
+                self.assertTrue(np.array_equal(np.load(join(target_dir, 'y.npy')), y))
+                self.assertEqual(stats.counters['duplicates_skipped'], len(all_x) - len(x))
+
+    def test_write_state_result_dataset_dedup_checkpoint(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with self.assertRaises(ValueError):
+                write_state_result_dataset('resources/three_games.pgn', tmp_dir, checkpoint_every=1, dedup='drop')
+
+
+if __name__ == '__main__':
+    unittest.main()
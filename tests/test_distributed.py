@@ -0,0 +1,65 @@
+import os
+import tempfile
+import unittest
+
+import torch
+
+from chess_engine.data.generate_dataset import write_state_result_dataset
+from chess_engine.models.dataset import StateResultDataset, shard_dataset
+from chess_engine.models.distributed import benchmark_scaling, spawn_training
+from chess_engine.models.model import Net, get_argument_parser, load_training_checkpoint
+
+
+class TestDistributed(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        cls.features_dir = os.path.join(cls.tmp_dir.name, 'features')
+        write_state_result_dataset('resources/three_games.pgn', cls.features_dir, random_seed=2,
+                                   positions_per_game=5)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp_dir.cleanup()
+
+    def test_shard_dataset(self):
+        # Arrange
+        dataset = StateResultDataset(self.features_dir)
+
+        # Act
+        shards = [shard_dataset(dataset, rank, 3) for rank in range(3)]
+
+        # Assert
+        self.assertEqual([list(shard.indices) for shard in shards], [[0, 1, 2], [3, 4, 5], [6, 7, 8]])
+
+    def test_spawn_training_saves_checkpoint_from_rank_0(self):
+        with tempfile.TemporaryDirectory() as checkpoint_dir:
+            # Arrange
+            args = get_argument_parser().parse_args([
+                '--features_dir', self.features_dir, '--batch_size', '2', '--n_epochs', '2',
+                '--checkpoint_dir', checkpoint_dir, '--log_dir', os.path.join(checkpoint_dir, 'runs')])
+            args.threads_per_process = 1
+
+            # Act
+            spawn_training(args, world_size=2)
+            model = Net()
+            checkpoint = load_training_checkpoint(checkpoint_dir, model,
+                                                  torch.optim.Adam(model.parameters()))
+
+        # Assert
+        # 9 training samples, 4 per rank, in 2 batches of 2 per epoch.
+        self.assertEqual(checkpoint, {'epoch': 2, 'step': 4})
+
+    def test_benchmark_scaling(self):
+        # Act
+        samples_per_sec = benchmark_scaling(self.features_dir, world_sizes=(1, 2), batch_size=2, n_batches=2,
+                                            threads_per_process=1)
+
+        # Assert
+        self.assertEqual(list(samples_per_sec), [1, 2])
+        self.assertTrue(all(value > 0 for value in samples_per_sec.values()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+
+import chess
+import numpy as np
+import torch
+
+from chess_engine.data.serializer import convert_fen_to_array
+from chess_engine.models.evaluator import Evaluator
+from chess_engine.models.model import Net
+
+
+class TestEvaluator(unittest.TestCase):
+
+    def setUp(self):
+        torch.manual_seed(0)
+        self.model = Net()
+        board = chess.Board()
+        self.fens = []
+        for move in ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5']:
+            board.push_san(move)
+            self.fens.append(board.fen())
+
+    def forward(self, fens):
+        x = torch.from_numpy(np.stack([convert_fen_to_array(fen) for fen in fens])).float()
+        with torch.no_grad():
+            return self.model(x)[:, 0].numpy()
+
+    def test_evaluate_many_matches_model(self):
+        # Arrange
+        evaluator = Evaluator(self.model, batch_size=2)
+
+        # Act
+        values = evaluator.evaluate_many([chess.Board(fen) for fen in self.fens])
+
+        # Assert
+        self.assertEqual(values.shape, (5,))
+        np.testing.assert_allclose(values, self.forward(self.fens), rtol=1e-6)
+
+    def test_repeated_positions_hit_cache(self):
+        # Arrange
+        evaluator = Evaluator(self.model)
+
+        # Act
+        first = evaluator.evaluate_many(self.fens[:3] + self.fens[:1])
+        second = evaluator.evaluate_many(self.fens)
+
+        # Assert
+        self.assertEqual((evaluator.hits, evaluator.misses), (1 + 3, 3 + 2))
+        self.assertEqual(evaluator.cache_len, 5)
+        np.testing.assert_array_equal(second[:3], first[:3])
+        self.assertEqual(first[3], first[0])
+
+    def test_lru_eviction(self):
+        # Arrange
+        evaluator = Evaluator(self.model, cache_size=2)
+
+        # Act
+        evaluator.evaluate(self.fens[0])
+        evaluator.evaluate(self.fens[1])
+        evaluator.evaluate(self.fens[0])  # fens[1] is now the least recently used
+        evaluator.evaluate(self.fens[2])
+        evaluator.evaluate(self.fens[0])
+        evaluator.evaluate(self.fens[1])
+
+        # Assert
+        self.assertEqual((evaluator.hits, evaluator.misses), (2, 4))
+
+    def test_cache_disabled(self):
+        # Arrange
+        evaluator = Evaluator(self.model, cache_size=0)
+
+        # Act
+        value = evaluator.evaluate(self.fens[0])
+        evaluator.evaluate(self.fens[0])
+
+        # Assert
+        self.assertEqual((evaluator.hits, evaluator.misses, evaluator.cache_len), (0, 2, 0))
+        self.assertAlmostEqual(value, float(self.forward(self.fens[:1])[0]), places=6)
+
+
+if __name__ == '__main__':
+    unittest.main()
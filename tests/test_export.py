@@ -0,0 +1,76 @@
+import tempfile
+import unittest
+
+import numpy as np
+import torch
+
+from chess_engine.models.evaluator import Evaluator
+from chess_engine.models.export import BACKENDS, EAGER, QUANTIZED, SCRIPTED, TOLERANCES, benchmark_backends, \
+    export_model, get_available_backends, load_inference_model, load_model, make_probe_batch
+from chess_engine.models.model import Net
+
+
+class TestExport(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        torch.manual_seed(0)
+        cls.model = Net()
+        # Keep the final ReLU from zeroing every output of the untrained net.
+        with torch.no_grad():
+            cls.model.fc3.bias.fill_(0.5)
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        export_model(cls.model, cls.tmp_dir.name)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp_dir.cleanup()
+
+    def test_backends_stay_within_tolerance(self):
+        # Arrange
+        models = {backend: load_model(self.tmp_dir.name, backend) for backend in BACKENDS}
+
+        # Act
+        results = benchmark_backends(models, batch_size=32, n_repeats=2)
+
+        # Assert
+        self.assertEqual(get_available_backends(self.tmp_dir.name), BACKENDS)
+        for backend, result in results.items():
+            self.assertTrue(result.within_tolerance, backend)
+            self.assertGreater(result.samples_per_sec, 0)
+            self.assertGreater(result.latency_ms, 0)
+        self.assertEqual(results[QUANTIZED].tolerance, TOLERANCES[QUANTIZED])
+        self.assertGreater(results[QUANTIZED].max_error, 0)
+
+    def test_load_inference_model(self):
+        # Arrange
+        x = make_probe_batch(8)
+        with torch.no_grad():
+            expected = self.model(x)
+
+        # Act
+        auto_model, backend = load_inference_model(self.tmp_dir.name)
+        scripted_model, scripted_backend = load_inference_model(self.tmp_dir.name, SCRIPTED)
+
+        # Assert
+        self.assertIn(backend, BACKENDS)
+        self.assertEqual(scripted_backend, SCRIPTED)
+        with torch.no_grad():
+            self.assertTrue(torch.allclose(scripted_model(x), expected, atol=TOLERANCES[SCRIPTED]))
+            self.assertTrue(torch.allclose(auto_model(x), expected, atol=TOLERANCES[QUANTIZED]))
+
+    def test_evaluator_runs_quantized_model(self):
+        # Arrange
+        fens = ['rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1',
+                'r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3']
+
+        # Act
+        eager_values = Evaluator(load_model(self.tmp_dir.name, EAGER)).evaluate_many(fens)
+        quantized_values = Evaluator(load_model(self.tmp_dir.name, QUANTIZED)).evaluate_many(fens)
+
+        # Assert
+        self.assertTrue(np.allclose(quantized_values, eager_values, atol=TOLERANCES[QUANTIZED]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,192 @@
+import random
+import tempfile
+import unittest
+
+import chess
+import chess.polyglot
+import numpy as np
+
+from chess_engine.data.generate_dataset import create_state_result_dataset, write_state_result_dataset
+from chess_engine.data.packed import PACKED_SAMPLE_DTYPE, load_packed_dataset
+from chess_engine.data.serializer import POSITION_DTYPE, convert_board_to_bitboards, convert_board_to_position
+from chess_engine.features.attacks import compute_attack_bitboards
+from chess_engine.features.registry import FEATURES, count_planes, encode_positions, extract_planes, \
+    load_features, register_feature
+from chess_engine.models.dataset import PackedStateResultDataset, StateResultDataset
+from chess_engine.models.evaluator import Evaluator
+from chess_engine.models.model import Net
+
+ALL_FEATURES = ('pieces', 'side_to_move', 'castling', 'en_passant', 'attacks', 'repetition', 'halfmove_clock')
+
+
+def make_positions(boards):
+    return np.array([convert_board_to_position(board) for board in boards], dtype=POSITION_DTYPE)
+
+
+class TestFeatures(unittest.TestCase):
+
+    def test_attack_maps_match_python_chess(self):
+        # Arrange
+        rng = random.Random(0)
+        boards = []
+        for _ in range(50):
+            board = chess.Board()
+            for _ in range(rng.randrange(80)):
+                moves = list(board.legal_moves)
+                if not moves:
+                    break
+                board.push(rng.choice(moves))
+            boards.append(board)
+
+        # Act
+        attacks = compute_attack_bitboards(np.stack([convert_board_to_bitboards(board) for board in boards]))
+
+        # Assert
+        for board, board_attacks in zip(boards, attacks):
+            for i, color in enumerate((chess.WHITE, chess.BLACK)):
+                expected = 0
+                for square in chess.SquareSet(board.occupied_co[color]):
+                    expected |= int(board.attacks_mask(square))
+                self.assertEqual(int(board_attacks[i]), expected)
+
+    def test_extract_planes(self):
+        # Arrange
+        board = chess.Board()
+        for san in ('e4', 'Nf6', 'Nf3', 'Ng8', 'Ng1', 'Nf6', 'e5', 'd5'):
+            board.push_san(san)
+        positions = make_positions([board])
+        planes = {}
+        offset = 0
+
+        # Act
+        bitboards = extract_planes(positions, ALL_FEATURES)
+        for name in ALL_FEATURES:
+            planes[name] = [int(plane) for plane in bitboards[0, offset:offset + FEATURES[name].n_planes]]
+            offset += FEATURES[name].n_planes
+
+        # Assert
+        full = 2 ** 64 - 1
+        self.assertEqual(bitboards.shape, (1, count_planes(ALL_FEATURES)))
+        self.assertEqual(planes['pieces'], convert_board_to_bitboards(board).tolist())
+        self.assertEqual(planes['side_to_move'], [full])
+        self.assertEqual(planes['castling'], [full] * 4)
+        self.assertEqual(planes['en_passant'], [chess.BB_D6])
+        self.assertEqual(planes['repetition'], [0, 0])
+        self.assertEqual(planes['halfmove_clock'], [0] * 7)
+
+    def test_extract_repetition_and_halfmove_clock(self):
+        # Arrange
+        board = chess.Board()
+        boards = []
+        for halfmove_num, san in enumerate(('Nf3', 'Nf6', 'Ng1', 'Ng8') * 2, start=1):
+            board.push_san(san)
+            if halfmove_num % 4 == 0:
+                boards.append(board.copy())
+
+        # Act
+        planes = extract_planes(make_positions(boards), ('repetition', 'halfmove_clock'))
+
+        # Assert
+        full = 2 ** 64 - 1
+        # The start position after Ng8 the second time, and again after Ng8 the third time.
+        self.assertEqual(planes[:, :2].tolist(), [[full, 0], [full, full]])
+        # Halfmove clocks 4 = 0b100 and 8 = 0b1000.
+        self.assertEqual(planes[0, 2:].tolist(), [0, 0, full, 0, 0, 0, 0])
+        self.assertEqual(planes[1, 2:].tolist(), [0, 0, 0, full, 0, 0, 0])
+
+    def test_registry(self):
+        # Act / Assert
+        with self.assertRaises(ValueError):
+            count_planes(['pieces', 'no_such_feature'])
+        with self.assertRaises(ValueError):
+            register_feature('pieces', 12)(lambda positions: positions['bitboards'])
+        self.assertEqual(encode_positions(make_positions([chess.Board()]), ALL_FEATURES).shape,
+                         (1, count_planes(ALL_FEATURES), 8, 8))
+
+    def test_datasets_record_and_precompute_features(self):
+        # Arrange
+        filename = 'resources/three_games.pgn'
+        expected_x, expected_y = create_state_result_dataset(filename, random_seed=3, positions_per_game=4,
+                                                             features=ALL_FEATURES)
+
+        with tempfile.TemporaryDirectory() as target_dir, tempfile.TemporaryDirectory() as packed_dir:
+            # Act
+            write_state_result_dataset(filename, target_dir, random_seed=3, positions_per_game=4,
+                                       features=ALL_FEATURES)
+            write_state_result_dataset(filename, packed_dir, random_seed=3, positions_per_game=4, packed=True,
+                                       features=ALL_FEATURES)
+            dataset = StateResultDataset(target_dir)
+            packed_dataset = PackedStateResultDataset(packed_dir)
+            x, y = dataset[list(range(len(dataset)))]
+            packed_x, packed_y = packed_dataset[list(range(len(packed_dataset)))]
+
+            # Assert
+            self.assertEqual(load_features(target_dir), ALL_FEATURES)
+            self.assertEqual(load_features(packed_dir), ALL_FEATURES)
+            self.assertEqual(dataset.n_planes, count_planes(ALL_FEATURES))
+            self.assertTrue(np.array_equal(x.numpy(), expected_x))
+            self.assertTrue(np.array_equal(packed_x.numpy(), expected_x))
+            self.assertTrue(np.array_equal(packed_y.numpy()[:, 0], expected_y))
+            self.assertNotEqual(load_packed_dataset(packed_dir).dtype, PACKED_SAMPLE_DTYPE)
+            with self.assertRaises(ValueError):
+                write_state_result_dataset(filename, target_dir, positions_per_game=4, append=True)
+
+    def test_evaluator_encodes_features(self):
+        # Arrange
+        model = Net(in_channels=count_planes(ALL_FEATURES))
+        evaluator = Evaluator(model, features=ALL_FEATURES)
+
+        # Act
+        values = evaluator.evaluate_many([chess.Board(), chess.STARTING_FEN.replace(' w ', ' b ')])
+
+        # Assert
+        self.assertEqual(values.shape, (2,))
+
+    def test_evaluator_cache_key_holds_history(self):
+        # Arrange
+        board = chess.Board()
+        for san in ('Nf3', 'Nf6', 'Ng1', 'Ng8'):
+            board.push_san(san)
+        fresh_board = chess.Board()
+        evaluators = {features: Evaluator(Net(in_channels=count_planes(features)), features=features)
+                      for features in (('pieces',), ('pieces', 'repetition'), ('pieces', 'halfmove_clock'))}
+
+        for features, evaluator in evaluators.items():
+            with self.subTest(features=features):
+                # Act
+                evaluator.evaluate_many([fresh_board, board])
+
+                # Assert
+                self.assertEqual(evaluator.hits, 1 if features == ('pieces',) else 0)
+
+    def test_evaluator_cache_key_holds_ep_square(self):
+        # Arrange
+        board = chess.Board()
+        board.push_san('e4')
+        fen_board = chess.Board('rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1')
+        features = ('pieces', 'en_passant')
+        evaluator = Evaluator(Net(in_channels=count_planes(features)), features=features)
+
+        # Act
+        evaluator.evaluate_many([board, fen_board])
+
+        # Assert
+        self.assertEqual(chess.polyglot.zobrist_hash(board), chess.polyglot.zobrist_hash(fen_board))
+        self.assertEqual((evaluator.hits, evaluator.misses), (0, 2))
+
+    def test_convert_board_to_position_skips_repetitions(self):
+        # Arrange
+        board = chess.Board()
+        for san in ('Nf3', 'Nf6', 'Ng1', 'Ng8'):
+            board.push_san(san)
+
+        # Act
+        position = convert_board_to_position(board, repetitions=False)
+
+        # Assert
+        self.assertEqual(position[-1], 0)
+        self.assertEqual(convert_board_to_position(board)[-1], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
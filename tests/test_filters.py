@@ -0,0 +1,110 @@
+import random
+import unittest
+from unittest import mock
+
+from chess_engine.data import generate_dataset
+from chess_engine.data.filters import HeaderCondition, matches_header_filter, parse_header_filter, read_pgn_headers
+from chess_engine.data.generate_dataset import create_state_result_dataset, generate_shard_samples
+from chess_engine.data.profiling import PipelineStats
+
+HEADERS = {'Date': '2018.12.30', 'Result': '0-1', 'WhiteElo': '2379', 'BlackElo': '2638', 'ECO': 'A09'}
+
+
+class TestFilters(unittest.TestCase):
+
+    def test_parse_header_filter(self):
+        # Act
+        actual = parse_header_filter('Elo>=2600, Year>2010 and ECO=B90 AND Result!=1/2-1/2')
+
+        # Assert
+        expected = [HeaderCondition('Elo', '>=', 2600), HeaderCondition('Year', '>', 2010),
+                    HeaderCondition('ECO', '=', 'B90'), HeaderCondition('Result', '!=', '1/2-1/2')]
+        self.assertEqual(actual, expected)
+
+    def test_parse_header_filter_invalid(self):
+        for expression in ['Elo', 'Elo>=', 'Elo=>2600', 'Year>=2010.01.01']:
+            with self.subTest(expression=expression), self.assertRaises(ValueError):
+                parse_header_filter(expression)
+
+    def test_matches_header_filter(self):
+        cases = [('Elo>=2379', True),
+                 ('Elo>2379', False),
+                 ('BlackElo>=2600, Year>=2018', True),
+                 ('Year>=2019', False),
+                 ('Date>=2018.06.01', True),
+                 ('ECO<A10 and Result=0-1', True),
+                 ('Result==1-0', False),
+                 ('Round>=1', False)]
+        for expression, expected in cases:
+            with self.subTest(expression=expression):
+                # Act
+                actual = matches_header_filter(HEADERS, parse_header_filter(expression))
+
+                # Assert
+                self.assertEqual(actual, expected)
+
+    def test_matches_header_filter_unknown_elo(self):
+        # Arrange
+        headers = dict(HEADERS, WhiteElo='')
+
+        # Act
+        actual = matches_header_filter(headers, parse_header_filter('Elo>=0'))
+
+        # Assert
+        self.assertFalse(actual)
+
+    def test_read_pgn_headers(self):
+        # Arrange
+        with open('resources/single_game.pgn') as file:
+            pgn = file.read()
+
+        # Act
+        headers = read_pgn_headers(pgn)
+
+        # Assert
+        self.assertEqual(headers['Result'], '0-1')
+        self.assertEqual(headers['WhiteElo'], '2520')
+        self.assertEqual(len(headers), 11)
+
+    def test_generate_shard_samples_filter(self):
+        for fast_parser in [False, True]:
+            with self.subTest(fast_parser=fast_parser):
+                # Arrange
+                stats = PipelineStats()
+
+                # Act
+                samples = list(generate_shard_samples('resources/three_games.pgn', rng=random.Random(0),
+                                                      fast_parser=fast_parser, header_filter='Elo>=2300',
+                                                      stats=stats))
+
+                # Assert
+                self.assertEqual([game_result_int for _, game_result_int, _ in samples], [0])
+                self.assertEqual(stats.counters['filtered_skipped'], 1)
+                self.assertEqual(stats.counters['draws_skipped'], 1)
+
+    def test_filtered_games_are_not_parsed(self):
+        # Arrange
+        read_game = mock.Mock(side_effect=generate_dataset.chess.pgn.read_game)
+
+        # Act
+        with mock.patch.object(generate_dataset.chess.pgn, 'read_game', read_game):
+            x, y = create_state_result_dataset('resources/three_games.pgn', random_seed=0,
+                                               header_filter='Year>=2019')
+
+        # Assert
+        self.assertEqual(len(x), 0)
+        read_game.assert_not_called()
+
+    def test_create_state_result_dataset_filter(self):
+        # Act
+        x_all, y_all = create_state_result_dataset('resources/three_games.pgn', random_seed=0, positions_per_game=0)
+        x, y = create_state_result_dataset('resources/three_games.pgn', random_seed=0, positions_per_game=0,
+                                           header_filter='ECO=A07')
+
+        # Assert
+        self.assertEqual(set(y.tolist()), {1})
+        self.assertLess(len(x), len(x_all))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,10 +1,13 @@
+import random
 import unittest
 
 import chess
 import chess.pgn
 
 from chess_engine.data.exceptions import InvalidHalfMoveError
-from chess_engine.data.generate_dataset import get_last_halfmove_number, sample_game_state_result, extract_game
+from chess_engine.data.generate_dataset import get_last_halfmove_number, sample_game_state_result, extract_game, \
+    sample_game_board_result, find_shard_offsets, create_state_result_dataset, sample_game_positions
+from chess_engine.data.serializer import convert_board_to_bitboards
 
 
 class TestGenerateDataset(unittest.TestCase):
@@ -89,6 +92,20 @@ class TestGenerateDataset(unittest.TestCase):
         self.assertEqual(actual_fen, expected_fen)
         self.assertEqual(actual_result, expected_result)
 
+    def test_sample_game_board_result(self):
+        # Arrange
+        pgn = open("resources/sundararajan-ziatdinov-2018.pgn")
+        game = chess.pgn.read_game(pgn)
+
+        # Act
+        actual_board, actual_result = sample_game_board_result(game, 8)
+
+        # Assert
+        expected_fen = 'r1bqk2r/ppppbppp/2n2n2/4p3/2P5/P1N1P3/1P1P1PPP/R1BQKBNR w KQkq - 1 5'
+        self.assertIsInstance(actual_board, chess.Board)
+        self.assertEqual(actual_board.fen(), expected_fen)
+        self.assertEqual(actual_result, '1/2-1/2')
+
     def test_sample_game_state_result_raises_exception(self):
         # Arrange
         pgn = open("resources/sundararajan-ziatdinov-2018.pgn")
@@ -98,6 +115,49 @@ class TestGenerateDataset(unittest.TestCase):
         self.assertRaises(InvalidHalfMoveError, sample_game_state_result, game, -1)
         self.assertRaises(InvalidHalfMoveError, sample_game_state_result, game, 92)
 
+    def test_sample_game_positions_all(self):
+        # Arrange
+        pgn = open("resources/sundararajan-ziatdinov-2018.pgn")
+        game = chess.pgn.read_game(pgn)
+        boards = [node.board() for node in game.mainline()]
+
+        # Act
+        actual = sample_game_positions(game, positions_per_game=0)
+
+        # Assert
+        expected = [convert_board_to_bitboards(board).tolist() for board in boards[:-1]]
+        self.assertEqual(actual.shape, (90,))
+        self.assertEqual(actual['bitboards'].tolist(), expected)
+        self.assertEqual(actual['state'][0], 0b11110)  # black to move, all castling rights
+        self.assertEqual(actual['ep_square'][0], chess.C3)  # after 1. c4
+
+    def test_sample_game_positions_k(self):
+        # Arrange
+        pgn = open("resources/sundararajan-ziatdinov-2018.pgn")
+        game = chess.pgn.read_game(pgn)
+        all_positions = sample_game_positions(game, positions_per_game=0)['bitboards'].tolist()
+
+        # Act
+        actual = sample_game_positions(game, positions_per_game=5, rng=random.Random(3))['bitboards'].tolist()
+
+        # Assert
+        self.assertEqual(len(actual), 5)
+        indices = [all_positions.index(position) for position in actual]
+        self.assertEqual(indices, sorted(set(indices)))
+
+    def test_create_state_result_dataset_positions_per_game(self):
+        # Arrange
+        filename = 'resources/three_games.pgn'
+
+        # Act
+        x, y = create_state_result_dataset(filename, positions_per_game=4)
+        x_max_n, y_max_n = create_state_result_dataset(filename, positions_per_game=4, max_n=1, workers=2)
+
+        # Assert
+        self.assertEqual(x.shape, (8, 12, 8, 8))
+        self.assertEqual(list(y), [0] * 4 + [1] * 4)
+        self.assertEqual(list(y_max_n), [0] * 4)
+
     def test_extract_game_three_games(self):
         # Arrange
         filename = 'resources/three_games.pgn'
@@ -133,6 +193,49 @@ class TestGenerateDataset(unittest.TestCase):
         expected = []
         self.assertEqual(actual, expected)
 
+    def test_find_shard_offsets_aligned_to_games(self):
+        # Arrange
+        filename = 'resources/three_games.pgn'
+        all_games = [game.headers['White'] for game in extract_game(filename)]
+
+        # Act
+        offsets = find_shard_offsets(filename, 3)
+        sharded_games = []
+        for start, end in zip(offsets[:-1], offsets[1:]):
+            sharded_games += [game.headers['White'] for game in extract_game(filename, start, end)]
+
+        # Assert
+        self.assertEqual(len(offsets), 4)
+        self.assertEqual(offsets, sorted(offsets))
+        self.assertEqual(sharded_games, all_games)
+
+    def test_find_shard_offsets_more_shards_than_games(self):
+        # Arrange
+        filename = 'resources/single_game.pgn'
+
+        # Act
+        offsets = find_shard_offsets(filename, 4)
+        sharded_games = []
+        for start, end in zip(offsets[:-1], offsets[1:]):
+            sharded_games += list(extract_game(filename, start, end))
+
+        # Assert
+        self.assertEqual(len(sharded_games), 1)
+
+    def test_create_state_result_dataset_workers_reproducible(self):
+        # Arrange
+        filename = 'resources/three_games.pgn'
+
+        # Act
+        x1, y1 = create_state_result_dataset(filename, workers=2, random_seed=7)
+        x2, y2 = create_state_result_dataset(filename, workers=2, random_seed=7)
+
+        # Assert
+        self.assertEqual(x1.shape, (2, 12, 8, 8))
+        self.assertEqual(list(y1), [0, 1])
+        self.assertTrue((x1 == x2).all())
+        self.assertTrue((y1 == y2).all())
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,101 @@
+import os
+import tempfile
+import unittest
+
+from chess_engine.data.generate_dataset import extract_game, get_last_halfmove_number, \
+    create_state_result_dataset
+from chess_engine.data.index import build_game_index, count_plies, extract_indexed_games, \
+    filter_game_index, load_game_index, save_game_index
+
+
+class TestIndex(unittest.TestCase):
+
+    def test_build_game_index_three_games(self):
+        # Arrange
+        filename = 'resources/three_games.pgn'
+
+        # Act
+        index = build_game_index(filename)
+
+        # Assert
+        self.assertEqual(len(index), 3)
+        self.assertEqual(list(index['offset']), [0, 892, 1887])
+        self.assertEqual(int(index['offset'][-1] + index['length'][-1]), os.path.getsize(filename))
+        self.assertEqual(list(index['result']), [2, 0, 1])
+        self.assertEqual(list(index['white_elo']), [2189, 2379, 2046])
+        self.assertEqual(list(index['year']), [2018, 2018, 2018])
+
+    def test_build_game_index_ply_count(self):
+        # Arrange
+        filename = 'resources/three_games.pgn'
+        expected = [get_last_halfmove_number(game) for game in extract_game(filename)]
+
+        # Act
+        index = build_game_index(filename)
+
+        # Assert
+        self.assertEqual(list(index['ply_count']), expected)
+
+    def test_build_game_index_empty_file(self):
+        # Arrange
+        filename = 'resources/empty.pgn'
+
+        # Act
+        index = build_game_index(filename)
+
+        # Assert
+        self.assertEqual(len(index), 0)
+
+    def test_count_plies_strips_comments_and_variations(self):
+        # Arrange
+        movetext = b'1.e4 {best by test} e5 (1...c5 2.Nf3 (2.c3)) 2.Nf3 $1 Nc6 3.\nBb5 1-0'
+
+        # Act
+        actual = count_plies(movetext)
+
+        # Assert
+        self.assertEqual(actual, 5)
+
+    def test_filter_game_index(self):
+        # Arrange
+        index = build_game_index('resources/three_games.pgn')
+
+        # Act
+        decisive = filter_game_index(index)
+        strong = filter_game_index(index, min_elo=2300)
+
+        # Assert
+        self.assertEqual(list(decisive['result']), [0, 1])
+        self.assertEqual(list(strong['offset']), [892])
+
+    def test_extract_indexed_games(self):
+        # Arrange
+        filename = 'resources/three_games.pgn'
+        index = build_game_index(filename)
+
+        # Act
+        actual = [game.headers['White'] for game in extract_indexed_games(filename, index[::-1])]
+
+        # Assert
+        expected = [game.headers['White'] for game in extract_game(filename)][::-1]
+        self.assertEqual(actual, expected)
+
+    def test_create_state_result_dataset_with_index(self):
+        # Arrange
+        filename = 'resources/three_games.pgn'
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            index_filename = os.path.join(tmp_dir, 'index.npy')
+            save_game_index(build_game_index(filename), index_filename)
+
+            # Act
+            loaded = load_game_index(index_filename)
+            x, y = create_state_result_dataset(filename, index_filename=index_filename)
+
+        # Assert
+        self.assertEqual(len(loaded), 3)
+        self.assertEqual(x.shape, (2, 12, 8, 8))
+        self.assertEqual(list(y), [0, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import os
+import tempfile
+import unittest
+import zipfile
+from os.path import join
+
+import numpy as np
+
+from chess_engine.data.generate_dataset import create_state_result_dataset, split_games
+from chess_engine.data.ingest import clean_line, extract_raw_game, split_raw_games, write_clean_dataset
+
+
+class TestIngest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.clean_filename = 'resources/three_games.pgn'
+        with open(self.clean_filename, 'rb') as file:
+            clean_pgn = file.read()
+
+        # Raw files as they come out of the download: windows line endings
+        # and UTF-8 player names, split over two files.
+        raw_pgn = clean_pgn.replace(b'Safranska, Anda', 'Šafránska, Anda'.encode()).replace(b'\n', b'\r\n')
+        split = raw_pgn.index(b'\r\n\r\n[') + 4
+        self.raw_dir = join(self.tmp_dir.name, 'raw')
+        os.mkdir(self.raw_dir)
+        for filename, content in (('a.pgn', raw_pgn[:split]), ('b.pgn', raw_pgn[split:])):
+            with open(join(self.raw_dir, filename), 'wb') as file:
+                file.write(content)
+        self.zip_filename = join(self.tmp_dir.name, 'KingBase.zip')
+        with zipfile.ZipFile(self.zip_filename, 'w') as archive:
+            archive.write(join(self.raw_dir, 'b.pgn'), 'b.pgn')
+            archive.write(join(self.raw_dir, 'a.pgn'), 'a.pgn')
+            archive.writestr('README.txt', 'not a PGN')
+
+    def test_clean_line(self):
+        # Arrange
+        lines = ['[White "Šafránska, Anda"]\r\n', '[Black "Großmann, Łukasz"]\r\n', '{ “ok” — ✓ }\n']
+
+        # Act
+        actual = [clean_line(line.encode()) for line in lines]
+
+        # Assert
+        self.assertEqual(actual, ['[White "Safranska, Anda"]\n', '[Black "Grossmann, Lukasz"]\n',
+                                  '{ "ok" -  }\n'])
+
+    def test_clean_line_drops_invalid_utf8(self):
+        self.assertEqual(clean_line(b'1. e4 \xff e5\r\n'), '1. e4  e5\n')
+
+    def test_split_raw_games_matches_clean_dataset(self):
+        for path in (self.raw_dir, self.zip_filename):
+            with self.subTest(path=path):
+                # Act
+                actual = list(split_raw_games(path))
+
+                # Assert
+                self.assertEqual(actual, list(split_games(self.clean_filename)))
+
+    def test_extract_raw_game(self):
+        # Act
+        games = list(extract_raw_game(self.zip_filename))
+
+        # Assert
+        self.assertEqual([game.headers['White'] for game in games],
+                         ['Safranska, Anda', 'Eliseev, Alexey', 'Bezgodova, Svetlana'])
+
+    def test_write_clean_dataset(self):
+        # Arrange
+        clean_dataset_filename = join(self.tmp_dir.name, 'clean_dataset.pgn')
+
+        # Act
+        n_bytes = write_clean_dataset(self.raw_dir, clean_dataset_filename)
+
+        # Assert
+        with open(clean_dataset_filename, 'rb') as actual, open(self.clean_filename, 'rb') as expected:
+            self.assertEqual(actual.read(), expected.read())
+        self.assertEqual(n_bytes, os.path.getsize(self.clean_filename))
+
+    def test_create_state_result_dataset_from_raw(self):
+        # Arrange
+        expected_x, expected_y = create_state_result_dataset(self.clean_filename, random_seed=3,
+                                                             positions_per_game=2)
+
+        # Act
+        x, y = create_state_result_dataset(self.zip_filename, random_seed=3, positions_per_game=2, raw=True)
+
+        # Assert
+        self.assertTrue(np.array_equal(x, expected_x))
+        self.assertTrue(np.array_equal(y, expected_y))
+
+
+if __name__ == '__main__':
+    unittest.main()
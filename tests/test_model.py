@@ -0,0 +1,89 @@
+import os
+import tempfile
+import unittest
+
+import torch
+from torch.utils.tensorboard import SummaryWriter
+
+from chess_engine.data.generate_dataset import write_state_result_dataset
+from chess_engine.models.dataset import StateResultDataset, make_data_loader, split_dataset
+from chess_engine.models.model import Net, get_argument_parser, load_training_checkpoint, training_loop
+
+
+class TestModel(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        cls.features_dir = os.path.join(cls.tmp_dir.name, 'features')
+        write_state_result_dataset('resources/three_games.pgn', cls.features_dir, random_seed=2,
+                                   positions_per_game=5)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp_dir.cleanup()
+
+    def train(self, n_epochs, checkpoint_dir, resume=False, device=None):
+        torch.manual_seed(0)
+        train_set, validation_set = split_dataset(StateResultDataset(self.features_dir), 0.2)
+        model = Net()
+        optimizer = torch.optim.Adam(model.parameters(), lr=0.0001)
+        with tempfile.TemporaryDirectory() as log_dir:
+            writer = SummaryWriter(log_dir)
+            history = training_loop(n_epochs=n_epochs, optimizer=optimizer, model=model, loss_fn=torch.nn.BCELoss(),
+                                    train_loader=make_data_loader(train_set, batch_size=4, shuffle=False),
+                                    validation_loader=make_data_loader(validation_set, batch_size=4,
+                                                                       shuffle=False),
+                                    validate_every=2, checkpoint_dir=checkpoint_dir, resume=resume, log_every=1,
+                                    writer=writer, device=device)
+            writer.close()
+        return model, optimizer, history
+
+    def test_training_loop_validates_at_intervals(self):
+        with tempfile.TemporaryDirectory() as checkpoint_dir:
+            # Act
+            _, _, history = self.train(3, checkpoint_dir)
+
+        # Assert
+        self.assertEqual([epoch for epoch, _, _ in history], [1, 2, 3])
+        self.assertEqual([loss_val is None for _, _, loss_val in history], [True, False, False])
+
+    def test_resume_matches_uninterrupted_training(self):
+        with tempfile.TemporaryDirectory() as checkpoint_dir, tempfile.TemporaryDirectory() as resumed_dir:
+            # Arrange
+            model, _, _ = self.train(2, checkpoint_dir)
+            self.train(1, resumed_dir)
+
+            # Act
+            resumed_model, optimizer, history = self.train(2, resumed_dir, resume=True)
+            checkpoint = load_training_checkpoint(resumed_dir, Net(), optimizer)
+            saved_state = torch.load(os.path.join(resumed_dir, 'model.pt'))
+
+        # Assert
+        self.assertEqual([epoch for epoch, _, _ in history], [2])
+        self.assertEqual(checkpoint, {'epoch': 2, 'step': 4})
+        for name, value in model.state_dict().items():
+            self.assertTrue(torch.allclose(value, resumed_model.state_dict()[name]))
+            self.assertTrue(torch.equal(saved_state[name], resumed_model.state_dict()[name]))
+
+    def test_training_loop_moves_batches_to_device(self):
+        with tempfile.TemporaryDirectory() as checkpoint_dir, tempfile.TemporaryDirectory() as device_dir:
+            # Act
+            _, _, history = self.train(2, checkpoint_dir)
+            _, _, device_history = self.train(2, device_dir, device=torch.device('cpu'))
+
+        # Assert
+        self.assertEqual(device_history, history)
+
+    def test_pin_memory_flag(self):
+        # Act
+        args = get_argument_parser().parse_args(['--pin_memory', '--device', 'cpu'])
+
+        # Assert
+        self.assertTrue(args.pin_memory)
+        self.assertEqual(args.device, 'cpu')
+        self.assertFalse(get_argument_parser().parse_args([]).pin_memory)
+
+
+if __name__ == '__main__':
+    unittest.main()
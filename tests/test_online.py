@@ -0,0 +1,150 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from chess_engine.data.online import OnlineSampleProducer, SampleRingBuffer
+from chess_engine.models.model import CHECKPOINT_FILENAME
+from chess_engine.models.online import OnlineBatches, find_validation_offset, get_online_argument_parser, \
+    train_online
+
+
+def make_samples(start, n, n_planes=2):
+    x = np.arange(start, start + n, dtype=np.int8)[:, None, None, None] * np.ones((1, n_planes, 8, 8), np.int8)
+    y = np.arange(start, start + n, dtype=np.int8) % 2
+    return x, y
+
+
+class TestSampleRingBuffer(unittest.TestCase):
+
+    def test_put_get_wraps_around(self):
+        # Arrange
+        buffer = SampleRingBuffer(capacity=5, n_planes=2)
+        buffer.put(*make_samples(0, 4))
+        buffer.get(3)
+
+        # Act
+        n_put = buffer.put(*make_samples(4, 4))
+        x, y = buffer.get(5)
+
+        # Assert
+        self.assertEqual(n_put, 4)
+        np.testing.assert_array_equal(x[:, 0, 0, 0], [3, 4, 5, 6, 7])
+        np.testing.assert_array_equal(y, [1, 0, 1, 0, 1])
+        self.assertEqual(len(buffer), 0)
+
+    def test_put_full_buffer(self):
+        # Arrange
+        buffer = SampleRingBuffer(capacity=3, n_planes=2)
+
+        # Act
+        n_first = buffer.put(*make_samples(0, 5))
+        n_second = buffer.put(*make_samples(5, 1), timeout=0.01)
+
+        # Assert
+        self.assertEqual(n_first, 3)
+        self.assertEqual(n_second, 0)
+        self.assertEqual(len(buffer), 3)
+
+    def test_get_timeout(self):
+        # Arrange
+        buffer = SampleRingBuffer(capacity=3, n_planes=2)
+        buffer.put(*make_samples(0, 1))
+
+        # Act
+        x, y = buffer.get(2, timeout=0.01)
+
+        # Assert
+        self.assertEqual(x.shape, (0, 2, 8, 8))
+        self.assertEqual(len(buffer), 1)
+
+    def test_get_more_than_capacity(self):
+        # Arrange
+        buffer = SampleRingBuffer(capacity=3, n_planes=2)
+
+        # Act / Assert
+        with self.assertRaises(ValueError):
+            buffer.get(4)
+
+
+class TestOnlineSampleProducer(unittest.TestCase):
+
+    def test_batches(self):
+        # Arrange
+        producer = OnlineSampleProducer('resources/three_games.pgn', producers=2, capacity=64, random_seed=0,
+                                        positions_per_game=3, features=['pieces', 'side_to_move'], chunk_size=4)
+
+        # Act
+        with producer:
+            batches = list(OnlineBatches(producer, batch_size=16, batches_per_epoch=5))
+
+        # Assert
+        self.assertEqual(len(batches), 5)
+        for x, y in batches:
+            self.assertEqual(x.shape, (16, 13, 8, 8))
+            self.assertEqual(y.shape, (16, 1))
+            self.assertTrue(set(y.flatten().tolist()) <= {0.0, 1.0})
+            # One king of each color in every sample.
+            self.assertTrue((x[:, 0].sum(dim=(1, 2)) == 1).all())
+            self.assertTrue((x[:, 6].sum(dim=(1, 2)) == 1).all())
+
+    def test_batch_larger_than_buffer(self):
+        # Arrange
+        producer = OnlineSampleProducer('resources/three_games.pgn', producers=1, capacity=8, random_seed=0)
+
+        # Act / Assert
+        with producer, self.assertRaises(ValueError):
+            producer.get(9)
+
+    def test_no_decisive_games(self):
+        # Arrange
+        producer = OnlineSampleProducer('resources/unfinished_game.pgn', producers=1, capacity=8)
+
+        # Act / Assert
+        with producer, self.assertRaises(RuntimeError):
+            producer.get(1)
+
+
+class TestOnlineTraining(unittest.TestCase):
+
+    def test_find_validation_offset(self):
+        # Act
+        offset = find_validation_offset('resources/three_games.pgn', 0.3)
+
+        # Assert
+        with open('resources/three_games.pgn', 'rb') as file:
+            file.seek(offset)
+            self.assertTrue(file.readline().startswith(b'[Event'))
+        self.assertGreater(offset, 0)
+
+    def test_argument_parser_has_no_dataset_options(self):
+        # Arrange
+        parser = get_online_argument_parser()
+
+        # Act / Assert
+        with self.assertRaises(SystemExit):
+            parser.parse_args(['--dataset_path', 'games.pgn', '--packed'])
+        self.assertNotIn('features_dir', vars(parser.parse_args(['--dataset_path', 'games.pgn'])))
+
+    def test_train_online(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # Arrange
+            checkpoint_dir = os.path.join(tmp_dir, 'checkpoints')
+            args = get_online_argument_parser().parse_args([
+                '--dataset_path', 'resources/three_games.pgn', '--n_epochs', '2', '--batch_size', '8',
+                '--batches_per_epoch', '3', '--producers', '1', '--buffer_size', '32', '--validation_fraction', '0.3',
+                '--positions-per-game', '4', '--seed', '1', '--checkpoint_dir', checkpoint_dir,
+                '--log_dir', os.path.join(tmp_dir, 'runs')])
+
+            # Act
+            history, model = train_online(args)
+
+            # Assert
+            self.assertEqual([epoch for epoch, _, _ in history], [1, 2])
+            self.assertIsNotNone(history[-1][2])
+            self.assertTrue(os.path.exists(os.path.join(checkpoint_dir, CHECKPOINT_FILENAME)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import random
+import tempfile
+import unittest
+
+import numpy as np
+
+from chess_engine.data.generate_dataset import create_state_result_dataset, write_state_result_dataset
+from chess_engine.data.packed import PACKED_SAMPLE_DTYPE, iterate_packed_batches, load_packed_dataset, \
+    unpack_samples
+
+
+class TestPacked(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    def test_packed_sample_size(self):
+        self.assertEqual(PACKED_SAMPLE_DTYPE.itemsize, 12 * 8 + 3)
+
+    def test_write_packed_dataset_unpacks_to_model_input(self):
+        for workers in (1, 2):
+            with self.subTest(workers=workers):
+                # Arrange
+                filename = 'resources/three_games.pgn'
+                target_dir = '{}/{}'.format(self.tmp_dir.name, workers)
+                expected_x, expected_y = create_state_result_dataset(filename, workers=workers, random_seed=5,
+                                                                     positions_per_game=3)
+
+                # Act
+                write_state_result_dataset(filename, target_dir, workers=workers, random_seed=5,
+                                           positions_per_game=3, packed=True)
+                x, y = unpack_samples(load_packed_dataset(target_dir))
+
+                # Assert
+                self.assertEqual(x.dtype, np.float32)
+                self.assertEqual(y.shape, (6, 1))
+                self.assertTrue(np.array_equal(x, expected_x))
+                self.assertTrue(np.array_equal(y[:, 0], expected_y))
+
+    def test_iterate_packed_batches_shuffled(self):
+        # Arrange
+        samples = np.zeros(10, PACKED_SAMPLE_DTYPE)
+        samples['label'] = np.arange(10) % 2
+        samples['bitboards'][:, 0] = np.left_shift(np.uint64(1), np.arange(10, dtype=np.uint64))  # king on square i
+
+        # Act
+        batches = list(iterate_packed_batches(samples, batch_size=4, shuffle=True, rng=random.Random(0)))
+
+        # Assert
+        self.assertEqual([len(x) for x, _ in batches], [4, 4, 2])
+        squares = [int(np.flatnonzero(board[0][::-1].ravel())[0]) for x, _ in batches for board in x]
+        labels = [int(label) for _, y in batches for label in y[:, 0]]
+        self.assertEqual(sorted(squares), list(range(10)))
+        self.assertEqual(labels, [square % 2 for square in squares])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import io
+import unittest
+
+import chess
+import chess.pgn
+import numpy as np
+
+from chess_engine.data.generate_dataset import extract_game, split_games, sample_game_positions, \
+    sample_mainline_game_positions, create_state_result_dataset
+from chess_engine.data.parser import read_mainline_game, read_mainline_san, split_headers_movetext
+from chess_engine.data.profiling import PipelineStats
+
+RESOURCES = ['resources/empty.pgn',
+             'resources/rolvag-kjartansson-2018.pgn',
+             'resources/single_game.pgn',
+             'resources/sundararajan-ziatdinov-2018.pgn',
+             'resources/three_games.pgn',
+             'resources/unfinished_game.pgn']
+
+
+class TestParser(unittest.TestCase):
+
+    def test_read_mainline_san(self):
+        # Arrange
+        movetext = '1.e4 {best by test} e5!? (1...c5 2.Nf3 (2.c3)) 2.Nf3 $1 Nc6 3.\nBb5 a6 4.O-O 1-0'
+
+        # Act
+        actual = read_mainline_san(movetext)
+
+        # Assert
+        expected = ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'a6', 'O-O']
+        self.assertEqual(actual, expected)
+
+    def test_split_headers_movetext(self):
+        # Arrange
+        pgn = '[Event "?"]\n[Result "1-0"]\n\n1.e4 1-0\n\n'
+
+        # Act
+        headers, movetext = split_headers_movetext(pgn)
+
+        # Assert
+        self.assertEqual(headers, '[Event "?"]\n[Result "1-0"]')
+        self.assertEqual(movetext, '1.e4 1-0\n\n')
+
+    def test_read_mainline_game_setup_board_from_fen(self):
+        # Arrange
+        fen = '6k1/6p1/2n5/p7/1pp1KP1P/P7/1P1B4/8 b - - 1 46'
+        pgn = '[SetUp "1"]\n[FEN "{}"]\n[Result "*"]\n\n46...Kf7 *\n\n'.format(fen)
+        board = chess.Board()
+
+        # Act
+        game = read_mainline_game(pgn)
+        actual = game.setup_board(board)
+
+        # Assert
+        self.assertIs(actual, board)
+        self.assertEqual(actual.fen(), fen)
+        self.assertEqual(game.moves, ['Kf7'])
+
+    def test_read_mainline_game_matches_read_game(self):
+        for filename in RESOURCES:
+            with self.subTest(filename=filename):
+                # Arrange
+                games = list(extract_game(filename))
+                board = chess.Board()
+
+                # Act
+                mainline_games = [read_mainline_game(pgn) for pgn in split_games(filename)]
+
+                # Assert
+                self.assertEqual(len(mainline_games), len(games))
+                for game, mainline_game in zip(games, mainline_games):
+                    self.assertEqual(mainline_game.headers['Result'], game.headers['Result'])
+                    self.assertEqual(mainline_game.moves, [node.san() for node in game.mainline()])
+                    expected = sample_game_positions(game, positions_per_game=0)
+                    actual = sample_mainline_game_positions(mainline_game, positions_per_game=0, board=board)
+                    self.assertTrue(np.array_equal(actual, expected))
+
+    def test_standalone_annotations_match_read_game(self):
+        # Arrange
+        pgn = ('[Event "?"]\n[Result "1-0"]\n\n'
+               '1. e4 ! e5 ? 2. Nf3 !? Nc6 ?! 3. Bb5 !! a6 ?? 4. Ba4 Nf6 5. O-O Be7 1-0\n\n')
+        game = chess.pgn.read_game(io.StringIO(pgn))
+
+        # Act
+        mainline_game = read_mainline_game(pgn)
+        actual = sample_mainline_game_positions(mainline_game, positions_per_game=0)
+
+        # Assert
+        self.assertEqual(mainline_game.moves, [node.san() for node in game.mainline()])
+        self.assertEqual(len(actual), 9)
+        self.assertTrue(np.array_equal(actual, sample_game_positions(game, positions_per_game=0)))
+
+    def test_create_state_result_dataset_fast_parser(self):
+        # Arrange
+        filename = 'resources/three_games.pgn'
+
+        # Act
+        x, y = create_state_result_dataset(filename, positions_per_game=0)
+        x_fast, y_fast = create_state_result_dataset(filename, positions_per_game=0, fast_parser=True)
+
+        # Assert
+        self.assertTrue(np.array_equal(x_fast, x))
+        self.assertTrue(np.array_equal(y_fast, y))
+
+    def test_illegal_move_truncates_game(self):
+        # Arrange
+        filename = 'resources/illegal_move_game.pgn'
+        game, = extract_game(filename)
+        mainline_game, = [read_mainline_game(pgn) for pgn in split_games(filename)]
+        stats = PipelineStats()
+
+        # Act
+        actual = sample_mainline_game_positions(mainline_game, positions_per_game=0, stats=stats)
+
+        # Assert
+        expected = sample_game_positions(game, positions_per_game=0)
+        self.assertEqual(len(actual), 7)
+        self.assertTrue(np.array_equal(actual, expected))
+        self.assertEqual(stats.counters['truncated_games'], 1)
+
+    def test_create_state_result_dataset_illegal_move(self):
+        for fast_parser in [False, True]:
+            with self.subTest(fast_parser=fast_parser):
+                # Act
+                x, y = create_state_result_dataset('resources/illegal_move_game.pgn', positions_per_game=0,
+                                                   fast_parser=fast_parser, workers=2)
+
+                # Assert
+                self.assertEqual(len(x), 7)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+import json
+import pstats
+import random
+import tempfile
+import time
+import unittest
+from os.path import join
+
+from chess_engine.data.generate_dataset import generate_shard_samples, write_state_result_dataset
+from chess_engine.data.profiling import HEADERS, MERGE, PARSE, REPLAY, SPLIT, WRITE, PipelineStats, \
+    SamplingProfiler, run_profiler, write_stats_summary
+
+
+def busy_wait(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class TestProfiling(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    def test_generate_shard_samples_counts(self):
+        # Arrange
+        stats = PipelineStats()
+
+        # Act
+        samples = list(generate_shard_samples('resources/three_games.pgn', rng=random.Random(0),
+                                              positions_per_game=2, stats=stats))
+
+        # Assert
+        self.assertEqual(len(samples), 2)
+        self.assertEqual(stats.counters['games_read'], 3)
+        self.assertEqual(stats.counters['games_sampled'], 2)
+        self.assertEqual(stats.counters['draws_skipped'], 1)
+        self.assertEqual(stats.counters['positions'], 4)
+        self.assertGreater(stats.counters['bytes'], 0)
+        self.assertEqual(set(stats.stage_seconds), {SPLIT, HEADERS, PARSE, REPLAY})
+
+    def test_generate_shard_samples_counts_unfinished(self):
+        # Arrange
+        stats = PipelineStats()
+
+        # Act
+        list(generate_shard_samples('resources/unfinished_game.pgn', rng=random.Random(0), fast_parser=True,
+                                    stats=stats))
+
+        # Assert
+        self.assertEqual(stats.counters['unfinished_skipped'], 1)
+        self.assertEqual(stats.counters['games_sampled'], 0)
+
+    def test_write_state_result_dataset_stats(self):
+        for workers in [1, 2]:
+            with self.subTest(workers=workers):
+                # Arrange
+                stats = PipelineStats()
+                target_dir = join(self.tmp_dir.name, str(workers))
+
+                # Act
+                n_samples = write_state_result_dataset('resources/three_games.pgn', target_dir, workers=workers,
+                                                       random_seed=1, positions_per_game=3, stats=stats)
+
+                # Assert
+                self.assertEqual(stats.counters['positions'], n_samples)
+                self.assertEqual(stats.counters['games_read'], 3)
+                self.assertIn(WRITE, stats.stage_seconds)
+                self.assertEqual(MERGE in stats.stage_seconds, workers > 1)
+
+    def test_merge(self):
+        # Arrange
+        stats = PipelineStats()
+        stats.count('positions', 3)
+        stats.stage_seconds[PARSE] = 1.0
+        other = PipelineStats()
+        other.count('positions', 4)
+        other.count('bytes', 10)
+        other.stage_seconds[PARSE] = 0.5
+
+        # Act
+        stats.merge(other)
+
+        # Assert
+        self.assertEqual(stats.counters, {'positions': 7, 'bytes': 10})
+        self.assertEqual(stats.stage_seconds[PARSE], 1.5)
+
+    def test_write_stats_summary(self):
+        # Arrange
+        stats = PipelineStats()
+        stats.count('games_sampled', 5)
+        stats.count('positions', 10)
+        with stats.time(REPLAY):
+            busy_wait(0.01)
+        stats.finish()
+        filename = join(self.tmp_dir.name, 'stats.json')
+
+        # Act
+        write_stats_summary(stats, filename, workers=2)
+
+        # Assert
+        with open(filename) as file:
+            summary = json.load(file)
+        self.assertEqual(summary['counters'], {'games_sampled': 5, 'positions': 10})
+        self.assertGreaterEqual(summary['stage_seconds'][REPLAY], 0.01)
+        self.assertAlmostEqual(summary['positions_per_sec'], 10 / summary['wall_seconds'])
+        self.assertEqual(summary['workers'], 2)
+        self.assertIn('python', summary['run'])
+
+    def test_sampling_profiler(self):
+        # Arrange
+        profiler = SamplingProfiler(interval=0.001)
+        filename = join(self.tmp_dir.name, 'profile.txt')
+
+        # Act
+        profiler.start()
+        busy_wait(0.1)
+        profiler.stop()
+        profiler.write_collapsed_stacks(filename)
+
+        # Assert
+        (top_function, _), *_ = profiler.get_top_functions(1)
+        self.assertEqual(top_function, 'test_profiling.py:busy_wait')
+        with open(filename) as file:
+            stack, count = file.readline().rsplit(' ', 1)
+        self.assertIn('test_profiling.py:busy_wait', stack)
+        self.assertGreater(int(count), 0)
+
+    def test_run_profiler_cprofile(self):
+        # Arrange
+        filename = join(self.tmp_dir.name, 'profile.prof')
+
+        # Act
+        with run_profiler('cprofile', filename):
+            busy_wait(0.01)
+
+        # Assert
+        functions = [function for _, _, function in pstats.Stats(filename).stats]
+        self.assertIn('busy_wait', functions)
+
+    def test_run_profiler_unknown(self):
+        with self.assertRaises(ValueError):
+            with run_profiler('perf', 'profile'):
+                pass
+
+
+if __name__ == '__main__':
+    unittest.main()
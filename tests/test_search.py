@@ -0,0 +1,215 @@
+import threading
+import time
+import unittest
+
+import chess
+import torch
+
+from chess_engine.data.serializer import convert_board_to_position
+from chess_engine.features.registry import count_planes
+from chess_engine.models.evaluator import Evaluator
+from chess_engine.models.model import Net
+from chess_engine.search.alphabeta import DRAW_SCORE, MATE_SCORE, AlphaBetaSearcher, order_moves
+from chess_engine.search.evaluation import MaterialEvaluator
+from chess_engine.search.transposition import EXACT, LOWER_BOUND, TranspositionTable
+
+
+class CountingEvaluator(MaterialEvaluator):
+
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+        self.positions = 0
+
+    def evaluate_many(self, boards):
+        self.calls += 1
+        self.positions += len(boards)
+        return super().evaluate_many(boards)
+
+
+class TestSearch(unittest.TestCase):
+
+    def test_finds_mate_in_one(self):
+        # Arrange
+        board = chess.Board('6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1')
+        searcher = AlphaBetaSearcher(MaterialEvaluator())
+
+        # Act
+        result = searcher.search(board, max_depth=3)
+
+        # Assert
+        self.assertEqual(result.best_move, chess.Move.from_uci('a1a8'))
+        self.assertEqual(result.score, MATE_SCORE - 1)
+        self.assertEqual(result.depth, 1)
+
+    def test_finds_mate_in_two(self):
+        # Arrange
+        board = chess.Board('k7/8/2K5/8/8/8/8/1R6 w - - 0 1')
+        searcher = AlphaBetaSearcher(MaterialEvaluator())
+
+        # Act
+        result = searcher.search(board, max_depth=4)
+
+        # Assert
+        self.assertEqual(result.score, MATE_SCORE - 3)
+        self.assertEqual(len(result.pv), 3)
+
+    def test_finds_stalemate(self):
+        # Arrange
+        # Black is a pawn up, Kb6-a6 stalemates black.
+        board = chess.Board('k7/P6p/1K5p/7p/7P/8/8/8 w - - 0 1')
+        searcher = AlphaBetaSearcher(MaterialEvaluator())
+
+        # Act
+        result = searcher.search(board, max_depth=1)
+
+        # Assert
+        self.assertEqual(result.best_move, chess.Move.from_uci('b6a6'))
+        self.assertEqual(result.score, DRAW_SCORE)
+
+    def test_does_not_hang_the_queen(self):
+        # Arrange
+        board = chess.Board('4k3/8/4p3/8/8/8/4Q3/4K3 w - - 0 1')
+        searcher = AlphaBetaSearcher(MaterialEvaluator())
+
+        # Act
+        result = searcher.search(board, max_depth=2)
+
+        # Assert
+        board.push(result.best_move)
+        self.assertFalse(board.is_attacked_by(chess.BLACK, board.pieces(chess.QUEEN, chess.WHITE).pop()))
+        self.assertGreater(result.score, 0.4)
+
+    def test_leaves_evaluated_in_batches(self):
+        # Arrange
+        evaluator = CountingEvaluator()
+        searcher = AlphaBetaSearcher(evaluator)
+
+        # Act
+        result = searcher.search(chess.Board(), max_depth=3)
+
+        # Assert
+        self.assertEqual(result.depth, 3)
+        self.assertGreater(evaluator.positions, 10 * evaluator.calls)
+        self.assertGreater(result.nodes, evaluator.positions)
+        self.assertGreater(result.nps, 0)
+        self.assertEqual(len(result.pv), 3)
+
+    def test_time_limit(self):
+        # Arrange
+        searcher = AlphaBetaSearcher(MaterialEvaluator())
+
+        # Act
+        start_time = time.perf_counter()
+        result = searcher.search(chess.Board(), max_depth=64, time_limit=0.3)
+        seconds = time.perf_counter() - start_time
+
+        # Assert
+        self.assertLess(seconds, 1.0)
+        self.assertGreaterEqual(result.depth, 1)
+        self.assertIn(result.best_move, chess.Board().legal_moves)
+
+    def test_stop_from_another_thread(self):
+        # Arrange
+        searcher = AlphaBetaSearcher(MaterialEvaluator())
+        threading.Timer(0.2, searcher.stop).start()
+
+        # Act
+        result = searcher.search(chess.Board(), max_depth=64)
+
+        # Assert
+        self.assertLess(result.seconds, 1.0)
+        self.assertIn(result.best_move, chess.Board().legal_moves)
+
+    def test_search_with_net(self):
+        # Arrange
+        torch.manual_seed(0)
+        evaluator = Evaluator(Net())
+        searcher = AlphaBetaSearcher(evaluator)
+
+        # Act
+        result = searcher.search(chess.Board(), max_depth=2)
+
+        # Assert
+        self.assertEqual(result.depth, 2)
+        self.assertIn(result.best_move, chess.Board().legal_moves)
+        self.assertGreater(evaluator.misses, 0)
+
+    def test_leaves_keep_move_history_for_repetition_feature(self):
+        # Arrange
+        features = ('pieces', 'repetition')
+        evaluator = Evaluator(Net(in_channels=count_planes(features)), features=features)
+        leaves = []
+        evaluate_many = evaluator.evaluate_many
+        evaluator.evaluate_many = lambda boards: leaves.extend(boards) or evaluate_many(boards)
+        board = chess.Board()
+        for san in ('Nf3', 'Nf6', 'Ng1'):
+            board.push_san(san)
+
+        # Act
+        AlphaBetaSearcher(evaluator).search(board, max_depth=1)
+
+        # Assert
+        self.assertTrue(all(len(leaf.move_stack) == 4 for leaf in leaves))
+        repeated = [leaf for leaf in leaves if leaf.board_fen() == chess.Board().board_fen()]
+        self.assertEqual([convert_board_to_position(leaf)[-1] for leaf in repeated], [1])
+
+    def test_order_moves(self):
+        # Arrange
+        board = chess.Board('4k3/8/8/3q4/4P3/8/8/3QK3 w - - 0 1')
+        moves = list(board.legal_moves)
+
+        # Act
+        ordered = order_moves(board, moves, first_move=chess.Move.from_uci('e1f2'))
+
+        # Assert
+        self.assertEqual([move.uci() for move in ordered[:3]], ['e1f2', 'e4d5', 'd1d5'])
+
+    def test_transposition_table_keeps_deeper_entries(self):
+        # Arrange
+        table = TranspositionTable(max_entries=2)
+
+        # Act
+        table.store(1, 3, 0.1, EXACT, None)
+        table.store(1, 2, 0.2, LOWER_BOUND, None)
+        kept = table.get(1)
+        table.store(2, 1, 0.3, EXACT, None)
+        table.store(3, 1, 0.4, EXACT, None)
+
+        # Assert
+        self.assertEqual((kept.depth, kept.score), (3, 0.1))
+        self.assertIsNone(table.get(1))
+        self.assertEqual(table.get(2).score, 0.3)
+        self.assertEqual(len(table), 2)
+
+    def test_transposition_table_shared_between_threads(self):
+        # Arrange
+        table = TranspositionTable(max_entries=64)
+        errors = []
+
+        def store_and_get(offset):
+            try:
+                for i in range(20000):
+                    key = (offset + i) % 100
+                    table.store(key, i % 3, 0.0, EXACT, None)
+                    table.get(key)
+                    if i % 1000 == 0:
+                        table.resize(32 + i % 64)
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=store_and_get, args=(offset,)) for offset in range(4)]
+
+        # Act
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Assert
+        self.assertEqual(errors, [])
+        self.assertLessEqual(len(table), table.max_entries)
+
+
+if __name__ == '__main__':
+    unittest.main()
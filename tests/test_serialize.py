@@ -1,9 +1,12 @@
 import unittest
 
+import chess
+import chess.pgn
 import numpy as np
 
 from chess_engine.data.serializer import convert_fen_to_array, \
-    convert_piece_list_to_array, convert_game_result_to_int
+    convert_piece_list_to_array, convert_game_result_to_int, \
+    convert_board_to_bitboards, convert_bitboards_to_array, LAYERS
 
 
 class TestSerializer(unittest.TestCase):
@@ -162,6 +165,38 @@ class TestSerializer(unittest.TestCase):
         expected[1, 7] = 1
         self.assertTrue(np.array_equal(actual, expected))
 
+    def test_convert_bitboards_to_array_matches_piece_lists(self):
+        # Arrange
+        pgn = open("resources/sundararajan-ziatdinov-2018.pgn")
+        game = chess.pgn.read_game(pgn)
+        boards = [node.board() for node in game.mainline()]
+        expected = np.stack([
+            np.stack([convert_piece_list_to_array(list(board.pieces(piece_type, color)))
+                      for color, piece_type in LAYERS], axis=0)
+            for board in boards], axis=0)
+        bitboards = np.stack([convert_board_to_bitboards(board) for board in boards], axis=0)
+
+        # Act
+        actual = convert_bitboards_to_array(bitboards)
+
+        # Assert
+        self.assertEqual(actual.shape, (91, 12, 8, 8))
+        self.assertEqual(actual.dtype, np.int8)
+        self.assertTrue(np.array_equal(actual, expected))
+
+    def test_convert_bitboards_to_array_single_position(self):
+        # Arrange
+        board = chess.Board()
+
+        # Act
+        actual = convert_bitboards_to_array(convert_board_to_bitboards(board))
+
+        # Assert
+        expected = convert_fen_to_array(board.fen())
+        self.assertEqual(actual.shape, (12, 8, 8))
+        self.assertTrue(np.array_equal(actual, expected))
+        self.assertEqual(actual[5, 6].tolist(), [1] * 8)  # white pawns
+
     def test_convert_win_to_1(self):
         # Arrange
         game_result = '1-0'
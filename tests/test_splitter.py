@@ -0,0 +1,94 @@
+import tempfile
+import unittest
+from os.path import join
+
+from chess_engine.data.generate_dataset import find_shard_offsets
+from chess_engine.data.splitter import split_game_buffers
+
+
+class TestSplitter(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        with open('resources/three_games.pgn', 'rb') as file:
+            self.pgn = file.read()
+
+    def write(self, content: bytes) -> str:
+        filename = join(self.tmp_dir.name, 'games.pgn')
+        with open(filename, 'wb') as file:
+            file.write(content)
+        return filename
+
+    def test_games_across_block_boundaries(self):
+        # Arrange
+        filename = 'resources/three_games.pgn'
+        expected = list(split_game_buffers(filename))
+
+        for block_size in (1, 2, 7, 64, 1000):
+            with self.subTest(block_size=block_size):
+                # Act
+                actual = list(split_game_buffers(filename, block_size=block_size))
+
+                # Assert
+                self.assertEqual([(offset, bytes(game)) for offset, game in actual],
+                                 [(offset, bytes(game)) for offset, game in expected])
+
+    def test_games_joined_back_are_the_file(self):
+        # Act
+        games = list(split_game_buffers('resources/three_games.pgn'))
+
+        # Assert
+        self.assertEqual(len(games), 3)
+        self.assertEqual(b''.join(games[i][1] for i in range(3)), self.pgn)
+        self.assertEqual(games[-1][0], len(self.pgn))
+
+    def test_windows_line_endings(self):
+        # Arrange
+        filename = self.write(self.pgn.replace(b'\n', b'\r\n'))
+
+        for block_size in (3, 1 << 20):
+            with self.subTest(block_size=block_size):
+                # Act
+                games = [bytes(game) for _, game in split_game_buffers(filename, block_size=block_size)]
+
+                # Assert
+                self.assertEqual([game.replace(b'\r\n', b'\n') for game in games],
+                                 [bytes(game) for _, game in split_game_buffers('resources/three_games.pgn')])
+
+    def test_trailing_game_without_blank_line_dropped(self):
+        # Arrange
+        filename = self.write(self.pgn.rstrip(b'\n'))
+
+        # Act
+        games = list(split_game_buffers(filename, block_size=16))
+
+        # Assert
+        self.assertEqual(len(games), 2)
+
+    def test_start_and_end(self):
+        # Arrange
+        filename = 'resources/three_games.pgn'
+        offsets = [0] + [offset for offset, _ in split_game_buffers(filename)]
+
+        # Act
+        games = list(split_game_buffers(filename, start=offsets[1], end=offsets[2] + 1, block_size=5))
+
+        # Assert
+        self.assertEqual([offset for offset, _ in games], offsets[2:])
+
+    def test_shards_cover_file(self):
+        # Arrange
+        filename = 'resources/three_games.pgn'
+        offsets = find_shard_offsets(filename, 2)
+
+        # Act
+        games = [bytes(game) for start, end in zip(offsets[:-1], offsets[1:])
+                 for _, game in split_game_buffers(filename, start, end, block_size=10)]
+
+        # Assert
+        self.assertEqual(b''.join(games), self.pgn)
+
+
+if __name__ == '__main__':
+    unittest.main()
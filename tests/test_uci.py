@@ -0,0 +1,147 @@
+import queue
+import time
+import unittest
+
+import chess
+
+from chess_engine.search.alphabeta import MATE_SCORE
+from chess_engine.search.evaluation import MaterialEvaluator
+from chess_engine.uci import UciEngine, convert_score_to_uci, get_time_limit
+
+
+class TestUci(unittest.TestCase):
+
+    def setUp(self):
+        self.lines = queue.Queue()
+        self.engine = UciEngine(MaterialEvaluator, output=self.lines.put)
+        self.addCleanup(self.engine.handle, 'quit')
+
+    def read_until(self, prefix, timeout=5.0):
+        lines = []
+        while True:
+            line = self.lines.get(timeout=timeout)
+            lines.append(line)
+            if line.startswith(prefix):
+                return lines
+
+    def test_handshake(self):
+        # Act
+        self.engine.handle('uci')
+        lines = self.read_until('uciok')
+
+        # Assert
+        self.assertIn('option name Hash type spin default 16 min 1 max 4096', lines)
+        self.assertIn('option name Threads type spin default 1 min 1 max 64', lines)
+
+    def test_go_depth_reports_info_and_bestmove(self):
+        # Arrange
+        self.engine.handle('position startpos moves e2e4 e7e5')
+
+        # Act
+        self.engine.handle('go depth 2')
+        lines = self.read_until('bestmove')
+
+        # Assert
+        info = [line.split() for line in lines if line.startswith('info')]
+        self.assertEqual([tokens[tokens.index('depth') + 1] for tokens in info], ['1', '2'])
+        for name in ('nps', 'hashfull', 'score', 'pv'):
+            self.assertIn(name, info[-1])
+        board = chess.Board()
+        board.push_san('e4')
+        board.push_san('e5')
+        self.assertIn(chess.Move.from_uci(lines[-1].split()[1]), board.legal_moves)
+
+    def test_isready_and_stop_while_searching(self):
+        # Arrange
+        self.engine.handle('position fen 4k3/8/8/8/8/8/8/R3K3 w Q - 0 1')
+        self.engine.handle('go infinite')
+
+        # Act
+        start_time = time.perf_counter()
+        self.engine.handle('isready')
+        ready_line = self.read_until('readyok')[-1]
+        ready_seconds = time.perf_counter() - start_time
+        time.sleep(0.2)
+        self.engine.handle('stop')
+        lines = self.read_until('bestmove')
+
+        # Assert
+        self.assertEqual(ready_line, 'readyok')
+        self.assertLess(ready_seconds, 0.5)
+        self.assertTrue(lines[-1].startswith('bestmove '))
+        self.assertTrue(self.lines.empty())
+
+    def test_go_movetime(self):
+        # Act
+        start_time = time.perf_counter()
+        self.engine.handle('go movetime 300')
+        self.read_until('bestmove')
+
+        # Assert
+        self.assertLess(time.perf_counter() - start_time, 1.0)
+
+    def test_set_options(self):
+        # Act
+        self.engine.handle('setoption name Hash value 1')
+        self.engine.handle('setoption name Threads value 2')
+        self.engine.handle('go depth 2')
+        lines = self.read_until('bestmove')
+
+        # Assert
+        self.assertEqual(self.engine.table.max_entries, 2 ** 20 // 256)
+        self.assertEqual(len(self.engine.searchers), 2)
+        self.assertTrue(all(searcher.table is self.engine.table for searcher in self.engine.searchers))
+        self.assertIn(chess.Move.from_uci(lines[-1].split()[1]), chess.Board().legal_moves)
+
+    def test_set_option_invalid_value(self):
+        # Act
+        self.engine.handle('setoption name Hash value abc')
+        self.engine.handle('setoption name Threads value')
+        keep_running = self.engine.handle('isready')
+
+        # Assert
+        self.assertTrue(keep_running)
+        self.assertEqual(self.read_until('readyok'), ['readyok'])
+        self.assertEqual(self.engine.table.max_entries, 16 * 2 ** 20 // 256)
+        self.assertEqual(len(self.engine.searchers), 1)
+
+    def test_ponderhit(self):
+        # Arrange
+        self.engine.handle('position startpos moves e2e4 e7e5')
+        self.engine.handle('go ponder wtime 2000 btime 2000 movestogo 10')
+        time.sleep(0.2)
+        lines_before = list(self.lines.queue)
+
+        # Act
+        start_time = time.perf_counter()
+        self.engine.handle('ponderhit')
+        lines = self.read_until('bestmove')
+
+        # Assert
+        self.assertFalse(any(line.startswith('bestmove') for line in lines_before))
+        self.assertLess(time.perf_counter() - start_time, 1.0)
+        board = chess.Board()
+        board.push_san('e4')
+        board.push_san('e5')
+        self.assertIn(chess.Move.from_uci(lines[-1].split()[1]), board.legal_moves)
+
+    def test_convert_score_to_uci(self):
+        self.assertEqual(convert_score_to_uci(0.0), 'cp 0')
+        self.assertEqual(convert_score_to_uci(10 / 11 - 0.5), 'cp 400')
+        self.assertEqual(convert_score_to_uci(MATE_SCORE - 3), 'mate 2')
+        self.assertEqual(convert_score_to_uci(-MATE_SCORE + 2), 'mate -1')
+
+    def test_get_time_limit(self):
+        # Arrange
+        board = chess.Board()
+        board.push_san('e4')
+
+        # Act / Assert
+        self.assertIsNone(get_time_limit(board, {'depth': 3}))
+        self.assertAlmostEqual(get_time_limit(board, {'movetime': 1000}), 0.95)
+        self.assertAlmostEqual(get_time_limit(board, {'wtime': 1000, 'btime': 30000, 'binc': 2000}), 1.95)
+        self.assertAlmostEqual(get_time_limit(board, {'btime': 1000, 'movestogo': 1}), 0.45)
+
+
+if __name__ == '__main__':
+    unittest.main()
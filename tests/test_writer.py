@@ -0,0 +1,99 @@
+import os
+import tempfile
+import unittest
+from os.path import join
+
+import numpy as np
+
+from chess_engine.data.generate_dataset import create_state_result_dataset, write_state_result_dataset
+from chess_engine.data.serializer import POSITION_DTYPE, convert_bitboards_to_array
+from chess_engine.data.writer import NpyAppendWriter, StateResultWriter
+from chess_engine.features.registry import FEATURES_FILENAME
+
+
+class TestWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    def test_npy_append_writer_loadable_after_each_write(self):
+        # Arrange
+        filename = join(self.tmp_dir.name, 'rows.npy')
+        rows = np.arange(5 * 3, dtype=np.int8).reshape(5, 3)
+
+        # Act
+        with NpyAppendWriter(filename, np.int8, (3,)) as writer:
+            writer.write(rows[:2])
+            partial = np.load(filename)
+            writer.write(rows[2:])
+        actual = np.load(filename, mmap_mode='r')
+
+        # Assert
+        self.assertTrue(np.array_equal(partial, rows[:2]))
+        self.assertTrue(np.array_equal(actual, rows))
+
+    def test_npy_append_writer_append_mode_drops_partial_row(self):
+        # Arrange
+        filename = join(self.tmp_dir.name, 'rows.npy')
+        rows = np.arange(4 * 3, dtype=np.int64).reshape(4, 3)
+        np.save(filename, rows[:2])
+        with open(filename, 'ab') as file:
+            file.write(b'\x01\x02\x03')  # half written row
+
+        # Act
+        with NpyAppendWriter(filename, np.int64, (3,), mode='a') as writer:
+            writer.write(rows[2:])
+
+        # Assert
+        self.assertTrue(np.array_equal(np.load(filename), rows))
+
+    def test_npy_append_writer_rejects_other_row_shape(self):
+        # Arrange
+        filename = join(self.tmp_dir.name, 'rows.npy')
+        np.save(filename, np.zeros((2, 3), np.int8))
+
+        # Act / Assert
+        self.assertRaises(ValueError, NpyAppendWriter, filename, np.int8, (4,), 'a')
+
+    def test_state_result_writer_chunks(self):
+        # Arrange
+        positions = np.zeros(7, POSITION_DTYPE)
+        positions['bitboards'] = np.arange(7 * 12, dtype=np.uint64).reshape(7, 12)
+
+        # Act
+        with StateResultWriter(self.tmp_dir.name, chunk_size=3) as writer:
+            writer.append(positions[:5], 1)
+            writer.append(positions[5:], 0)
+            n_written = writer.y_writer.n_rows
+        x = np.load(join(self.tmp_dir.name, 'x.npy'))
+        y = np.load(join(self.tmp_dir.name, 'y.npy'))
+
+        # Assert
+        self.assertEqual(n_written, 6)
+        self.assertEqual(x.shape, (7, 12, 8, 8))
+        self.assertTrue(np.array_equal(x, convert_bitboards_to_array(positions['bitboards'])))
+        self.assertEqual(list(y), [1] * 5 + [0] * 2)
+
+    def test_write_state_result_dataset_matches_in_memory(self):
+        for workers in (1, 2):
+            with self.subTest(workers=workers):
+                # Arrange
+                filename = 'resources/three_games.pgn'
+                target_dir = join(self.tmp_dir.name, str(workers))
+                expected_x, expected_y = create_state_result_dataset(filename, workers=workers, random_seed=1,
+                                                                     positions_per_game=5, max_n=1)
+
+                # Act
+                n_samples = write_state_result_dataset(filename, target_dir, workers=workers, random_seed=1,
+                                                       chunk_size=2, positions_per_game=5, max_n=1)
+
+                # Assert
+                self.assertEqual(n_samples, 5)
+                self.assertTrue(np.array_equal(np.load(join(target_dir, 'x.npy')), expected_x))
+                self.assertTrue(np.array_equal(np.load(join(target_dir, 'y.npy')), expected_y))
+                self.assertEqual(sorted(os.listdir(target_dir)), [FEATURES_FILENAME, 'x.npy', 'y.npy'])
+
+
+if __name__ == '__main__':
+    unittest.main()